@@ -1,14 +1,18 @@
 # api/campaigns.py - Enhanced with comprehensive activity logging
 from datetime import date
-from pathlib import Path
-from typing import Dict
+from typing import Dict, List
 import json
+import os
 
-from flask import Blueprint, jsonify, request, g
+from flask import Blueprint, current_app, jsonify, request, g
 
-from auth.decorators import jwt_required, log_activity
+from auth.decorators import annotate_activity, jwt_required, log_activity
 from models import Campaign, CampaignImage, db
-from .utils import allowed_file, create_campaign_folder, save_image
+from services import campaign_index, campaign_manifest, folder_publisher, record_activity, status_engine, upload_jobs
+from .uploads import IMAGE_TYPES, job_summary
+from .utils import (
+    UploadRejected, campaign_files, image_filename, receive_images, release_campaign_folder
+)
 
 campaign_bp = Blueprint("campaigns", __name__)
 
@@ -25,37 +29,23 @@ def _serialize_campaign(campaign: Campaign) -> Dict[str, str]:
     }
 
 
-def _update_all_campaign_statuses():
-    """Update all campaign statuses based on current date."""
-    today = date.today()
-    campaigns = Campaign.query.all()
-    
-    updated_count = 0
-    updated_campaigns = []
+def _update_all_campaign_statuses(force: bool = False) -> int:
+    """Apply campaign status transitions whose date boundary has passed."""
+    updated_campaigns = status_engine.refresh(force=force)
+    updated_count = len(updated_campaigns)
     
-    for campaign in campaigns:
-        old_status = campaign.status
-        campaign.update_status(today)
-        
-        if old_status != campaign.status:
-            updated_count += 1
-            updated_campaigns.append({
-                "id": campaign.id,
-                "name": campaign.name,
-                "old_status": old_status,
-                "new_status": campaign.status
-            })
-            print(f"Campaign '{campaign.name}' status changed: {old_status} -> {campaign.status}")
+    for change in updated_campaigns:
+        print(f"Campaign '{change['name']}' status changed: {change['old_status']} -> {change['new_status']}")
     
     if updated_count > 0:
-        db.session.commit()
         print(f"Updated {updated_count} campaign statuses")
+        campaign_index.invalidate()
+        campaign_manifest.rebuild()
         
         # Log the bulk status update
         user = getattr(g, "current_user", None)
         if user:
-            from models import ActivityLog
-            log = ActivityLog(
+            record_activity(
                 user_id=user.id,
                 action="bulk_update_campaign_status",
                 status="success",
@@ -66,46 +56,33 @@ def _update_all_campaign_statuses():
                 }),
                 resource_type="campaign"
             )
-            db.session.add(log)
-            db.session.commit()
     
     return updated_count
 
 
-def _check_date_conflicts(start_date: date, end_date: date, exclude_campaign_id: int = None) -> str:
-    """Check if the date range conflicts with existing active campaigns."""
+def _check_date_conflicts(start_date: date, end_date: date, exclude_campaign_id: int = None) -> List[Dict]:
+    """Return every active campaign whose date range overlaps the given one."""
     _update_all_campaign_statuses()
     
-    query = Campaign.query.filter(
-        Campaign.status == "active"
-    ).filter(
-        Campaign.start_date <= end_date,
-        Campaign.end_date >= start_date
-    )
-    
-    if exclude_campaign_id:
-        query = query.filter(Campaign.id != exclude_campaign_id)
-    
-    conflicting_campaign = query.first()
-    
-    if conflicting_campaign:
-        return f"Date range conflicts with existing active campaign '{conflicting_campaign.name}' ({conflicting_campaign.start_date} to {conflicting_campaign.end_date})"
-    
-    return None
+    return [
+        {
+            "id": interval.campaign_id,
+            "name": interval.name,
+            "start_date": interval.start.isoformat(),
+            "end_date": interval.end.isoformat()
+        }
+        for interval in campaign_index.conflicts(start_date, end_date, exclude_campaign_id)
+    ]
 
 
-def _get_image_filename(campaign_start_date: date, image_type: str) -> str:
-    """Generate the correct filename based on date and image type."""
-    date_str = campaign_start_date.isoformat()
-    
-    image_type_mapping = {
-        "background": "bkg",
-        "logo": "logo", 
-        "screensaver": "screensaver_bkg"
-    }
-    
-    suffix = image_type_mapping.get(image_type, image_type)
-    return f"{date_str}{suffix}.png"
+def _conflict_response(conflicts: List[Dict]):
+    """Build the 409 response describing conflicting campaigns."""
+    first = conflicts[0]
+    message = f"Date range conflicts with existing active campaign '{first['name']}' ({first['start_date']} to {first['end_date']})"
+    if len(conflicts) > 1:
+        message += f" and {len(conflicts) - 1} other campaign(s)"
+    
+    return jsonify({"error": message, "conflicts": conflicts}), 409
 
 
 @campaign_bp.route("/", methods=["GET"])
@@ -127,8 +104,13 @@ def list_campaigns():
 def create_campaign():
     """Create a new campaign with uploaded images."""
     # Handle both form data and JSON data
+    stored, rejected = {}, {}
     if request.content_type and 'multipart/form-data' in request.content_type:
-        form = request.form
+        # Images go into the blob store as the body is parsed; the kiosk sees nothing until the folder is published
+        try:
+            form, stored, rejected = receive_images(IMAGE_TYPES)
+        except UploadRejected as e:
+            return jsonify({"error": str(e)}), e.status_code
         name = form.get("name")
         start_date = form.get("start_date")
         end_date = form.get("end_date")
@@ -151,71 +133,75 @@ def create_campaign():
         return jsonify({"error": "End date must be after start date"}), 400
     
     # Check for date conflicts with active campaigns
-    conflict_error = _check_date_conflicts(start, end)
-    if conflict_error:
-        return jsonify({"error": conflict_error}), 409
+    conflicts = _check_date_conflicts(start, end)
+    if conflicts:
+        return _conflict_response(conflicts)
     
-    # Create folder for campaign assets
-    folder = create_campaign_folder(start.isoformat())
+    for image_type, error in rejected.items():
+        return jsonify({"error": f"Invalid {image_type} image: {error}"}), error.status_code
     
-    # Create campaign record FIRST to get the ID
+    folder_name = start.isoformat()
     campaign = Campaign(
         name=name,
         start_date=start,
         end_date=end,
-        folder_path=str(folder),
+        folder_path=folder_publisher.published_path(folder_name),
         user_id=g.current_user.id,
     )
     campaign.update_status(date.today())
-    db.session.add(campaign)
-    db.session.flush()  # This assigns the ID without committing
     
     # Track uploaded images for logging
-    uploaded_images = []
-    
-    # Handle file uploads with proper naming convention
-    for image_type in ["background", "logo", "screensaver"]:
-        file = request.files.get(image_type)
-        if file and allowed_file(file.filename):
-            filename = _get_image_filename(campaign.start_date, image_type)
-            path = save_image(file, folder / filename)
-            
+    uploaded_images = list(stored)
+    saved_paths = []
+    
+    # Publish the complete folder in one step; it is taken down again if the commit fails
+    with folder_publisher.transaction() as publication:
+        if stored:
+            files = {image_filename(start, image_type): digest for image_type, digest in stored.items()}
+            folder = publication.publish(folder_name, files)
+        else:
+            folder = campaign.folder_path  # Published when the first image is uploaded
+        
+        db.session.add(campaign)
+        db.session.flush()  # This assigns the ID without committing
+        for image_type, content_hash in stored.items():
+            path = os.path.join(folder, image_filename(start, image_type))
             db.session.add(
                 CampaignImage(
                     campaign_id=campaign.id, 
                     image_type=image_type, 
-                    file_path=str(path)
+                    file_path=path,
+                    content_hash=content_hash
                 )
             )
-            uploaded_images.append(image_type)
-    
-    db.session.commit()
+            saved_paths.append(path)
+        
+        db.session.commit()
     
-    # Update the decorator with detailed information
-    from models import ActivityLog
-    # Find the most recent log for this user and update it with details
-    recent_log = ActivityLog.query.filter_by(
-        user_id=g.current_user.id,
-        action="create_campaign"
-    ).order_by(ActivityLog.created_at.desc()).first()
+    jobs = upload_jobs.submit(saved_paths, campaign_id=campaign.id, user_id=g.current_user.id)
     
-    if recent_log:
-        details = {
+    # Attach the details to this request's activity log row
+    annotate_activity(
+        details={
             "campaign_id": campaign.id,
             "campaign_name": name,
             "start_date": start_date,
             "end_date": end_date,
             "status": campaign.status,
             "uploaded_images": uploaded_images,
-            "folder_path": str(folder)
-        }
-        recent_log.details = json.dumps(details)
-        recent_log.resource_id = str(campaign.id)
-        db.session.commit()
+            "folder_path": folder,
+            "job_ids": [job.id for job in jobs]
+        },
+        resource_id=campaign.id
+    )
     
-    _update_all_campaign_statuses()
+    status_engine.observe(campaign.start_date, campaign.end_date)
+    campaign_index.invalidate()
+    campaign_manifest.rebuild()
     
-    return jsonify(_serialize_campaign(campaign)), 201
+    response_data = _serialize_campaign(campaign)
+    response_data["jobs"] = [job_summary(job) for job in jobs]
+    return jsonify(response_data), 201
 
 
 @campaign_bp.route("/<int:campaign_id>", methods=["PUT"])
@@ -235,6 +221,9 @@ def update_campaign(campaign_id: int):
         "status": campaign.status
     }
     
+    # (old start date, new folder, files) when the start date moves
+    relink = None
+    
     # Handle date updates
     start_date_str = data.get("start_date")
     end_date_str = data.get("end_date")
@@ -250,9 +239,9 @@ def update_campaign(campaign_id: int):
             return jsonify({"error": "End date must be after start date"}), 400
         
         # Check for date conflicts (excluding current campaign)
-        conflict_error = _check_date_conflicts(new_start, new_end, campaign_id)
-        if conflict_error:
-            return jsonify({"error": conflict_error}), 409
+        conflicts = _check_date_conflicts(new_start, new_end, campaign_id)
+        if conflicts:
+            return _conflict_response(conflicts)
         
         # Track date changes
         if new_start != campaign.start_date:
@@ -267,42 +256,31 @@ def update_campaign(campaign_id: int):
                 "new": new_end.isoformat()
             }
         
-        # If dates changed, handle file renaming
+        # If dates changed, republish the images under the new date folder
         if new_start != campaign.start_date:
-            old_folder = Path(campaign.folder_path)
             new_folder_name = new_start.isoformat()
-            new_folder = old_folder.parent / new_folder_name
+            new_folder = folder_publisher.published_path(new_folder_name)
             
-            new_folder.mkdir(parents=True, exist_ok=True)
+            # Links to the same blobs; images stored before the blob store are adopted first
+            relink = (campaign.start_date, new_folder_name, campaign_files(campaign, new_start))
             
             renamed_files = []
             for image in campaign.images:
-                old_path = Path(image.file_path)
-                if old_path.exists():
-                    new_filename = _get_image_filename(new_start, image.image_type)
-                    new_path = new_folder / new_filename
-                    
-                    old_path.rename(new_path)
-                    image.file_path = str(new_path)
+                if image.content_hash:
+                    new_path = os.path.join(new_folder, image_filename(new_start, image.image_type))
                     renamed_files.append({
                         "type": image.image_type,
-                        "old_path": str(old_path),
-                        "new_path": str(new_path)
+                        "old_path": image.file_path,
+                        "new_path": new_path
                     })
+                    image.file_path = new_path
             
-            campaign.folder_path = str(new_folder)
             changes["folder_path"] = {
-                "old": str(old_folder),
-                "new": str(new_folder)
+                "old": campaign.folder_path,
+                "new": new_folder
             }
             changes["renamed_files"] = renamed_files
-            
-            # Remove old folder if empty
-            try:
-                if old_folder.exists() and not any(old_folder.iterdir()):
-                    old_folder.rmdir()
-            except OSError:
-                pass
+            campaign.folder_path = new_folder
         
         campaign.start_date = new_start
         campaign.end_date = new_end
@@ -325,27 +303,30 @@ def update_campaign(campaign_id: int):
             "new": campaign.status
         }
     
-    db.session.commit()
-    
-    # Update log with detailed changes
-    from models import ActivityLog
-    recent_log = ActivityLog.query.filter_by(
-        user_id=g.current_user.id,
-        action="update_campaign"
-    ).order_by(ActivityLog.created_at.desc()).first()
+    # The new folder appears complete before the old one goes; both are restored if the commit fails
+    with folder_publisher.transaction() as publication:
+        if relink:
+            old_start, new_folder_name, files = relink
+            publication.lock(old_start.isoformat(), new_folder_name)
+            if files:
+                publication.publish(new_folder_name, files)
+            release_campaign_folder(publication, campaign, old_start)
+        db.session.commit()
     
-    if recent_log:
-        details = {
+    # Attach the details to this request's activity log row
+    annotate_activity(
+        details={
             "campaign_id": campaign_id,
             "campaign_name": campaign.name,
             "changes": changes,
             "original_data": original_data
-        }
-        recent_log.details = json.dumps(details)
-        recent_log.resource_id = str(campaign_id)
-        db.session.commit()
+        },
+        resource_id=campaign_id
+    )
     
-    _update_all_campaign_statuses()
+    status_engine.observe(campaign.start_date, campaign.end_date)
+    campaign_index.invalidate()
+    campaign_manifest.rebuild()
     
     return jsonify(_serialize_campaign(campaign))
 
@@ -367,57 +348,30 @@ def delete_campaign(campaign_id: int):
         "folder_path": campaign.folder_path
     }
     
-    deleted_images = []
-    # Delete associated image files
-    for image in campaign.images:
-        path = Path(image.file_path)
-        if path.exists():
-            try:
-                path.unlink()
-                deleted_images.append({
-                    "type": image.image_type,
-                    "path": str(path),
-                    "deleted": True
-                })
-            except Exception as e:
-                deleted_images.append({
-                    "type": image.image_type,
-                    "path": str(path),
-                    "deleted": False,
-                    "error": str(e)
-                })
-    
-    # Try to remove the campaign folder if it's empty
-    folder_removed = False
-    folder_path = Path(campaign.folder_path)
-    try:
-        if folder_path.exists() and not any(folder_path.iterdir()):
-            folder_path.rmdir()
-            folder_removed = True
-    except OSError:
-        pass
-    
-    db.session.delete(campaign)
-    db.session.commit()
-    
-    # Update log with detailed deletion info
-    from models import ActivityLog
-    recent_log = ActivityLog.query.filter_by(
-        user_id=g.current_user.id,
-        action="delete_campaign"
-    ).order_by(ActivityLog.created_at.desc()).first()
+    deleted_images = [
+        {"type": image.image_type, "path": image.file_path, "content_hash": image.content_hash}
+        for image in campaign.images
+    ]
     
-    if recent_log:
-        details = {
+    # Take the images down with the rows; the blobs are left for scripts/gc_asset_blobs.py
+    with folder_publisher.transaction() as publication:
+        folder_removed = release_campaign_folder(publication, campaign)
+        db.session.delete(campaign)
+        db.session.commit()
+    
+    # Attach the details to this request's activity log row
+    annotate_activity(
+        details={
             "deleted_campaign": campaign_info,
             "deleted_images": deleted_images,
             "folder_removed": folder_removed
-        }
-        recent_log.details = json.dumps(details)
-        recent_log.resource_id = str(campaign_id)
-        db.session.commit()
+        },
+        resource_id=campaign_id
+    )
     
-    _update_all_campaign_statuses()
+    status_engine.invalidate()
+    campaign_index.invalidate()
+    campaign_manifest.rebuild()
     
     return jsonify({"message": "Campaign deleted successfully"})
 
@@ -440,12 +394,28 @@ def get_active_campaign():
     })
 
 
+@campaign_bp.route("/manifest", methods=["GET"])
+def get_campaign_manifest():
+    """Precomputed active and next campaign for kiosks; public and cacheable.
+    
+    Kiosks revalidate with If-None-Match and get a 304 until the manifest
+    changes, so polling costs no database work.
+    """
+    body, etag = campaign_manifest.current()
+    response = current_app.response_class(body, mimetype="application/json")
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = campaign_manifest.max_age
+    response.cache_control.must_revalidate = True
+    return response.make_conditional(request)
+
+
 @campaign_bp.route("/update-statuses", methods=["POST"])
 @jwt_required
 @log_activity("manual_update_statuses", "Manually triggered campaign status update")
 def update_campaign_statuses():
-    """Manual endpoint to update all campaign statuses."""
-    updated_count = _update_all_campaign_statuses()
+    """Manual endpoint to reconcile every campaign status."""
+    updated_count = _update_all_campaign_statuses(force=True)
     
     return jsonify({
         "message": f"Updated {updated_count} campaign statuses",
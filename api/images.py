@@ -0,0 +1,143 @@
+# api/images.py - Campaign image serving with HTTP caching
+import mimetypes
+import os
+from urllib.parse import quote
+
+from flask import Blueprint, abort, current_app, jsonify, request, send_file
+from werkzeug.security import safe_join
+
+from services.image_derivatives import image_derivatives
+from services.image_etags import image_etags
+from services.metrics import image_bytes_served
+
+images_bp = Blueprint("images", __name__)
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+OFFLOAD_MODES = ("x-accel", "x-sendfile")
+
+
+def _offload_uri(send_path):
+    """Proxy-internal URI for a file under UPLOAD_FOLDER or IMAGE_CACHE_FOLDER."""
+    cache_folder = image_derivatives.cache_folder
+    if os.path.commonpath([send_path, cache_folder]) == cache_folder:
+        prefix = current_app.config.get('IMAGE_CACHE_OFFLOAD_PREFIX', '/protected-image-cache/')
+        relative = os.path.relpath(send_path, cache_folder)
+    else:
+        prefix = current_app.config.get('IMAGE_OFFLOAD_PREFIX', '/protected-images/')
+        relative = os.path.relpath(send_path, os.path.abspath(current_app.config.get('UPLOAD_FOLDER', 'assets')))
+    return prefix.rstrip("/") + "/" + quote(relative.replace(os.sep, "/"))
+
+
+def _offload_response(send_path, mimetype, stat, etag, max_age):
+    """Empty response telling the front proxy to send the file itself.
+
+    ``x-accel`` (nginx) maps the file under IMAGE_OFFLOAD_PREFIX (originals)
+    or IMAGE_CACHE_OFFLOAD_PREFIX (variants), which must be ``internal``
+    locations aliased to UPLOAD_FOLDER and IMAGE_CACHE_FOLDER; ``x-sendfile``
+    (Apache mod_xsendfile, lighttpd) passes the absolute path. Validators are
+    still checked here, so a revalidation is answered with a 304 without
+    involving the proxy; range requests are left to the proxy.
+    """
+    response = current_app.response_class(mimetype=mimetype)
+    response.set_etag(etag)
+    response.last_modified = stat.st_mtime
+    response.cache_control.max_age = max_age
+    response = response.make_conditional(request)
+    if response.status_code == 304:
+        return response
+
+    if current_app.config.get('IMAGE_OFFLOAD_MODE', '').lower() == "x-accel":
+        response.headers["X-Accel-Redirect"] = _offload_uri(send_path)
+    else:
+        response.headers["X-Sendfile"] = send_path
+    return response
+
+
+@images_bp.route("/<path:filepath>")
+def serve_image(filepath):
+    """Serve an image from the assets directory with validators for caching.
+
+    Responses carry a strong ETag (content hash) and support conditional GET
+    and range requests. When the URL is versioned with ``?v=<etag>`` and the
+    version matches the current content it is cached as immutable; other
+    URLs may be cached for IMAGE_CACHE_MAX_AGE_SECONDS and are then
+    revalidated, which costs a 304 rather than the whole image. With
+    IMAGE_OFFLOAD_MODE set the bytes are sent by the front proxy.
+
+    ``w`` requests a resized variant (snapped to IMAGE_DERIVATIVE_WIDTHS) and
+    ``fmt`` a re-encoded one (webp, avif, jpeg, png, or auto to pick from the
+    Accept header).
+    """
+    upload_folder = os.path.abspath(current_app.config.get('UPLOAD_FOLDER', 'assets'))
+    full_path = safe_join(upload_folder, filepath)
+    if full_path is None:
+        abort(404)
+
+    try:
+        stat = os.stat(full_path)
+    except OSError:
+        print(f"Image not found: {full_path}")
+        abort(404)
+    if not os.path.isfile(full_path):
+        abort(404)
+
+    source_format = image_derivatives.normalize_format(os.path.splitext(full_path)[1].lstrip("."))
+    width = image_derivatives.choose_width(request.args.get('w', type=int))
+    requested_format = request.args.get('fmt', '').strip().lower()
+    negotiated = requested_format == "auto"
+    if negotiated:
+        fmt = image_derivatives.negotiate_format(request.accept_mimetypes, source_format)
+    elif requested_format:
+        fmt = image_derivatives.normalize_format(requested_format)
+        if not fmt or not image_derivatives.supports(fmt):
+            return jsonify({"error": f"Unsupported image format: {requested_format}"}), 400
+    else:
+        fmt = source_format
+
+    try:
+        etag = image_etags.etag_for(full_path, stat)
+        versioned = request.args.get('v') == etag
+        max_age = IMMUTABLE_MAX_AGE if versioned else current_app.config.get('IMAGE_CACHE_MAX_AGE_SECONDS', 60)
+
+        send_path, send_stat, send_etag = full_path, stat, etag
+        mimetype = mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+        if width or (fmt and fmt != source_format):
+            fmt = fmt or "png"
+            try:
+                send_path = image_derivatives.get(full_path, width, fmt)
+                send_stat = os.stat(send_path)
+                send_etag = f"{etag}-{image_derivatives.variant_tag(width)}-{fmt}"
+                mimetype = image_derivatives.mimetype(fmt)
+            except Exception as e:
+                # Serve the original rather than a broken image
+                print(f"Could not create {fmt} variant of {filepath}: {e}")
+
+        offload = current_app.config.get('IMAGE_OFFLOAD_MODE', '').lower() in OFFLOAD_MODES
+        if offload:
+            response = _offload_response(send_path, mimetype, send_stat, send_etag, max_age)
+        else:
+            # Under gunicorn send_file streams through wsgi.file_wrapper (os.sendfile)
+            response = send_file(
+                send_path,
+                mimetype=mimetype,
+                conditional=True,
+                etag=send_etag,
+                last_modified=send_stat.st_mtime,
+                max_age=max_age
+            )
+    except Exception as e:
+        print(f"Error serving image {filepath}: {e}")
+        abort(404)
+
+    response.accept_ranges = "bytes"
+    response.cache_control.public = True
+    if versioned:
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.must_revalidate = True
+    if negotiated:
+        response.vary.add("Accept")
+
+    if response.status_code != 304:
+        image_bytes_served.inc(send_stat.st_size if offload else response.content_length or 0)
+    return response
@@ -1,177 +1,220 @@
 # api/logs.py - Enhanced logs API with filtering and pagination
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
 from datetime import datetime, timedelta
-from sqlalchemy import text
+import csv
+import io
+import zlib
 
-from models import ActivityLog, User, db
+from models import ActivityLog
 from auth.decorators import admin_required, log_activity
+from services import latency_recorder, log_facets, log_rollups
 
 
 bp = Blueprint("logs", __name__, url_prefix="/api/logs")
 
 
+def _parse_log_filters():
+    """Read the shared log filters from the query string.
+    
+    Returns ``(filters, error)`` where ``error`` is a message for a 400 response.
+    """
+    filters = {
+        "user_id": request.args.get('user_id', type=int) or None,
+        "action": request.args.get('action', '').strip() or None,
+        "status": request.args.get('status', '').strip() or None,
+        "resource_type": request.args.get('resource_type', '').strip() or None,
+        "start_date": None,
+        "end_date": None
+    }
+    
+    start_date_str = request.args.get('start_date', '').strip()
+    end_date_str = request.args.get('end_date', '').strip()
+    
+    if start_date_str:
+        try:
+            filters["start_date"] = datetime.fromisoformat(start_date_str.replace('Z', '+00:00'))
+        except ValueError:
+            return None, "Invalid start_date format"
+    
+    if end_date_str:
+        try:
+            # Add 24 hours to include the entire end date
+            filters["end_date"] = datetime.fromisoformat(end_date_str.replace('Z', '+00:00')) + timedelta(days=1)
+        except ValueError:
+            return None, "Invalid end_date format"
+    
+    return filters, None
+
+
+EXPORT_HEADER = [
+    'Date/Time', 'User Email', 'Action', 'Status', 'Resource Type', 
+    'Resource ID', 'IP Address', 'Duration (ms)', 'Details'
+]
+
+
+def _export_query(filters):
+    """Filtered logs in export order, newest first, as projected rows."""
+    return ActivityLog.project(ActivityLog.filtered_query(**filters).order_by(
+        ActivityLog.created_at.desc(), ActivityLog.id.desc()
+    ))
+
+
+def _export_row(log):
+    """Render one projected log row as a CSV row."""
+    return [
+        log.created_at.isoformat() if log.created_at else '',
+        log.user_email or '',
+        log.action or '',
+        log.status or '',
+        log.resource_type or '',
+        log.resource_id or '',
+        log.ip_address or '',
+        log.duration_ms or '',
+        log.details or ''
+    ]
+
+
+def _export_filename():
+    return f"activity_logs_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+
+
+def _arg_flag(name, default):
+    """Read a boolean query parameter."""
+    value = request.args.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes')
+
+
+def _log_total(filters, exact):
+    """Return ``(total, is_estimate)`` for the filtered logs.
+    
+    An exact count is only run when asked for. Without filters the total is
+    estimated from the primary key range; otherwise it is unknown (None).
+    """
+    if exact:
+        return ActivityLog.filtered_query(**filters).order_by(None).count(), False
+    if not any(filters.values()):
+        return ActivityLog.estimate_total(), True
+    return None, False
+
+
 @bp.route("", methods=["GET"])
 @admin_required
 @log_activity("view_logs", "Accessed activity logs")
 def list_logs():
     """Return filtered activity logs with pagination."""
     try:
-        # Extract query parameters
-        user_id = request.args.get('user_id', type=int)
-        action = request.args.get('action', '').strip()
-        status = request.args.get('status', '').strip()
-        resource_type = request.args.get('resource_type', '').strip()
-        
-        # Date filtering
-        start_date_str = request.args.get('start_date', '').strip()
-        end_date_str = request.args.get('end_date', '').strip()
+        filters, error = _parse_log_filters()
+        if error:
+            return jsonify({"error": error}), 400
         
-        start_date = None
-        end_date = None
+        per_page = max(1, min(request.args.get('per_page', 50, type=int), 100))  # 1 to 100 per page
         
-        if start_date_str:
-            try:
-                start_date = datetime.fromisoformat(start_date_str.replace('Z', '+00:00'))
-            except ValueError:
-                return jsonify({"error": "Invalid start_date format"}), 400
-                
-        if end_date_str:
+        if 'cursor' in request.args:
+            # Keyset pagination on (created_at, id): no COUNT, no OFFSET scan
             try:
-                end_date = datetime.fromisoformat(end_date_str.replace('Z', '+00:00'))
-                # Add 24 hours to include the entire end date
-                end_date = end_date + timedelta(days=1)
-            except ValueError:
-                return jsonify({"error": "Invalid end_date format"}), 400
-        
-        # Pagination
-        page = request.args.get('page', 1, type=int)
-        per_page = min(request.args.get('per_page', 50, type=int), 100)  # Max 100 per page
-        
-        # Get filtered logs
-        pagination = ActivityLog.get_filtered_logs(
-            user_id=user_id if user_id else None,
-            action=action if action else None,
-            status=status if status else None,
-            resource_type=resource_type if resource_type else None,
-            start_date=start_date,
-            end_date=end_date,
-            page=page,
-            per_page=per_page
-        )
-        
-        # Convert to dictionaries
-        logs = [log.to_dict() for log in pagination.items]
-        
-        # Get summary statistics
-        total_logs = pagination.total
-        
-        # Get unique values for filter dropdowns
-        users = db.session.query(User.id, User.email).all()
-        actions = db.session.query(ActivityLog.action).distinct().order_by(ActivityLog.action).all()
-        statuses = db.session.query(ActivityLog.status).distinct().order_by(ActivityLog.status).all()
-        resource_types = db.session.query(ActivityLog.resource_type).distinct().filter(
-            ActivityLog.resource_type.isnot(None)
-        ).order_by(ActivityLog.resource_type).all()
-        
-        return jsonify({
-            "logs": logs,
-            "pagination": {
+                page_logs, next_cursor = ActivityLog.get_logs_after_cursor(
+                    cursor=request.args.get('cursor', '').strip() or None,
+                    per_page=per_page,
+                    rows=True,
+                    **filters
+                )
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            
+            total_logs, total_is_estimate = _log_total(filters, _arg_flag('include_total', False))
+            pagination_data = {
+                "mode": "cursor",
+                "per_page": per_page,
+                "next_cursor": next_cursor,
+                "has_next": next_cursor is not None,
+                "total": total_logs,
+                "total_is_estimate": total_is_estimate
+            }
+        else:
+            page = max(1, request.args.get('page', 1, type=int))
+            # Page mode keeps its exact total unless the client opts out
+            count = _arg_flag('include_total', True)
+            pagination = ActivityLog.get_filtered_logs(
+                page=page,
+                per_page=per_page,
+                count=count,
+                rows=True,
+                **filters
+            )
+            page_logs = pagination.items
+            
+            total_logs, total_is_estimate = pagination.total, False
+            if not count:
+                total_logs, total_is_estimate = _log_total(filters, False)
+            pagination_data = {
+                "mode": "page",
                 "page": page,
                 "per_page": per_page,
                 "total": total_logs,
+                "total_is_estimate": total_is_estimate,
                 "pages": pagination.pages,
                 "has_prev": pagination.has_prev,
                 "has_next": pagination.has_next
-            },
-            "filters": {
-                "users": [{"id": u.id, "email": u.email} for u in users],
-                "actions": [a[0] for a in actions if a[0]],
-                "statuses": [s[0] for s in statuses if s[0]],
-                "resource_types": [rt[0] for rt in resource_types if rt[0]]
-            },
+            }
+        
+        # Projected rows serialize without hydrating ORM objects
+        logs = [ActivityLog.row_to_dict(row) for row in page_logs]
+        
+        response_data = {
+            "logs": logs,
+            "pagination": pagination_data,
             "summary": {
                 "total_logs": total_logs,
                 "filtered_count": len(logs)
             }
-        })
+        }
+        
+        # Filter dropdown values are served by /filters; inline them only on request
+        if _arg_flag('include_filters', False):
+            response_data["filters"] = log_facets.get()
+        
+        return jsonify(response_data)
         
     except Exception as e:
         return jsonify({"error": f"Failed to fetch logs: {str(e)}"}), 500
 
 
+@bp.route("/filters", methods=["GET"])
+@admin_required
+@log_activity("view_log_filters", "Retrieved activity log filter values")
+def list_log_filters():
+    """Return the cached values for the log filter dropdowns."""
+    try:
+        return jsonify(log_facets.get())
+    except Exception as e:
+        return jsonify({"error": f"Failed to fetch log filters: {str(e)}"}), 500
+
+
 @bp.route("/export", methods=["GET"])
 @admin_required  
 @log_activity("export_logs", "Exported activity logs")
 def export_logs():
-    """Export logs as CSV."""
+    """Export logs as CSV wrapped in JSON (capped at LOG_EXPORT_MAX_RECORDS)."""
     try:
-        # Same filtering logic as above
-        user_id = request.args.get('user_id', type=int)
-        action = request.args.get('action', '').strip()
-        status = request.args.get('status', '').strip()
-        resource_type = request.args.get('resource_type', '').strip()
-        
-        start_date_str = request.args.get('start_date', '').strip()
-        end_date_str = request.args.get('end_date', '').strip()
-        
-        start_date = None
-        end_date = None
-        
-        if start_date_str:
-            start_date = datetime.fromisoformat(start_date_str.replace('Z', '+00:00'))
-        if end_date_str:
-            end_date = datetime.fromisoformat(end_date_str.replace('Z', '+00:00')) + timedelta(days=1)
-        
-        # Get all matching logs (no pagination for export)
-        query = ActivityLog.query.join(User)
-        
-        if user_id:
-            query = query.filter(ActivityLog.user_id == user_id)
-        if action:
-            query = query.filter(ActivityLog.action.ilike(f"%{action}%"))
-        if status:
-            query = query.filter(ActivityLog.status == status)
-        if resource_type:
-            query = query.filter(ActivityLog.resource_type == resource_type)
-        if start_date:
-            query = query.filter(ActivityLog.created_at >= start_date)
-        if end_date:
-            query = query.filter(ActivityLog.created_at <= end_date)
-            
-        logs = query.order_by(ActivityLog.created_at.desc()).limit(10000).all()  # Limit exports
+        filters, error = _parse_log_filters()
+        if error:
+            return jsonify({"error": error}), 400
         
-        # Generate CSV content
-        import csv
-        import io
+        max_records = current_app.config.get('LOG_EXPORT_MAX_RECORDS', 10000)
+        logs = _export_query(filters).limit(max_records).all()  # Limit exports
         
         output = io.StringIO()
         writer = csv.writer(output)
         
-        # Header
-        writer.writerow([
-            'Date/Time', 'User Email', 'Action', 'Status', 'Resource Type', 
-            'Resource ID', 'IP Address', 'Duration (ms)', 'Details'
-        ])
-        
-        # Data rows
+        writer.writerow(EXPORT_HEADER)
         for log in logs:
-            writer.writerow([
-                log.created_at.isoformat() if log.created_at else '',
-                log.user.email if log.user else '',
-                log.action or '',
-                log.status or '',
-                log.resource_type or '',
-                log.resource_id or '',
-                log.ip_address or '',
-                log.duration_ms or '',
-                log.details or ''
-            ])
-        
-        output.seek(0)
+            writer.writerow(_export_row(log))
         
         return jsonify({
             "csv_data": output.getvalue(),
-            "filename": f"activity_logs_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+            "filename": _export_filename(),
             "count": len(logs)
         })
         
@@ -179,6 +222,74 @@ def export_logs():
         return jsonify({"error": f"Failed to export logs: {str(e)}"}), 500
 
 
+@bp.route("/export.csv", methods=["GET"])
+@admin_required
+@log_activity("export_logs_stream", "Streamed activity log CSV export")
+def stream_export_logs():
+    """Stream logs as a text/csv download in constant memory.
+    
+    Rows are fetched in batches of LOG_EXPORT_BATCH_SIZE and flushed to the
+    client every LOG_EXPORT_CHUNK_BYTES. ``limit`` caps the row count (bounded
+    by LOG_EXPORT_STREAM_MAX_RECORDS, 0 meaning unlimited) and ``gzip=true``
+    compresses the stream chunk by chunk when the client accepts gzip.
+    """
+    filters, error = _parse_log_filters()
+    if error:
+        return jsonify({"error": error}), 400
+    
+    config = current_app.config
+    caps = [
+        cap for cap in (
+            request.args.get('limit', type=int),
+            config.get('LOG_EXPORT_STREAM_MAX_RECORDS', 0)
+        ) if cap and cap > 0
+    ]
+    max_records = min(caps) if caps else None
+    batch_size = config.get('LOG_EXPORT_BATCH_SIZE', 1000)
+    chunk_bytes = config.get('LOG_EXPORT_CHUNK_BYTES', 64 * 1024)
+    gzip_requested = _arg_flag('gzip', False)
+    compress = gzip_requested and 'gzip' in request.accept_encodings
+    
+    query = _export_query(filters)
+    if max_records:
+        query = query.limit(max_records)
+    
+    def generate():
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        
+        def drain():
+            chunk = buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+            return compressor.compress(chunk) if compressor else chunk
+        
+        writer.writerow(EXPORT_HEADER)
+        for log in query.yield_per(batch_size):
+            writer.writerow(_export_row(log))
+            if buffer.tell() >= chunk_bytes:
+                chunk = drain()
+                if chunk:
+                    yield chunk
+        
+        chunk = drain()
+        if compressor:
+            chunk += compressor.flush()
+        if chunk:
+            yield chunk
+    
+    filename = _export_filename()
+    response = Response(stream_with_context(generate()), mimetype="text/csv")
+    response.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    response.headers["Cache-Control"] = "no-store"
+    if compress:
+        response.headers["Content-Encoding"] = "gzip"
+    if gzip_requested:
+        response.headers["Vary"] = "Accept-Encoding"  # Plain CSV for clients that don't accept gzip
+    return response
+
+
 @bp.route("/stats", methods=["GET"])
 @admin_required
 @log_activity("view_log_stats", "Viewed activity log statistics")
@@ -197,72 +308,38 @@ def log_stats():
         if end_date_str:
             end_date = datetime.fromisoformat(end_date_str.replace('Z', '+00:00'))
         
-        # Activity by day
-        daily_activity = db.session.query(
-            db.func.date(ActivityLog.created_at).label('date'),
-            db.func.count(ActivityLog.id).label('count')
-        ).filter(
-            ActivityLog.created_at >= start_date,
-            ActivityLog.created_at <= end_date
-        ).group_by(
-            db.func.date(ActivityLog.created_at)
-        ).order_by('date').all()
-        
-        # Activity by user - FIXED: Using text() for ORDER BY
-        user_activity = db.session.query(
-            User.email,
-            db.func.count(ActivityLog.id).label('count')
-        ).join(ActivityLog).filter(
-            ActivityLog.created_at >= start_date,
-            ActivityLog.created_at <= end_date
-        ).group_by(User.email).order_by(text('count DESC')).limit(10).all()
-        
-        # Activity by action - FIXED: Using text() for ORDER BY
-        action_activity = db.session.query(
-            ActivityLog.action,
-            db.func.count(ActivityLog.id).label('count')
-        ).filter(
-            ActivityLog.created_at >= start_date,
-            ActivityLog.created_at <= end_date
-        ).group_by(ActivityLog.action).order_by(text('count DESC')).limit(10).all()
-        
-        # Error rate
-        total_actions = db.session.query(ActivityLog).filter(
-            ActivityLog.created_at >= start_date,
-            ActivityLog.created_at <= end_date
-        ).count()
-        
-        error_actions = db.session.query(ActivityLog).filter(
-            ActivityLog.created_at >= start_date,
-            ActivityLog.created_at <= end_date,
-            ActivityLog.status == 'error'
-        ).count()
-        
-        error_rate = (error_actions / total_actions * 100) if total_actions > 0 else 0
+        # Served from the daily rollup where it covers the range (whole days), else from the logs
+        stats = log_rollups.summary(start_date.date(), end_date.date())
         
         return jsonify({
             "period": {
                 "start_date": start_date.isoformat(),
                 "end_date": end_date.isoformat()
             },
-            "summary": {
-                "total_actions": total_actions,
-                "error_actions": error_actions,
-                "error_rate": round(error_rate, 2)
-            },
-            "daily_activity": [
-                {"date": str(day.date), "count": day.count} 
-                for day in daily_activity
-            ],
-            "top_users": [
-                {"email": user.email, "count": user.count} 
-                for user in user_activity
-            ],
-            "top_actions": [
-                {"action": action.action, "count": action.count} 
-                for action in action_activity
-            ]
+            **stats
         })
         
     except Exception as e:
-        return jsonify({"error": f"Failed to get stats: {str(e)}"}), 500
\ No newline at end of file
+        return jsonify({"error": f"Failed to get stats: {str(e)}"}), 500
+
+
+@bp.route("/performance", methods=["GET"])
+@admin_required
+@log_activity("view_log_performance", "Viewed endpoint performance")
+def log_performance():
+    """Latency percentiles, throughput and error rates per endpoint.
+    
+    ``minutes`` sets the window (default 60, at most a week), ``bucket`` the
+    minutes per timeline point and ``endpoint`` (e.g. "GET logs.list_logs")
+    narrows everything to one endpoint.
+    """
+    try:
+        minutes = min(max(request.args.get('minutes', 60, type=int), 1), 7 * 24 * 60)
+        bucket = request.args.get('bucket', type=int) or max(1, minutes // 60)
+        bucket = min(max(bucket, 1), minutes)
+        endpoint = request.args.get('endpoint', '').strip() or None
+        
+        return jsonify(latency_recorder.summary(minutes, bucket, endpoint))
+        
+    except Exception as e:
+        return jsonify({"error": f"Failed to get performance data: {str(e)}"}), 500
@@ -1,28 +1,99 @@
 # api/uploads.py - Enhanced with comprehensive logging
-from pathlib import Path
-import json
+import os
 
-from flask import Blueprint, jsonify, request, g
+from flask import Blueprint, abort, g, jsonify, request
 
-from auth.decorators import jwt_required, log_activity
-from models import Campaign, CampaignImage, db
-from .utils import allowed_file, save_image
+from auth.decorators import annotate_activity, jwt_required, log_activity
+from models import Campaign, CampaignImage, UploadJob, UploadSession, db
+from services import campaign_manifest, folder_publisher, upload_jobs, upload_sessions
+from services.upload_sessions import UploadSessionError
+from .utils import (
+    UploadRejected,
+    allowed_file,
+    campaign_files,
+    check_image_signature,
+    image_filename,
+    receive_images,
+    upload_limit,
+)
 
 uploads_bp = Blueprint("uploads", __name__)
 
+IMAGE_TYPES = ("background", "logo", "screensaver")
 
-def _get_image_filename(campaign_start_date, image_type: str) -> str:
-    """Generate the correct filename based on date and image type."""
-    date_str = campaign_start_date.isoformat()
-    
-    image_type_mapping = {
-        "background": "bkg",
-        "logo": "logo", 
-        "screensaver": "screensaver_bkg"
+
+def _get_owned_or_404(model, record_id):
+    """Load a job or session of the current user; others' look like missing ones (admins see all)."""
+    record = model.query.get_or_404(record_id)
+    user = g.current_user
+    if record.user_id != user.id and not user.is_admin:
+        abort(404)
+    return record
+
+
+def job_summary(job: UploadJob) -> dict:
+    """Short job description returned by the upload endpoints."""
+    return {
+        "id": job.id,
+        "status": job.status,
+        "file_path": job.file_path,
+        "status_url": f"/api/uploads/jobs/{job.id}"
     }
+
+
+def _record_image(campaign: Campaign, image_type: str, path: str, content_hash: str) -> dict:
+    """Point the campaign's image row at a newly published file; returns the change."""
+    img = CampaignImage.query.filter_by(
+        campaign_id=campaign.id, image_type=image_type
+    ).first()
+    
+    if img:
+        # The previous file went away with the folder version it belonged to
+        old_path = img.file_path
+        img.file_path = str(path)
+        img.content_hash = content_hash
+        return {
+            "type": image_type,
+            "action": "updated",
+            "old_path": old_path,
+            "new_path": str(path)
+        }
     
-    suffix = image_type_mapping.get(image_type, image_type)
-    return f"{date_str}{suffix}.png"
+    # Create new image record
+    db.session.add(CampaignImage(
+        campaign_id=campaign.id,
+        image_type=image_type,
+        file_path=str(path),
+        content_hash=content_hash
+    ))
+    return {
+        "type": image_type,
+        "action": "created",
+        "new_path": str(path)
+    }
+
+
+def _publish_images(campaign: Campaign, stored: dict) -> list:
+    """Publish the campaign folder with new images (type -> digest) and commit their rows.
+
+    The kiosk sees the folder switch from its old content to the new one in
+    one step; if the commit fails the old folder is put back.
+    """
+    with folder_publisher.transaction() as publication:
+        folder = publication.publish(
+            campaign.start_date.isoformat(), campaign_files(campaign, replacements=stored)
+        )
+        campaign.folder_path = folder
+        updated_images = [
+            _record_image(
+                campaign, image_type,
+                os.path.join(folder, image_filename(campaign.start_date, image_type)), content_hash
+            )
+            for image_type, content_hash in stored.items()
+        ]
+        db.session.commit()
+    campaign_manifest.rebuild()  # New image URLs and hashes
+    return updated_images
 
 
 @uploads_bp.route("/<int:campaign_id>", methods=["POST"])
@@ -31,104 +102,217 @@ def _get_image_filename(campaign_start_date, image_type: str) -> str:
 def upload_image(campaign_id: int):
     """Upload images to an existing campaign."""
     campaign = Campaign.query.get_or_404(campaign_id)
-    folder = Path(campaign.folder_path)
     
     uploaded_files = []
-    updated_images = []
-    errors = []
+    
+    # Each image is hashed and stored while the body is parsed; one over its cap stops the request
+    try:
+        _, stored, rejected = receive_images(IMAGE_TYPES)
+    except UploadRejected as e:
+        return jsonify({"error": "No image was accepted", "errors": [str(e)]}), e.status_code
+    
+    errors = [f"Rejected {image_type} image: {error}" for image_type, error in rejected.items()]
+    rejected_status = next((error.status_code for error in rejected.values()), None)
     
     # Handle multiple image types
-    for image_type in ["background", "logo", "screensaver"]:
-        file = request.files.get(image_type)
-        if file and allowed_file(file.filename):
-            try:
-                # Generate filename: YYYY-MM-DDsuffix.png
-                filename = _get_image_filename(campaign.start_date, image_type)
-                path = save_image(file, folder / filename)
-                
-                # Update or create image record
-                img = CampaignImage.query.filter_by(
-                    campaign_id=campaign.id, image_type=image_type
-                ).first()
-                
-                old_path = None
-                if img:
-                    # Delete old image file if it exists and is different
-                    old_path = Path(img.file_path)
-                    if old_path.exists() and str(old_path) != str(path):
-                        try:
-                            old_path.unlink()
-                        except Exception as e:
-                            errors.append(f"Could not delete old {image_type} image: {e}")
-                    
-                    # Update existing image record
-                    img.file_path = str(path)
-                    updated_images.append({
-                        "type": image_type,
-                        "action": "updated",
-                        "old_path": str(old_path) if old_path else None,
-                        "new_path": str(path)
-                    })
-                else:
-                    # Create new image record
-                    img = CampaignImage(
-                        campaign_id=campaign.id,
-                        image_type=image_type,
-                        file_path=str(path)
-                    )
-                    db.session.add(img)
-                    updated_images.append({
-                        "type": image_type,
-                        "action": "created",
-                        "new_path": str(path)
-                    })
-                
-                uploaded_files.append({
-                    "type": image_type,
-                    "path": str(path),
-                    "filename": filename,
-                    "size": file.content_length or len(file.read())
-                })
-                
-                # Reset file pointer after reading for size
-                file.seek(0)
-                
-            except Exception as e:
-                errors.append(f"Failed to upload {image_type} image: {e}")
+    for image_type in IMAGE_TYPES:
+        if image_type in stored:
+            # Generate filename: YYYY-MM-DDsuffix.png
+            filename = image_filename(campaign.start_date, image_type)
+            uploaded_files.append({
+                "type": image_type,
+                "path": os.path.join(folder_publisher.published_path(campaign.start_date.isoformat()), filename),
+                "filename": filename,
+                "content_hash": stored[image_type]
+            })
     
     if not uploaded_files and not errors:
         return jsonify({"error": "No valid image files provided"}), 400
     
-    db.session.commit()
+    if not uploaded_files and rejected_status:
+        return jsonify({"error": "No image was accepted", "errors": errors}), rejected_status
+    
+    updated_images = _publish_images(campaign, stored) if stored else []
+    for uploaded in uploaded_files:
+        uploaded["size"] = os.path.getsize(uploaded["path"])
     
-    # Update log with detailed upload info
-    from models import ActivityLog
-    recent_log = ActivityLog.query.filter_by(
-        user_id=g.current_user.id,
-        action="upload_images"
-    ).order_by(ActivityLog.created_at.desc()).first()
+    # Hashing and resized/WebP variants run on the job pool, not this request
+    jobs = upload_jobs.submit(
+        [uploaded["path"] for uploaded in uploaded_files],
+        campaign_id=campaign_id,
+        user_id=g.current_user.id
+    )
     
-    if recent_log:
-        details = {
+    # Attach the details to this request's activity log row
+    annotate_activity(
+        details={
             "campaign_id": campaign_id,
             "campaign_name": campaign.name,
             "uploaded_files": uploaded_files,
             "updated_images": updated_images,
             "errors": errors,
+            "job_ids": [job.id for job in jobs],
             "success_count": len(uploaded_files),
             "error_count": len(errors)
-        }
-        recent_log.details = json.dumps(details)
-        recent_log.resource_id = str(campaign_id)
-        recent_log.status = "success" if not errors else "warning"
-        db.session.commit()
+        },
+        resource_id=campaign_id,
+        status="success" if not errors else "warning"
+    )
     
     response_data = {
         "message": "Images processed",
-        "uploaded_files": uploaded_files
+        "uploaded_files": uploaded_files,
+        "jobs": [job_summary(job) for job in jobs]
     }
     
     if errors:
         response_data["warnings"] = errors
     
-    return jsonify(response_data)
\ No newline at end of file
+    return jsonify(response_data)
+
+
+@uploads_bp.route("/jobs/<int:job_id>", methods=["GET"])
+@jwt_required
+def get_upload_job(job_id: int):
+    """Status of an upload post-processing job, for polling."""
+    job = _get_owned_or_404(UploadJob, job_id)
+    return jsonify(job.to_dict())
+
+
+def _session_error(error: Exception):
+    details = getattr(error, "details", {})
+    return jsonify({"error": str(error), **details}), error.status_code
+
+
+@uploads_bp.route("/<int:campaign_id>/sessions", methods=["POST"])
+@jwt_required
+@log_activity("start_upload_session", resource_type="campaign")
+def create_upload_session(campaign_id: int):
+    """Start a resumable upload of one image; chunks are then PUT to ``upload_url``."""
+    campaign = Campaign.query.get_or_404(campaign_id)
+    data = request.get_json() or {}
+    image_type = data.get("image_type")
+    filename = data.get("filename")
+    
+    if image_type not in IMAGE_TYPES:
+        return jsonify({"error": f"image_type must be one of: {', '.join(IMAGE_TYPES)}"}), 400
+    if filename and not allowed_file(filename):
+        return jsonify({"error": "File type not allowed"}), 400
+    try:
+        total_size = int(data.get("size"))
+    except (TypeError, ValueError):
+        return jsonify({"error": "size (bytes) is required"}), 400
+    if total_size <= 0:
+        return jsonify({"error": "size must be positive"}), 400
+    
+    limit = upload_limit(image_type)
+    if limit and total_size > limit:
+        return jsonify({"error": f"File exceeds the {limit} byte limit"}), 413
+    
+    session = upload_sessions.create(
+        campaign.id, g.current_user.id, image_type, total_size,
+        filename=filename, sha256=data.get("sha256")
+    )
+    
+    annotate_activity(
+        details={
+            "campaign_id": campaign.id,
+            "session_id": session.id,
+            "image_type": image_type,
+            "total_size": total_size
+        },
+        resource_id=campaign.id
+    )
+    
+    response_data = session.to_dict()
+    response_data["chunk_size"] = upload_sessions.max_chunk_bytes
+    return jsonify(response_data), 201
+
+
+@uploads_bp.route("/sessions/<session_id>", methods=["GET"])
+@jwt_required
+def get_upload_session(session_id: str):
+    """Session progress; ``received_bytes`` is the offset to resume from."""
+    session = _get_owned_or_404(UploadSession, session_id)
+    return jsonify(session.to_dict())
+
+
+@uploads_bp.route("/sessions/<session_id>", methods=["PUT"])
+@jwt_required
+def put_upload_chunk(session_id: str):
+    """Write the request body at ``?offset=``; ``X-Chunk-SHA256`` must match it."""
+    session = _get_owned_or_404(UploadSession, session_id)
+    offset = request.args.get("offset", type=int)
+    checksum = request.headers.get("X-Chunk-SHA256")
+    if offset is None or not checksum:
+        return jsonify({"error": "offset query parameter and X-Chunk-SHA256 header are required"}), 400
+    
+    try:
+        session = upload_sessions.write_chunk(
+            session, offset, request.stream, request.content_length, checksum,
+            inspect=check_image_signature
+        )
+    except (UploadSessionError, UploadRejected) as e:
+        return _session_error(e)
+    
+    return jsonify({
+        "id": session.id,
+        "received_bytes": session.received_bytes,
+        "total_size": session.total_size,
+        "complete": session.received_bytes == session.total_size
+    })
+
+
+@uploads_bp.route("/sessions/<session_id>/complete", methods=["POST"])
+@jwt_required
+@log_activity("upload_images", resource_type="campaign")
+def complete_upload_session(session_id: str):
+    """Assemble a fully received session into the campaign's image."""
+    session = _get_owned_or_404(UploadSession, session_id)
+    campaign = Campaign.query.get_or_404(session.campaign_id)
+    
+    try:
+        content_hash = upload_sessions.complete(session)
+    except UploadSessionError as e:
+        return _session_error(e)
+    
+    # Commits the session's completion together with the image row
+    filename = image_filename(campaign.start_date, session.image_type)
+    updated_image = _publish_images(campaign, {session.image_type: content_hash})[0]
+    path = updated_image["new_path"]
+    
+    jobs = upload_jobs.submit([path], campaign_id=campaign.id, user_id=g.current_user.id)
+    uploaded_file = {
+        "type": session.image_type,
+        "path": path,
+        "filename": filename,
+        "size": session.total_size,
+        "content_hash": content_hash
+    }
+    
+    annotate_activity(
+        details={
+            "campaign_id": campaign.id,
+            "campaign_name": campaign.name,
+            "session_id": session.id,
+            "uploaded_files": [uploaded_file],
+            "updated_images": [updated_image],
+            "job_ids": [job.id for job in jobs]
+        },
+        resource_id=campaign.id
+    )
+    
+    return jsonify({
+        "message": "Image processed",
+        "uploaded_files": [uploaded_file],
+        "jobs": [job_summary(job) for job in jobs]
+    })
+
+
+@uploads_bp.route("/sessions/<session_id>", methods=["DELETE"])
+@jwt_required
+def abort_upload_session(session_id: str):
+    """Abandon an upload session and discard the bytes received so far."""
+    session = _get_owned_or_404(UploadSession, session_id)
+    upload_sessions.abort(session)
+    return jsonify(session.to_dict())
@@ -1,9 +1,10 @@
 # api/users.py - Enhanced with comprehensive logging
 from flask import Blueprint, jsonify, request, g
-import json
 
-from models import User, db
-from auth.decorators import admin_required, log_activity
+from models import Campaign, User, db
+from auth.decorators import admin_required, annotate_activity, log_activity
+from auth.principal import invalidate_principal
+from services import log_facets
 
 
 users_bp = Blueprint("users", __name__)
@@ -50,24 +51,19 @@ def create_user():
     db.session.flush()  # Get the ID
     
     db.session.commit()
+    invalidate_principal(user.id)
+    log_facets.invalidate_users()
     
-    # Update log with user creation details
-    from models import ActivityLog
-    recent_log = ActivityLog.query.filter_by(
-        user_id=g.current_user.id,
-        action="create_user"
-    ).order_by(ActivityLog.created_at.desc()).first()
-    
-    if recent_log:
-        details = {
+    # Attach the details to this request's activity log row
+    annotate_activity(
+        details={
             "created_user_id": user.id,
             "created_user_email": email,
             "is_admin": is_admin,
             "created_by": g.current_user.email
-        }
-        recent_log.details = json.dumps(details)
-        recent_log.resource_id = str(user.id)
-        db.session.commit()
+        },
+        resource_id=user.id
+    )
     
     return jsonify({
         "id": user.id, 
@@ -100,22 +96,17 @@ def delete_user(user_id: int):
     
     db.session.delete(user)
     db.session.commit()
+    invalidate_principal(user_id)
+    log_facets.invalidate_users()
     
-    # Update log with deletion details
-    from models import ActivityLog
-    recent_log = ActivityLog.query.filter_by(
-        user_id=g.current_user.id,
-        action="delete_user"
-    ).order_by(ActivityLog.created_at.desc()).first()
-    
-    if recent_log:
-        details = {
+    # Attach the details to this request's activity log row
+    annotate_activity(
+        details={
             "deleted_user": user_info,
             "associated_campaigns": campaign_count,
             "deleted_by": g.current_user.email
-        }
-        recent_log.details = json.dumps(details)
-        recent_log.resource_id = str(user_id)
-        db.session.commit()
+        },
+        resource_id=user_id
+    )
     
     return jsonify({"message": "User deleted successfully"})
\ No newline at end of file
@@ -1,15 +1,53 @@
 """Utility functions for campaign management."""
 
-from pathlib import Path
-from typing import Iterable
+import os
+from datetime import date
+from typing import Dict, Iterable, Optional, Tuple
 
-from flask import current_app
-from werkzeug.datastructures import FileStorage
-from werkzeug.utils import secure_filename
+from flask import current_app, request
+from werkzeug.datastructures import MultiDict
+from werkzeug.formparser import MultiPartParser
+
+from models import Campaign
+from services import asset_store, folder_publisher
 
 
 ALLOWED_EXTENSIONS: Iterable[str] = {"png", "jpg", "jpeg"}
 
+# Leading bytes of each accepted image format
+IMAGE_SIGNATURES = {
+    "png": b"\x89PNG\r\n\x1a\n",
+    "jpeg": b"\xff\xd8\xff",
+}
+SIGNATURE_BYTES = max(len(signature) for signature in IMAGE_SIGNATURES.values())
+
+
+class UploadRejected(ValueError):
+    """An uploaded file refused for its size or content."""
+
+    def __init__(self, message: str, status_code: int) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def sniff_image_format(header: bytes) -> Optional[str]:
+    """Return the image format named by the file's magic bytes, if accepted."""
+    for image_format, signature in IMAGE_SIGNATURES.items():
+        if header.startswith(signature):
+            return image_format
+    return None
+
+
+def check_image_signature(header: bytes) -> None:
+    """Raise ``UploadRejected`` unless ``header`` starts like a PNG or JPEG."""
+    if sniff_image_format(header) is None:
+        raise UploadRejected("File content is not a PNG or JPEG image", 415)
+
+
+def upload_limit(image_type: str) -> Optional[int]:
+    """Per-type size cap from ``UPLOAD_MAX_<TYPE>_BYTES`` (None or 0 for no cap)."""
+    return current_app.config.get(f"UPLOAD_MAX_{image_type.upper()}_BYTES") or None
+
 
 def allowed_file(filename: str) -> bool:
     """Return True if the filename has an allowed extension."""
@@ -19,16 +57,168 @@ def allowed_file(filename: str) -> bool:
     )
 
 
-def create_campaign_folder(folder_name: str) -> Path:
-    """Create a folder for campaign assets."""
-    base = Path(current_app.config["UPLOAD_FOLDER"])
-    path = base / folder_name
-    path.mkdir(parents=True, exist_ok=True)
-    return path
+def image_filename(campaign_start_date: date, image_type: str) -> str:
+    """Generate the correct filename based on date and image type."""
+    date_str = campaign_start_date.isoformat()
+    
+    image_type_mapping = {
+        "background": "bkg",
+        "logo": "logo", 
+        "screensaver": "screensaver_bkg"
+    }
+    
+    suffix = image_type_mapping.get(image_type, image_type)
+    return f"{date_str}{suffix}.png"
+
+
+class _ImagePart:
+    """Where the multipart parser writes one image part: straight into a blob.
+
+    The part's size is checked against its type's cap on every chunk, so an
+    oversized image stops the request as soon as it passes the cap, and the
+    magic bytes are checked as soon as they have arrived. Content that isn't
+    an image is counted but no longer written.
+    """
+
+    def __init__(self, image_type: str, max_bytes: Optional[int]) -> None:
+        self.image_type = image_type
+        self.max_bytes = max_bytes
+        self.rejected: Optional[UploadRejected] = None
+        self.size = 0
+        self._head = b""
+        self._writer = asset_store.writer()
+
+    def write(self, chunk: bytes) -> None:
+        self.size += len(chunk)
+        if self.max_bytes and self.size > self.max_bytes:
+            raise UploadRejected(f"Invalid {self.image_type} image: file exceeds the {self.max_bytes} byte limit", 413)
+        if self.rejected is not None:
+            return
+        if self._head is not None:
+            self._head += chunk
+            if len(self._head) >= SIGNATURE_BYTES:
+                self._inspect()
+        if self.rejected is None:
+            self._writer.write(chunk)
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        return 0  # Called by the parser when the part ends; nothing is read back
+
+    def read(self, size: int = -1) -> bytes:
+        return b""
+
+    def finish(self) -> Optional[str]:
+        """Store the image and return its SHA-256, or None if it was rejected."""
+        if self._head is not None:
+            self._inspect()
+        return None if self.rejected is not None else self._writer.commit()
+
+    def discard(self) -> None:
+        self._writer.discard()
+
+    def _inspect(self) -> None:
+        try:
+            check_image_signature(self._head)
+        except UploadRejected as e:
+            self.rejected = e
+            self._writer.discard()
+        self._head = None
+
+
+class _ImagePartParser(MultiPartParser):
+    """Multipart parser that streams allowed image parts into ``_ImagePart`` containers."""
+
+    def __init__(self, image_types: Iterable[str], **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.image_types = set(image_types)
+        self.parts: Dict[str, _ImagePart] = {}
+
+    def start_file_streaming(self, event, total_content_length):
+        if event.name not in self.image_types or not allowed_file(event.filename or ""):
+            return super().start_file_streaming(event, total_content_length)
+        if event.name in self.parts:
+            self.parts.pop(event.name).discard()  # Repeated field; the last one wins
+        part = self.parts[event.name] = _ImagePart(event.name, upload_limit(event.name))
+        return part
+
+
+def receive_images(image_types: Iterable[str]) -> Tuple[MultiDict, Dict[str, str], Dict[str, UploadRejected]]:
+    """Parse a multipart request, storing its image parts while they arrive.
+
+    Returns the form fields, the digests of the stored images by type, and
+    the types whose content wasn't a PNG or JPEG. Each image is hashed and
+    written to the blob store in the same pass that reads it off the
+    request, instead of being spooled to a temp file first, and an image
+    over its ``UPLOAD_MAX_<TYPE>_BYTES`` cap raises ``UploadRejected`` (413)
+    without the rest of the body being read. Stored blobs only become
+    visible to the kiosk once their campaign folder is published.
+    """
+    boundary = request.mimetype_params.get("boundary", "").encode("latin-1")
+    if request.mimetype != "multipart/form-data" or not boundary:
+        return MultiDict(), {}, {}
+
+    parser = _ImagePartParser(
+        image_types,
+        max_form_memory_size=request.max_form_memory_size,
+        max_form_parts=request.max_form_parts,
+    )
+    try:
+        form, _ = parser.parse(request.stream, boundary, request.content_length)
+        stored, rejected = {}, {}
+        for image_type, part in parser.parts.items():
+            digest = part.finish()
+            if digest is None:
+                rejected[image_type] = part.rejected
+            else:
+                stored[image_type] = digest
+    finally:
+        for part in parser.parts.values():
+            part.discard()
+    return form, stored, rejected
+
+
+def campaign_files(campaign, start_date: Optional[date] = None,
+                   replacements: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """Filename -> blob digest for a campaign's folder, as ``folder_publisher.publish`` takes.
+
+    ``replacements`` maps image types to the digests of new uploads. Images
+    stored before the blob store existed are adopted into it on the way.
+    """
+    start_date = start_date or campaign.start_date
+    digests = dict(replacements or {})
+    for image in campaign.images:
+        if image.image_type in digests:
+            continue
+        if not image.content_hash and os.path.isfile(image.file_path):
+            image.content_hash = asset_store.adopt(image.file_path)
+        if image.content_hash:
+            digests[image.image_type] = image.content_hash
+    return {image_filename(start_date, image_type): digest for image_type, digest in digests.items()}
+
+
+def release_campaign_folder(publication, campaign, start_date: Optional[date] = None) -> bool:
+    """Take a campaign's images out of its date folder, when it is deleted or moved.
 
+    Several campaigns can start on the same date and share its folder, so
+    the folder is only removed once no other campaign starts then; until
+    then it is republished with the other campaigns' images. Returns True if
+    the folder was removed.
+    """
+    start_date = start_date or campaign.start_date
+    name = start_date.isoformat()
+    publication.lock(name)  # Before looking for other campaigns, so two deletes can't both keep it
+    others = Campaign.query.filter(Campaign.start_date == start_date, Campaign.id != campaign.id).all()
+    if not others:
+        return publication.unpublish(name)
 
-def save_image(file: FileStorage, path: Path) -> str:
-    """Save the uploaded file to the provided path."""
-    path = path.with_name(secure_filename(path.name))
-    file.save(path)
-    return str(path)
\ No newline at end of file
+    files: Dict[str, str] = {}
+    for other in others:
+        files.update(campaign_files(other, start_date))
+    remove = [
+        image_filename(start_date, image.image_type)
+        for image in campaign.images
+        if image_filename(start_date, image.image_type) not in files
+    ]
+    if files or os.path.isdir(folder_publisher.published_path(name)):
+        publication.publish(name, files, remove=remove)
+    return False
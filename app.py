@@ -1,13 +1,17 @@
 # app.py - Updated Flask application with enhanced activity logging
 """Flask application factory for the campaign manager with enhanced activity logging."""
 
-from flask import Flask, jsonify, send_from_directory, abort
+from flask import Flask, jsonify, abort
 from flask_cors import CORS
 from pathlib import Path
 import os
 
 from config import Config
 from database.db_setup import init_app
+import auth
+import services
+from services.image_urls import image_url
+from services.metrics import observe_request
 
 
 def register_blueprints(app: Flask) -> None:
@@ -18,6 +22,7 @@ def register_blueprints(app: Flask) -> None:
         ("api.users", "users_bp", "/api/users"),
         ("api.uploads", "uploads_bp", "/api/uploads"),
         ("api.logs", "bp", "/api/logs"),  # Enhanced logs blueprint
+        ("api.images", "images_bp", "/api/images"),
     ]
     
     registered_routes = []
@@ -50,6 +55,8 @@ def create_app(config_class: type[Config] = Config) -> Flask:
          expose_headers=["Content-Type", "Authorization"])
 
     init_app(app)
+    services.init_app(app)
+    auth.init_app(app)
     registration_status = register_blueprints(app)
     
     # Add explicit OPTIONS handler for preflight requests
@@ -64,32 +71,6 @@ def create_app(config_class: type[Config] = Config) -> Flask:
             response.headers.add('Access-Control-Allow-Credentials', 'true')
             return response
     
-    # Enhanced image serving endpoints
-    @app.route("/api/images/<path:filepath>")
-    def serve_image(filepath):
-        """Serve images from the assets directory."""
-        try:
-            upload_folder = app.config.get('UPLOAD_FOLDER', 'assets')
-            full_path = Path(upload_folder) / filepath
-            
-            # Security check
-            if not str(full_path.resolve()).startswith(str(Path(upload_folder).resolve())):
-                abort(403)
-            
-            if not full_path.exists():
-                print(f"Image not found: {full_path}")
-                abort(404)
-            
-            return send_from_directory(
-                directory=str(full_path.parent),
-                path=full_path.name,
-                as_attachment=False
-            )
-            
-        except Exception as e:
-            print(f"Error serving image {filepath}: {e}")
-            abort(404)
-    
     @app.route("/api/campaigns/<int:campaign_id>/images")
     def get_campaign_images(campaign_id):
         """Get all images for a specific campaign."""
@@ -101,12 +82,20 @@ def create_app(config_class: type[Config] = Config) -> Flask:
         image_data = {}
         for img in images:
             try:
-                # Convert absolute path to relative URL
+                # Convert absolute path to a relative URL, versioned by content
+                # so clients can cache it as immutable
                 relative_path = Path(img.file_path).relative_to(Path(app.config.get('UPLOAD_FOLDER', 'assets')))
-                image_url = f"/api/images/{relative_path}".replace("\\", "/")
+                if img.content_hash:
+                    etag = img.content_hash[:32]  # Same value the image endpoint derives
+                else:
+                    etag = services.image_etags.etag_for(img.file_path) if os.path.isfile(img.file_path) else None
                 
                 image_data[img.image_type] = {
-                    "url": image_url,
+                    "url": image_url(str(relative_path), etag),
+                    "thumbnail_url": image_url(
+                        str(relative_path), etag, w=services.image_derivatives.choose_width(1), fmt="auto"
+                    ),
+                    "etag": etag,
                     "path": img.file_path,
                     "uploaded_at": img.uploaded_at.isoformat() if img.uploaded_at else None
                 }
@@ -124,21 +113,52 @@ def create_app(config_class: type[Config] = Config) -> Flask:
         """Log request start time for duration calculation."""
         from flask import g
         from datetime import datetime
+        from time import perf_counter
         g.request_start_time = datetime.utcnow()
+        g.request_start_perf = perf_counter()
+        services.sql_profiler.start()
+        services.upload_jobs.resume_once()  # Jobs a previous process left queued
     
     @app.after_request
     def log_request_completion(response):
         """Log completed requests with performance metrics."""
+        try:
+            from flask import request, g
+            from time import perf_counter
+            
+            # Every response feeds the latency sketches, logged or not
+            start_perf = getattr(g, 'request_start_perf', None)
+            if start_perf is not None and request.endpoint != 'static':
+                duration = perf_counter() - start_perf
+                services.latency_recorder.record(
+                    f"{request.method} {request.endpoint or 'unmatched'}",
+                    duration * 1000,
+                    response.status_code
+                )
+                observe_request(
+                    request.method, request.blueprint, request.endpoint,
+                    response.status_code, duration
+                )
+        except Exception as e:
+            print(f"Latency tracking error: {e}")
+        
+        try:
+            response = services.sql_profiler.finish(response)
+        except Exception as e:
+            print(f"SQL profiling error: {e}")
+        
         if not app.config.get('ACTIVITY_LOGGING_ENABLED', True):
             return response
         
         try:
             from flask import request, g
             from datetime import datetime
-            from models import ActivityLog, db
             
             # Skip logging for static files and health checks
-            if (request.endpoint in ['static', 'health_check', 'list_routes'] or 
+            if (request.endpoint in ['static', 'health_check', 'health_live', 'health_ready',
+                                     'list_routes', 'metrics_endpoint', 'uploads.get_upload_job',
+                                     'uploads.get_upload_session', 'uploads.put_upload_chunk',
+                                     'campaigns.get_campaign_manifest'] or 
                 request.path.startswith('/api/images/')):
                 return response
             
@@ -170,6 +190,10 @@ def create_app(config_class: type[Config] = Config) -> Flask:
                     "content_length": response.content_length
                 }
                 
+                sql_profile = services.sql_profiler.summary()
+                if sql_profile:
+                    details["sql"] = sql_profile
+                
                 # Add query parameters (filtered)
                 if request.args:
                     safe_args = {k: v for k, v in request.args.items() 
@@ -177,8 +201,8 @@ def create_app(config_class: type[Config] = Config) -> Flask:
                     if safe_args:
                         details["query_params"] = safe_args
                 
-                # Log the request
-                log = ActivityLog(
+                # Hand the row to the background log writer
+                services.record_activity(
                     user_id=user.id if user else None,
                     action=action,
                     status=status,
@@ -188,30 +212,39 @@ def create_app(config_class: type[Config] = Config) -> Flask:
                     created_at=start_time
                 )
                 
-                db.session.add(log)
-                db.session.commit()
-                
         except Exception as e:
             # Don't fail the request due to logging issues
             print(f"Request logging error: {e}")
-            try:
-                db.session.rollback()
-            except:
-                pass
         
         return response
     
     # Enhanced test routes
+    @app.route("/api/health/live")
+    def health_live():
+        """Liveness probe: the process is up and serving requests."""
+        return jsonify({"status": "ok"})
+    
+    @app.route("/api/health/ready")
+    def health_ready():
+        """Readiness probe: the database answers a trivial query."""
+        from models import db
+        from sqlalchemy import text
+        
+        try:
+            db.session.execute(text("SELECT 1"))
+            return jsonify({"status": "ready"})
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({
+                "status": "unavailable",
+                "message": f"Database connectivity issue: {str(e)}"
+            }), 503
+    
     @app.route("/api/health")
     def health_check():
-        """Health check endpoint with system info."""
-        from models import ActivityLog, User, Campaign
-        
+        """Health check endpoint with system info (counts cached, see HEALTH_STATS_TTL_SECONDS)."""
         try:
-            # Test database connectivity
-            user_count = User.query.count()
-            campaign_count = Campaign.query.count()
-            log_count = ActivityLog.query.count()
+            counts = services.system_stats.get()
             
             return jsonify({
                 "status": "ok", 
@@ -219,10 +252,9 @@ def create_app(config_class: type[Config] = Config) -> Flask:
                 "registered_blueprints": registration_status,
                 "upload_folder": app.config.get('UPLOAD_FOLDER', 'assets'),
                 "system_info": {
-                    "users": user_count,
-                    "campaigns": campaign_count,
-                    "activity_logs": log_count,
-                    "logging_enabled": app.config.get('ACTIVITY_LOGGING_ENABLED', True)
+                    **counts,
+                    "logging_enabled": app.config.get('ACTIVITY_LOGGING_ENABLED', True),
+                    "log_writer": services.log_writer.stats()
                 },
                 "features": {
                     "enhanced_logging": True,
@@ -238,6 +270,23 @@ def create_app(config_class: type[Config] = Config) -> Flask:
                 "registered_blueprints": registration_status
             }), 500
     
+    @app.route("/metrics")
+    def metrics_endpoint():
+        """Prometheus text exposition of the application metrics."""
+        from flask import Response, request
+        
+        if not app.config.get('METRICS_ENABLED', True):
+            abort(404)
+        
+        token = app.config.get('METRICS_AUTH_TOKEN')
+        if token and request.headers.get('Authorization') != f"Bearer {token}":
+            return jsonify({"error": "Invalid metrics token"}), 401
+        
+        return Response(
+            services.metrics.render(),
+            content_type="text/plain; version=0.0.4; charset=utf-8"
+        )
+    
     @app.route("/api/routes")
     def list_routes():
         """List all available API routes with enhanced information."""
@@ -261,14 +310,29 @@ def create_app(config_class: type[Config] = Config) -> Flask:
                 "campaigns.update_campaign": "Update campaign",
                 "campaigns.delete_campaign": "Delete campaign",
                 "campaigns.get_active_campaign": "Get active campaign",
+                "campaigns.get_campaign_manifest": "Precomputed active and next campaign for kiosks (public, ETag)",
                 "users.list_users": "List all users (admin only)",
                 "users.create_user": "Create new user (admin only)",
                 "users.delete_user": "Delete user (admin only)",
-                "uploads.upload_image": "Upload campaign images",
+                "uploads.upload_image": "Upload campaign images (post-processing runs as background jobs)",
+                "uploads.get_upload_job": "Poll the status of an upload post-processing job",
+                "uploads.create_upload_session": "Start a resumable chunked image upload",
+                "uploads.get_upload_session": "Get a resumable upload's progress (offset to resume from)",
+                "uploads.put_upload_chunk": "Upload one chunk at an offset (X-Chunk-SHA256 required)",
+                "uploads.complete_upload_session": "Assemble a fully received upload into the campaign image",
+                "uploads.abort_upload_session": "Abandon a resumable upload",
                 "logs.list_logs": "List activity logs with filtering (admin only)",
+                "logs.list_log_filters": "Get cached activity log filter values (admin only)",
                 "logs.export_logs": "Export activity logs as CSV (admin only)",
+                "logs.stream_export_logs": "Stream activity logs as a CSV download (admin only)",
                 "logs.log_stats": "Get activity log statistics (admin only)",
-                "health_check": "API health check",
+                "logs.log_performance": "Get endpoint latency percentiles and error rates (admin only)",
+                "images.serve_image": "Serve campaign images (ETag, conditional and range requests)",
+                "get_campaign_images": "List a campaign's images with versioned URLs",
+                "health_check": "API health check with cached system counts",
+                "health_live": "Liveness probe (no database access)",
+                "health_ready": "Readiness probe (SELECT 1)",
+                "metrics_endpoint": "Prometheus metrics (bearer METRICS_AUTH_TOKEN when configured)",
                 "list_routes": "List all API routes"
             }
             
@@ -321,6 +385,15 @@ def create_app(config_class: type[Config] = Config) -> Flask:
             "status_code": 403
         }), 403
     
+    @app.errorhandler(413)
+    def request_too_large(error):
+        """Request body larger than MAX_CONTENT_LENGTH."""
+        return jsonify({
+            "error": "Payload Too Large",
+            "message": f"Uploads are limited to {app.config.get('MAX_CONTENT_LENGTH')} bytes per request.",
+            "status_code": 413
+        }), 413
+    
     @app.errorhandler(401)
     def unauthorized(error):
         """Enhanced 401 handler."""
@@ -1,5 +1,17 @@
 """Auth package exports."""
 
+from flask import Flask
+
+from . import jwt_handler, principal
+from .revocation import revocation_list
 from .routes import bp
 
-__all__ = ["bp"]
+
+def init_app(app: Flask) -> None:
+    """Configure the auth caches from the application config."""
+    principal.init_app(app)
+    jwt_handler.init_app(app)
+    revocation_list.init_app(app)
+
+
+__all__ = ["bp", "init_app"]
@@ -2,10 +2,14 @@
 from functools import wraps
 from flask import request, jsonify, g
 from datetime import datetime
+from werkzeug.exceptions import HTTPException
 import json
 
-from models import User, ActivityLog, db
+from models import db
+from services import record_activity, sql_profiler
 from .jwt_handler import decode_token
+from .principal import load_principal
+from .revocation import revocation_list
 
 
 def jwt_required(func):
@@ -20,10 +24,15 @@ def jwt_required(func):
             payload = decode_token(token)
         except Exception:
             return jsonify({"message": "Invalid token"}), 401
-        user = User.query.get(payload.get("sub"))
+        if revocation_list.is_revoked(payload.get("jti")):
+            return jsonify({"message": "Token has been revoked"}), 401
+        user = load_principal(payload.get("sub"))
         if not user:
             return jsonify({"message": "Invalid user"}), 401
         g.current_user = user
+        g.access_token = token
+        g.token_payload = payload
+        sql_profiler.start_for(user)
         return func(*args, **kwargs)
     return wrapper
 
@@ -40,6 +49,19 @@ def admin_required(func):
     return wrapper
 
 
+def annotate_activity(details: dict = None, resource_id=None, status: str = None, resource_type: str = None) -> None:
+    """Enrich the log row ``log_activity`` writes for the current request."""
+    context = g.setdefault("activity_log_context", {})
+    if details:
+        context.setdefault("details", {}).update(details)
+    if resource_id is not None:
+        context["resource_id"] = str(resource_id)
+    if status:
+        context["status"] = status
+    if resource_type:
+        context["resource_type"] = resource_type
+
+
 def log_activity(action: str, details: str = None, resource_type: str = None, resource_id: str = None):
     """Safe activity logging decorator with backward compatibility."""
     def decorator(func):
@@ -47,6 +69,7 @@ def log_activity(action: str, details: str = None, resource_type: str = None, re
         def wrapper(*args, **kwargs):
             # Execute the function first to get the response
             start_time = datetime.utcnow()
+            g.activity_log_context = {}
             
             try:
                 response = func(*args, **kwargs)
@@ -60,13 +83,24 @@ def log_activity(action: str, details: str = None, resource_type: str = None, re
                 else:
                     status_code = 200
                     
+            except HTTPException as e:
+                # abort(), get_or_404() and oversized request bodies (413) keep their status
+                response = jsonify({"error": e.description}), e.code
+                status = "error"
+                status_code = e.code
             except Exception as e:
                 response = jsonify({"error": str(e)}), 500
                 status = "error"
                 status_code = 500
             
+            if status == "error":
+                # Discard what the failed handler left uncommitted; it would also
+                # hold SQLite's write lock against the log writer's own session
+                db.session.rollback()
+            
             end_time = datetime.utcnow()
             duration_ms = int((end_time - start_time).total_seconds() * 1000)
+            context = g.pop("activity_log_context", {})
             
             # Log the activity safely
             user = getattr(g, "current_user", None)
@@ -103,11 +137,22 @@ def log_activity(action: str, details: str = None, resource_type: str = None, re
                         if not resource_id and 'id' in request.view_args:
                             log_details["resource_id"] = str(request.view_args['id'])
                         
+                        sql_profile = sql_profiler.summary()
+                        if sql_profile:
+                            log_details["sql"] = sql_profile
+                        
+                        # Merge what the handler recorded via annotate_activity()
+                        log_details.update(context.get("details", {}))
+                        if "resource_id" in context:
+                            log_details["resource_id"] = context["resource_id"]
+                        if status == "success" and context.get("status"):
+                            status = context["status"]
+                        
                         # Try to add enhanced fields
                         log_data.update({
                             'status': status,
                             'details': json.dumps(log_details),
-                            'resource_type': resource_type,
+                            'resource_type': context.get("resource_type", resource_type),
                             'resource_id': log_details.get("resource_id"),
                             'duration_ms': duration_ms
                         })
@@ -116,17 +161,11 @@ def log_activity(action: str, details: str = None, resource_type: str = None, re
                         # Enhanced columns don't exist, use basic logging
                         pass
                     
-                    log = ActivityLog(**log_data)
-                    db.session.add(log)
-                    db.session.commit()
+                    record_activity(**log_data)
                     
                 except Exception as log_error:
-                    print(f"Failed to log activity: {log_error}")
                     # Don't fail the main request due to logging issues
-                    try:
-                        db.session.rollback()
-                    except:
-                        pass
+                    print(f"Failed to log activity: {log_error}")
             
             return response
         return wrapper
@@ -1,9 +1,26 @@
- 
 """JWT encoding and decoding utilities."""
 
 from datetime import datetime, timedelta
+import hashlib
+import time
+import uuid
+
 import jwt
-from flask import current_app
+from flask import Flask, current_app
+
+from services.cache import TTLCache
+
+
+# Verified tokens keyed by SHA-256 digest -> (payload, exp timestamp)
+_verified_tokens = TTLCache(maxsize=4096, ttl=300, name="verified_tokens")
+
+
+def init_app(app: Flask) -> None:
+    """Size the verified-token cache from the application config."""
+    _verified_tokens.configure(
+        maxsize=app.config.get("TOKEN_CACHE_SIZE", 4096),
+        ttl=app.config.get("TOKEN_CACHE_TTL_SECONDS", 300),
+    )
 
 
 def create_token(user_id: int) -> str:
@@ -11,18 +28,49 @@ def create_token(user_id: int) -> str:
     payload = {
         "sub": user_id,
         "exp": datetime.utcnow() + timedelta(hours=8),
-         # Adding 'jti' for potential revocation, can be made more unique if needed
-        "jti": str(user_id) + str(datetime.utcnow().timestamp())
+        # Unique token id used for revocation on logout
+        "jti": uuid.uuid4().hex
     }
     secret = current_app.config["SECRET_KEY"]
     return jwt.encode(payload, secret, algorithm="HS256")
 
 
+def _token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
 def decode_token(token: str) -> dict:
-    """Decode a JWT and return the payload."""
+    """Decode a JWT and return the payload.
+
+    Tokens that already passed signature verification are served from a
+    bounded cache until their ``exp`` claim, which is checked on every hit.
+    """
+    digest = _token_digest(token)
+    cached = _verified_tokens.get(digest)
+    if cached is not None:
+        payload, expires_at = cached
+        if expires_at is None or time.time() < expires_at:
+            return dict(payload)
+        _verified_tokens.pop(digest)
+        raise jwt.ExpiredSignatureError("Signature has expired")
+
     secret = current_app.config["SECRET_KEY"]
-    return jwt.decode(token, secret, algorithms=["HS256"])
+    payload = jwt.decode(token, secret, algorithms=["HS256"])
+
+    expires_at = payload.get("exp")
+    ttl = _verified_tokens.ttl
+    if expires_at is not None:
+        ttl = min(ttl, expires_at - time.time())
+    if ttl > 0:
+        _verified_tokens.set(digest, (dict(payload), expires_at), ttl=ttl)
+    return payload
+
+
+def evict_token(token: str) -> None:
+    """Drop a token from the verified-token cache, e.g. when it is revoked."""
+    _verified_tokens.pop(_token_digest(token))
+
 
-# Note: If token revocation is needed, `is_token_revoked` and `revoke_token`
-# from the `main` branch would need to be added here, along with the JWTBlacklist model.
-# For now, keeping it simple as per the `vzu7ti-codex` version.
\ No newline at end of file
+def token_cache_stats() -> dict:
+    """Hit/miss counters for the verified-token cache."""
+    return _verified_tokens.stats()
@@ -0,0 +1,74 @@
+# auth/principal.py - Cached, detached view of the authenticated user
+"""Lightweight principals served to protected routes.
+
+``jwt_required`` used to load the full ``User`` row on every request. It now
+asks ``load_principal`` for a small immutable snapshot that is cached per
+user id for ``PRINCIPAL_CACHE_TTL_SECONDS``. Routes that change a user call
+``invalidate_principal`` so this worker never serves a stale snapshot; other
+workers pick the change up once their entry expires.
+"""
+
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+from flask import Flask
+
+from models import User
+from services.cache import TTLCache
+
+
+class Principal(NamedTuple):
+    """Detached snapshot of the fields routes read from ``g.current_user``."""
+
+    id: int
+    email: str
+    is_admin: bool
+    created_at: Optional[datetime]
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(
+            id=user.id,
+            email=user.email,
+            is_admin=bool(user.is_admin),
+            created_at=user.created_at,
+        )
+
+
+principal_cache = TTLCache(maxsize=1024, ttl=60, name="principals")
+
+
+def init_app(app: Flask) -> None:
+    """Size the principal cache from the application config."""
+    principal_cache.configure(
+        maxsize=app.config.get("PRINCIPAL_CACHE_SIZE", 1024),
+        ttl=app.config.get("PRINCIPAL_CACHE_TTL_SECONDS", 60),
+    )
+
+
+def load_principal(user_id) -> Optional[Principal]:
+    """Return the principal for ``user_id``, or None if the user doesn't exist."""
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+
+    principal = principal_cache.get(user_id)
+    if principal is not None:
+        return principal
+
+    user = User.query.get(user_id)
+    if user is None:
+        return None
+
+    principal = Principal.from_user(user)
+    principal_cache.set(user_id, principal)
+    return principal
+
+
+def invalidate_principal(user_id) -> None:
+    """Forget the cached principal after the user row changes."""
+    try:
+        principal_cache.pop(int(user_id))
+    except (TypeError, ValueError):
+        pass
@@ -0,0 +1,130 @@
+# auth/revocation.py - JWT revocation backed by jwt_blacklist
+"""Token revocation with an in-memory JTI set.
+
+Revoked JTIs are persisted to ``jwt_blacklist`` and mirrored in a per-worker
+set, so ``jwt_required`` answers "is this token revoked?" with a set lookup.
+The set is loaded on first use and topped up with rows revoked by other
+workers at most every ``REVOCATION_REFRESH_SECONDS``, found by their
+database-assigned id (a client-side timestamp would miss a revocation that
+commits late). Entries for tokens that have expired anyway are dropped from
+memory and removed by ``prune_expired``.
+
+Databases created before ``jwt_blacklist.expires_at`` existed keep working
+without it (revocations then never expire) until the column is added by
+``scripts/init_db.py`` or ``database/migrations.sql``.
+"""
+
+from datetime import datetime
+from threading import Lock
+from time import monotonic
+from typing import Dict, Optional
+
+from flask import Flask
+from sqlalchemy import insert, inspect
+
+from models import JWTBlacklist, db
+
+
+# Ids below the watermark re-read on every sync; covers inserts that were
+# assigned an id before a row that committed ahead of them
+SYNC_OVERLAP_IDS = 100
+
+
+class RevocationList:
+    """Hot set of revoked JTIs with a database backing store."""
+
+    def __init__(self, refresh_seconds: int = 30) -> None:
+        self.refresh_seconds = refresh_seconds
+        self._lock = Lock()
+        self._expiry: Dict[str, Optional[datetime]] = {}
+        self._loaded = False
+        self._synced_at = 0.0
+        self._last_id = 0
+        self._has_expiry: Optional[bool] = None
+
+    def init_app(self, app: Flask) -> None:
+        """Read settings and schedule a reload on the next check."""
+        self.refresh_seconds = app.config.get("REVOCATION_REFRESH_SECONDS", self.refresh_seconds)
+        with self._lock:
+            self._expiry.clear()
+            self._loaded = False
+            self._last_id = 0
+            self._has_expiry = None
+
+    def is_revoked(self, jti: Optional[str]) -> bool:
+        """Return True if the token with this JTI has been revoked."""
+        if not jti:
+            return False
+        if not self._loaded or monotonic() - self._synced_at > self.refresh_seconds:
+            self._sync()
+        return jti in self._expiry
+
+    def revoke(self, jti: str, expires_at: Optional[datetime] = None) -> None:
+        """Persist a revocation and add it to the in-memory set."""
+        if not jti:
+            return
+        if not JWTBlacklist.query.with_entities(JWTBlacklist.id).filter_by(jti=jti).first():
+            values = {"jti": jti}
+            if self._expiry_supported():
+                values["expires_at"] = expires_at
+            db.session.execute(insert(JWTBlacklist), values)
+            db.session.commit()
+        with self._lock:
+            self._expiry[jti] = expires_at
+
+    def prune_expired(self, now: Optional[datetime] = None) -> int:
+        """Delete revocations whose tokens have expired; return the row count."""
+        now = now or datetime.utcnow()
+        if not self._expiry_supported():
+            return 0
+        deleted = JWTBlacklist.query.filter(
+            JWTBlacklist.expires_at.isnot(None),
+            JWTBlacklist.expires_at < now
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        with self._lock:
+            self._drop_expired(now)
+        return deleted
+
+    def __len__(self) -> int:
+        return len(self._expiry)
+
+    def _expiry_supported(self) -> bool:
+        """True once ``jwt_blacklist.expires_at`` exists (checked once per process)."""
+        if self._has_expiry is None:
+            columns = {column["name"] for column in inspect(db.engine).get_columns(JWTBlacklist.__tablename__)}
+            self._has_expiry = "expires_at" in columns
+            if not self._has_expiry:
+                print("jwt_blacklist.expires_at is missing; run scripts/init_db.py to add it")
+        return self._has_expiry
+
+    def _sync(self) -> None:
+        with self._lock:
+            now = datetime.utcnow()
+            if self._expiry_supported():
+                query = db.session.query(
+                    JWTBlacklist.id, JWTBlacklist.jti, JWTBlacklist.expires_at
+                ).filter(
+                    db.or_(JWTBlacklist.expires_at.is_(None), JWTBlacklist.expires_at >= now)
+                )
+            else:
+                query = db.session.query(JWTBlacklist.id, JWTBlacklist.jti, db.null())
+            if self._loaded:
+                query = query.filter(JWTBlacklist.id > self._last_id - SYNC_OVERLAP_IDS)
+
+            for row_id, jti, expires_at in query.all():
+                self._expiry[jti] = expires_at
+                self._last_id = max(self._last_id, row_id)
+
+            self._drop_expired(now)
+            self._loaded = True
+            self._synced_at = monotonic()
+
+    def _drop_expired(self, now: datetime) -> None:
+        expired = [jti for jti, expires_at in self._expiry.items() if expires_at and expires_at < now]
+        for jti in expired:
+            del self._expiry[jti]
+
+
+# Singleton revocation list consulted by jwt_required
+revocation_list = RevocationList()
@@ -1,10 +1,14 @@
 # auth/routes.py - Enhanced with comprehensive logging
+from datetime import datetime
 from flask import Blueprint, jsonify, request, g
 import json
 
 from models import User, db
-from .jwt_handler import create_token
+from services import record_activity
+from .jwt_handler import create_token, evict_token
 from .decorators import jwt_required, log_activity
+from .principal import invalidate_principal
+from .revocation import revocation_list
 
 
 bp = Blueprint("auth", __name__)
@@ -32,31 +36,26 @@ def login():
     
     if not user:
         # Update log with failed attempt
-        from models import ActivityLog
-        log = ActivityLog(
+        record_activity(
             user_id=None,
             action="login_failed",
             status="error",
             ip_address=request.remote_addr,
             details=json.dumps({**attempt_details, "reason": "email_not_authorized"})
         )
-        db.session.add(log)
-        db.session.commit()
         
         return jsonify({"message": "Email not authorized"}), 401
     
     # If user exists but has no password set (first time login)
     if not user.password_hash or user.password_hash == "":
         # Log first-time login detection
-        log = ActivityLog(
+        record_activity(
             user_id=user.id,
             action="first_time_login_detected",
             status="success",
             ip_address=request.remote_addr,
             details=json.dumps({**attempt_details, "requires_password_setup": True})
         )
-        db.session.add(log)
-        db.session.commit()
         
         return jsonify({
             "message": "First time login - password required",
@@ -67,15 +66,13 @@ def login():
     # Normal login flow
     if not user.check_password(password):
         # Log failed login
-        log = ActivityLog(
+        record_activity(
             user_id=user.id,
             action="login_failed",
             status="error",
             ip_address=request.remote_addr,
             details=json.dumps({**attempt_details, "reason": "invalid_password"})
         )
-        db.session.add(log)
-        db.session.commit()
         
         return jsonify({"message": "Invalid credentials"}), 401
     
@@ -83,7 +80,7 @@ def login():
     token = create_token(user.id)
     
     # Log successful login
-    log = ActivityLog(
+    record_activity(
         user_id=user.id,
         action="login_success",
         status="success",
@@ -94,8 +91,6 @@ def login():
             "is_admin": user.is_admin
         })
     )
-    db.session.add(log)
-    db.session.commit()
     
     return jsonify({
         "token": token,
@@ -125,10 +120,10 @@ def set_password():
     # Set the password
     user.set_password(password)
     db.session.commit()
+    invalidate_principal(user.id)
     
     # Log password setup
-    from models import ActivityLog
-    log = ActivityLog(
+    record_activity(
         user_id=user.id,
         action="password_set_success",
         status="success",
@@ -140,8 +135,6 @@ def set_password():
             "ip_address": request.remote_addr
         })
     )
-    db.session.add(log)
-    db.session.commit()
     
     # Return JWT token for immediate login
     token = create_token(user.id)
@@ -176,10 +169,16 @@ def get_current_user():
 @jwt_required
 @log_activity("logout", "User logged out")
 def logout():
-    """Logout endpoint with activity logging."""
+    """Revoke the current token and log the logout."""
+    exp = g.token_payload.get("exp")
+    revocation_list.revoke(
+        g.token_payload.get("jti"),
+        datetime.utcfromtimestamp(exp) if exp else None
+    )
+    evict_token(g.access_token)
+    
     # Log the logout
-    from models import ActivityLog
-    log = ActivityLog(
+    record_activity(
         user_id=g.current_user.id,
         action="logout_success",
         status="success",
@@ -189,7 +188,5 @@ def logout():
             "email": g.current_user.email
         })
     )
-    db.session.add(log)
-    db.session.commit()
     
     return jsonify({"message": "Logged out successfully"})
\ No newline at end of file
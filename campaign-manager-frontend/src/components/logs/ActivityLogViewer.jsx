@@ -5,7 +5,7 @@ import {
   User, Activity, AlertCircle, CheckCircle, 
   XCircle, Clock, ChevronLeft, ChevronRight 
 } from 'lucide-react';
-import { fetchLogs, exportLogs, getLogStats } from '../../services/logs';
+import { fetchLogs, fetchLogFilters, exportLogs, getLogStats } from '../../services/logs';
 import LogsFilter from './LogsFilter';
 import LogEntry from './LogEntry';
 import LogStats from './LogStats';
@@ -47,7 +47,7 @@ const ActivityLogViewer = () => {
       
       setLogs(data.logs || []);
       setPagination(data.pagination || {});
-      setFilterOptions(data.filters || {});
+      if (data.filters) setFilterOptions(data.filters);
       
       // Load stats if no specific filters are applied
       if (!newFilters.user_id && !newFilters.action && !newFilters.status) {
@@ -133,6 +133,9 @@ const ActivityLogViewer = () => {
 
   useEffect(() => {
     loadLogs();
+    fetchLogFilters()
+      .then((response) => setFilterOptions(response.data || {}))
+      .catch((filtersError) => console.warn('Failed to load log filters:', filtersError));
   }, []);
 
   return (
@@ -1,6 +1,6 @@
 // hooks/useActivityLogs.js - Custom hook for activity logs management
 import { useState, useEffect, useCallback } from 'react';
-import { fetchLogs, exportLogs, getLogStats } from '../services/logs';
+import { fetchLogs, fetchLogFilters, exportLogs, getLogStats } from '../services/logs';
 
 const useActivityLogs = (initialFilters = {}) => {
   const [logs, setLogs] = useState([]);
@@ -37,7 +37,7 @@ const useActivityLogs = (initialFilters = {}) => {
       
       setLogs(data.logs || []);
       setPagination(data.pagination || {});
-      setFilterOptions(data.filters || {});
+      if (data.filters) setFilterOptions(data.filters);
       
       // Load stats if no specific filters are applied
       if (!newFilters.user_id && !newFilters.action && !newFilters.status) {
@@ -122,6 +122,9 @@ const useActivityLogs = (initialFilters = {}) => {
 
   useEffect(() => {
     loadLogs();
+    fetchLogFilters()
+      .then((response) => setFilterOptions(response.data || {}))
+      .catch((filtersError) => console.warn('Failed to load log filters:', filtersError));
   }, []);
 
   return {
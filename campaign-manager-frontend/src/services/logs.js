@@ -17,6 +17,10 @@ export const fetchLogs = (filters = {}) => {
   return api.get(`/logs?${params.toString()}`);
 };
 
+export const fetchLogFilters = () => {
+  return api.get('/logs/filters');
+};
+
 export const exportLogs = (filters = {}) => {
   const params = new URLSearchParams();
   
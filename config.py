@@ -12,6 +12,42 @@ class Config:
     )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     UPLOAD_FOLDER = os.getenv("UPLOAD_FOLDER", "assets")
+    # Whole-request cap enforced by Flask (413), plus per-image-type caps checked while streaming
+    MAX_CONTENT_LENGTH = int(os.getenv("MAX_CONTENT_LENGTH", str(64 * 1024 * 1024)))
+    UPLOAD_MAX_BACKGROUND_BYTES = int(os.getenv("UPLOAD_MAX_BACKGROUND_BYTES", str(20 * 1024 * 1024)))
+    UPLOAD_MAX_LOGO_BYTES = int(os.getenv("UPLOAD_MAX_LOGO_BYTES", str(5 * 1024 * 1024)))
+    UPLOAD_MAX_SCREENSAVER_BYTES = int(os.getenv("UPLOAD_MAX_SCREENSAVER_BYTES", str(20 * 1024 * 1024)))
+    # Content-addressed blobs behind the date folders; keep on UPLOAD_FOLDER's filesystem for hard links
+    ASSET_BLOB_FOLDER = os.getenv("ASSET_BLOB_FOLDER", "asset_blobs")
+    ASSET_LINK_MODE = os.getenv("ASSET_LINK_MODE", "hardlink")  # hardlink or symlink
+    # Date folders are built under UPLOAD_FOLDER/<versions dir> and swapped in with a symlink. Windows needs admin
+    # rights or developer mode for symlinks; without them "rename" is used, which briefly leaves no folder on a swap
+    CAMPAIGN_PUBLISH_MODE = os.getenv("CAMPAIGN_PUBLISH_MODE", "symlink")
+    CAMPAIGN_VERSIONS_DIR = os.getenv("CAMPAIGN_VERSIONS_DIR", ".versions")
+    # Unversioned image URLs are cached this long, then revalidated by ETag
+    IMAGE_CACHE_MAX_AGE_SECONDS = int(os.getenv("IMAGE_CACHE_MAX_AGE_SECONDS", "60"))
+    # Content hashes behind the image ETags, keyed by path, size and mtime
+    IMAGE_ETAG_CACHE_SIZE = int(os.getenv("IMAGE_ETAG_CACHE_SIZE", "4096"))
+    IMAGE_ETAG_CACHE_TTL_SECONDS = int(os.getenv("IMAGE_ETAG_CACHE_TTL_SECONDS", "3600"))
+    # Let the front proxy stream images: "x-accel" (nginx), "x-sendfile", or empty to serve from Flask
+    IMAGE_OFFLOAD_MODE = os.getenv("IMAGE_OFFLOAD_MODE", "")
+    # nginx internal location aliased to UPLOAD_FOLDER, used by x-accel
+    IMAGE_OFFLOAD_PREFIX = os.getenv("IMAGE_OFFLOAD_PREFIX", "/protected-images/")
+    IMAGE_CACHE_OFFLOAD_PREFIX = os.getenv("IMAGE_CACHE_OFFLOAD_PREFIX", "/protected-image-cache/")
+    # Resized/re-encoded variants (?w=&fmt=), cached outside UPLOAD_FOLDER
+    IMAGE_CACHE_FOLDER = os.getenv("IMAGE_CACHE_FOLDER", "image_cache")
+    IMAGE_DERIVATIVE_WIDTHS = os.getenv("IMAGE_DERIVATIVE_WIDTHS", "320,1280,1920")
+    IMAGE_DERIVATIVE_FORMATS = os.getenv("IMAGE_DERIVATIVE_FORMATS", "webp,avif")  # avif needs pillow-avif-plugin
+    IMAGE_DERIVATIVE_QUALITY = int(os.getenv("IMAGE_DERIVATIVE_QUALITY", "82"))
+    IMAGE_PREGENERATE_ON_UPLOAD = os.getenv("IMAGE_PREGENERATE_ON_UPLOAD", "true").lower() == "true"
+    # Upload post-processing jobs (hashing, derivatives); "process" runs image work in a process pool
+    UPLOAD_JOBS_ASYNC = os.getenv("UPLOAD_JOBS_ASYNC", "true").lower() == "true"
+    UPLOAD_JOB_EXECUTOR = os.getenv("UPLOAD_JOB_EXECUTOR", "thread")
+    UPLOAD_JOB_WORKERS = int(os.getenv("UPLOAD_JOB_WORKERS", "0"))  # 0 = one per CPU
+    UPLOAD_JOB_STALE_SECONDS = int(os.getenv("UPLOAD_JOB_STALE_SECONDS", "600"))
+    # Resumable chunked uploads (/api/uploads/<campaign_id>/sessions)
+    UPLOAD_CHUNK_MAX_BYTES = int(os.getenv("UPLOAD_CHUNK_MAX_BYTES", str(8 * 1024 * 1024)))
+    UPLOAD_SESSION_TTL_HOURS = int(os.getenv("UPLOAD_SESSION_TTL_HOURS", "24"))
     
     # Enhanced logging configuration
     ACTIVITY_LOGGING_ENABLED = True
@@ -19,6 +55,60 @@ class Config:
     LOG_REQUEST_DETAILS = True
     MAX_LOG_RETENTION_DAYS = int(os.getenv("MAX_LOG_RETENTION_DAYS", "90"))
     LOG_EXPORT_MAX_RECORDS = int(os.getenv("LOG_EXPORT_MAX_RECORDS", "10000"))
+    # Streaming CSV export (/api/logs/export.csv); 0 means no row cap
+    LOG_EXPORT_STREAM_MAX_RECORDS = int(os.getenv("LOG_EXPORT_STREAM_MAX_RECORDS", "0"))
+    LOG_EXPORT_BATCH_SIZE = int(os.getenv("LOG_EXPORT_BATCH_SIZE", "1000"))
+    LOG_EXPORT_CHUNK_BYTES = int(os.getenv("LOG_EXPORT_CHUNK_BYTES", str(64 * 1024)))
+    
+    # Background activity log writer
+    LOG_WRITER_ASYNC = os.getenv("LOG_WRITER_ASYNC", "true").lower() == "true"
+    LOG_WRITER_BATCH_SIZE = int(os.getenv("LOG_WRITER_BATCH_SIZE", "200"))
+    LOG_WRITER_FLUSH_INTERVAL_MS = int(os.getenv("LOG_WRITER_FLUSH_INTERVAL_MS", "500"))
+    LOG_WRITER_QUEUE_SIZE = int(os.getenv("LOG_WRITER_QUEUE_SIZE", "10000"))
+    LOG_WRITER_ENQUEUE_TIMEOUT_MS = int(os.getenv("LOG_WRITER_ENQUEUE_TIMEOUT_MS", "50"))
+    # Full reload interval for the cached log filter values
+    LOG_FACETS_TTL_SECONDS = int(os.getenv("LOG_FACETS_TTL_SECONDS", "600"))
+    # Maintain activity_rollups from the log writer; /api/logs/stats reads the raw logs for days it doesn't cover
+    # (everything before it was enabled until scripts/backfill_activity_rollups.py runs, or all days when off)
+    LOG_ROLLUPS_ENABLED = os.getenv("LOG_ROLLUPS_ENABLED", "true").lower() == "true"
+    # Per-endpoint latency sketches behind /api/logs/performance
+    LATENCY_TRACKING_ENABLED = os.getenv("LATENCY_TRACKING_ENABLED", "true").lower() == "true"
+    LATENCY_FLUSH_INTERVAL_SECONDS = int(os.getenv("LATENCY_FLUSH_INTERVAL_SECONDS", "15"))
+    
+    # How long /api/health reuses its row counts
+    HEALTH_STATS_TTL_SECONDS = int(os.getenv("HEALTH_STATS_TTL_SECONDS", "60"))
+    
+    # Prometheus-style /metrics endpoint
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    METRICS_AUTH_TOKEN = os.getenv("METRICS_AUTH_TOKEN")  # Bearer token required by /metrics when set
+    # Directory shared by all workers; enables file-backed multiprocess aggregation
+    METRICS_MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR")
+    METRICS_SNAPSHOT_INTERVAL_SECONDS = int(os.getenv("METRICS_SNAPSHOT_INTERVAL_SECONDS", "5"))
+    
+    # Per-request SQL profiler: always on, or per request via the header (admins, or anyone in DEBUG)
+    SQL_PROFILING_ENABLED = os.getenv("SQL_PROFILING_ENABLED", "false").lower() == "true"
+    SQL_PROFILING_ALLOW_HEADER = os.getenv("SQL_PROFILING_ALLOW_HEADER", "false").lower() == "true"
+    SQL_PROFILING_HEADER = os.getenv("SQL_PROFILING_HEADER", "X-Profile-SQL")
+    # Executions of one statement in a request that count as a likely N+1
+    SQL_PROFILING_REPEAT_THRESHOLD = int(os.getenv("SQL_PROFILING_REPEAT_THRESHOLD", "3"))
+    
+    # Authenticated-user cache used by jwt_required
+    PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "1024"))
+    PRINCIPAL_CACHE_TTL_SECONDS = int(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+    # Verified JWT cache; entries never outlive the token's exp claim
+    TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "4096"))
+    TOKEN_CACHE_TTL_SECONDS = int(os.getenv("TOKEN_CACHE_TTL_SECONDS", "300"))
+    # How often each worker picks up tokens revoked by other workers
+    REVOCATION_REFRESH_SECONDS = int(os.getenv("REVOCATION_REFRESH_SECONDS", "30"))
+    
+    # Campaign status engine: how often to re-read the next transition date
+    # so changes made by other workers are picked up
+    CAMPAIGN_STATUS_RECHECK_SECONDS = int(os.getenv("CAMPAIGN_STATUS_RECHECK_SECONDS", "300"))
+    # Maximum age of the in-process active campaign interval index
+    CAMPAIGN_INDEX_TTL_SECONDS = int(os.getenv("CAMPAIGN_INDEX_TTL_SECONDS", "30"))
+    # Precomputed active/next campaign manifest shared by all app processes, and how long clients may cache it
+    CAMPAIGN_MANIFEST_PATH = os.getenv("CAMPAIGN_MANIFEST_PATH", "campaign_manifest.json")
+    CAMPAIGN_MANIFEST_MAX_AGE_SECONDS = int(os.getenv("CAMPAIGN_MANIFEST_MAX_AGE_SECONDS", "30"))
 
 
 class DevelopmentConfig(Config):
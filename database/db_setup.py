@@ -1,6 +1,7 @@
 """Database initialization utilities."""
 
 from flask import Flask
+from sqlalchemy import inspect, text
 
 from models import db  # Import db instance and models
 
@@ -14,3 +15,34 @@ def create_tables(app: Flask) -> None:
     """Create database tables within the app context."""
     with app.app_context():
         db.create_all()
+    ensure_columns(app)
+    ensure_indexes(app)
+
+
+def ensure_columns(app: Flask) -> None:
+    """Add nullable model columns that are missing from existing tables."""
+    with app.app_context():
+        inspector = inspect(db.engine)
+        existing_tables = set(inspector.get_table_names())
+        
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                column_type = column.type.compile(dialect=db.engine.dialect)
+                with db.engine.begin() as connection:
+                    connection.execute(text(
+                        f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"
+                    ))
+                print(f"➕ Added column {table.name}.{column.name}")
+
+
+def ensure_indexes(app: Flask) -> None:
+    """Create model indexes that are missing from an existing database."""
+    with app.app_context():
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=db.engine, checkfirst=True)
@@ -1 +1,12 @@
- 
+-- database/migrations.sql - Schema changes for databases created by older versions
+-- scripts/init_db.py applies these automatically (create_tables -> ensure_columns,
+-- ensure_indexes); run them by hand only when upgrading without it.
+
+-- Revoked tokens remember their own expiry so they can be pruned
+ALTER TABLE jwt_blacklist ADD COLUMN expires_at DATETIME;
+CREATE INDEX IF NOT EXISTS ix_jwt_blacklist_expires_at ON jwt_blacklist (expires_at);
+CREATE INDEX IF NOT EXISTS ix_jwt_blacklist_revoked_at ON jwt_blacklist (revoked_at);
+
+-- Campaign images record the SHA-256 of the blob their file links to
+ALTER TABLE campaign_images ADD COLUMN content_hash VARCHAR(64);
+CREATE INDEX IF NOT EXISTS ix_campaign_images_content_hash ON campaign_images (content_hash);
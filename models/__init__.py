@@ -7,8 +7,16 @@ db = SQLAlchemy()
 
 # Import all models
 from .user import User
-from .campaign import Campaign, CampaignImage, CampaignStatus
-from .log import ActivityLog, JWTBlacklist
+from .campaign import (
+    Campaign,
+    CampaignImage,
+    CampaignStatus,
+    JobStatus,
+    UploadJob,
+    UploadSession,
+    UploadSessionStatus,
+)
+from .log import ActivityLog, ActivityRollup, EndpointLatency, JWTBlacklist
 
 # Define what gets imported with "from models import *"
 __all__ = [
@@ -17,6 +25,12 @@ __all__ = [
     "Campaign",
     "CampaignImage",
     "CampaignStatus",
+    "JobStatus",
+    "UploadJob",
+    "UploadSession",
+    "UploadSessionStatus",
     "ActivityLog",
+    "ActivityRollup",
+    "EndpointLatency",
     "JWTBlacklist",
 ]
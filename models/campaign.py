@@ -1,5 +1,6 @@
 """Campaign-related database models."""
 
+import json
 from datetime import date, datetime
 from enum import Enum
 
@@ -16,15 +17,35 @@ class CampaignStatus(str, Enum):
     EXPIRED = "expired"
 
 
+class JobStatus(str, Enum):
+    """Lifecycle of an upload post-processing job."""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class UploadSessionStatus(str, Enum):
+    """Lifecycle of a resumable upload session."""
+
+    OPEN = "open"
+    COMPLETED = "completed"
+    ABORTED = "aborted"
+
+
 class Campaign(db.Model):
     """Represents a promotional campaign."""
 
     __tablename__ = "campaigns"
+    __table_args__ = (
+        db.Index("ix_campaigns_status_dates", "status", "start_date", "end_date"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(80), nullable=False)
-    start_date = db.Column(db.Date, nullable=False)
-    end_date = db.Column(db.Date, nullable=False)
+    start_date = db.Column(db.Date, nullable=False, index=True)
+    end_date = db.Column(db.Date, nullable=False, index=True)
     status = db.Column(db.String(20), default=CampaignStatus.SCHEDULED.value)
     folder_path = db.Column(db.String(255), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
@@ -59,9 +80,94 @@ class CampaignImage(db.Model):
     campaign_id = db.Column(db.Integer, db.ForeignKey("campaigns.id"), nullable=False)
     image_type = db.Column(db.String(20), nullable=False)
     file_path = db.Column(db.String(255), nullable=False)
+    content_hash = db.Column(db.String(64), index=True)  # SHA-256 of the blob file_path links to
     uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     campaign = relationship("Campaign", back_populates="images")
 
     def __repr__(self) -> str:  # pragma: no cover
         return f"<CampaignImage {self.image_type}>"
+
+
+class UploadJob(db.Model):
+    """Post-processing work queued for an uploaded campaign image."""
+
+    __tablename__ = "upload_jobs"
+    __table_args__ = (
+        db.Index("ix_upload_jobs_status_created_at", "status", "created_at"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default=JobStatus.QUEUED.value)
+    campaign_id = db.Column(db.Integer, db.ForeignKey("campaigns.id", ondelete="SET NULL"), index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"))
+    file_path = db.Column(db.String(255), nullable=False)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    result = db.Column(db.Text)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (JobStatus.SUCCEEDED.value, JobStatus.FAILED.value)
+
+    def to_dict(self):
+        """Convert to dictionary for JSON serialization."""
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "campaign_id": self.campaign_id,
+            "file_path": self.file_path,
+            "attempts": self.attempts,
+            "result": json.loads(self.result) if self.result else None,
+            "error": self.error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+    def __repr__(self) -> str:  # pragma: no cover
+        return f"<UploadJob {self.id} {self.kind} {self.status}>"
+
+
+class UploadSession(db.Model):
+    """Resumable, chunked upload of one campaign image."""
+
+    __tablename__ = "upload_sessions"
+
+    id = db.Column(db.String(32), primary_key=True)  # Random token used in the URLs
+    campaign_id = db.Column(db.Integer, db.ForeignKey("campaigns.id", ondelete="CASCADE"), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    image_type = db.Column(db.String(20), nullable=False)
+    filename = db.Column(db.String(255))
+    total_size = db.Column(db.Integer, nullable=False)
+    received_bytes = db.Column(db.Integer, nullable=False, default=0)  # Contiguous bytes written
+    sha256 = db.Column(db.String(64))  # Expected digest of the whole file, if the client sent one
+    status = db.Column(db.String(20), nullable=False, default=UploadSessionStatus.OPEN.value, index=True)
+    content_hash = db.Column(db.String(64))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def to_dict(self):
+        """Convert to dictionary for JSON serialization."""
+        return {
+            "id": self.id,
+            "campaign_id": self.campaign_id,
+            "image_type": self.image_type,
+            "filename": self.filename,
+            "total_size": self.total_size,
+            "received_bytes": self.received_bytes,
+            "status": self.status,
+            "content_hash": self.content_hash,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "expires_at": self.expires_at.isoformat() if self.expires_at else None,
+            "upload_url": f"/api/uploads/sessions/{self.id}",
+        }
+
+    def __repr__(self) -> str:  # pragma: no cover
+        return f"<UploadSession {self.id} {self.image_type} {self.received_bytes}/{self.total_size}>"
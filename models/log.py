@@ -2,15 +2,49 @@
 """Activity logging and JWT blacklist models - simplified version."""
 
 from datetime import datetime
-from sqlalchemy.orm import relationship
+import base64
+import json
+
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import contains_eager, relationship
 
 from . import db
 
 
+def encode_log_cursor(created_at: datetime, log_id: int) -> str:
+    """Return an opaque cursor pointing just after the given log."""
+    raw = json.dumps({"t": created_at.isoformat(), "i": log_id}).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_log_cursor(cursor: str):
+    """Return ``(created_at, id)`` from a cursor; raise ValueError if malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(data["t"]), int(data["i"])
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+
+class LogPage:
+    """Offset page of logs fetched without a total count."""
+    
+    def __init__(self, items, total, pages, has_prev, has_next):
+        self.items = items
+        self.total = total
+        self.pages = pages
+        self.has_prev = has_prev
+        self.has_next = has_next
+
+
 class ActivityLog(db.Model):
     """Record of user actions for auditing."""
     
     __tablename__ = "activity_logs"
+    __table_args__ = (
+        db.Index("ix_activity_logs_created_at_id", "created_at", "id"),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
@@ -44,12 +78,61 @@ class ActivityLog(db.Model):
         }
     
     @staticmethod
-    def get_filtered_logs(user_id=None, action=None, status=None, resource_type=None, 
-                         start_date=None, end_date=None, page=1, per_page=50):
-        """Get filtered activity logs with pagination."""
+    def row_columns():
+        """Columns selected by ``project``, in ``row_to_dict`` order."""
+        from models import User  # Import here to avoid circular import
+        
+        return (
+            ActivityLog.id,
+            ActivityLog.user_id,
+            User.email.label("user_email"),
+            ActivityLog.action,
+            ActivityLog.status,
+            ActivityLog.ip_address,
+            ActivityLog.details,
+            ActivityLog.resource_type,
+            ActivityLog.resource_id,
+            ActivityLog.duration_ms,
+            ActivityLog.created_at,
+        )
+    
+    @staticmethod
+    def project(query):
+        """Turn a ``filtered_query`` into a plain-tuple query over ``row_columns``.
+        
+        Rows skip ORM hydration and carry ``user_email`` from the join, so
+        serializing them never touches the ``user`` relationship.
+        """
+        return query.with_entities(*ActivityLog.row_columns())
+    
+    @staticmethod
+    def row_to_dict(row):
+        """Serialize a projected row exactly like ``to_dict``."""
+        return {
+            "id": row.id,
+            "user_id": row.user_id,
+            "user_email": row.user_email,
+            "action": row.action,
+            "status": row.status or "success",
+            "ip_address": row.ip_address,
+            "details": row.details,
+            "resource_type": row.resource_type,
+            "resource_id": row.resource_id,
+            "duration_ms": row.duration_ms,
+            "created_at": row.created_at.isoformat() if row.created_at else None
+        }
+    
+    @staticmethod
+    def filtered_query(user_id=None, action=None, status=None, resource_type=None,
+                       start_date=None, end_date=None):
+        """Build the activity log query for the given filters.
+        
+        ``user`` is populated from the join, so ``to_dict`` on the results
+        doesn't lazy-load one user per log.
+        """
         from models import User  # Import here to avoid circular import
         
-        query = ActivityLog.query.join(User)
+        query = ActivityLog.query.join(User).options(contains_eager(ActivityLog.user))
         
         # Apply filters
         if user_id:
@@ -65,20 +148,117 @@ class ActivityLog(db.Model):
         if end_date:
             query = query.filter(ActivityLog.created_at <= end_date)
         
-        # Order by most recent first
-        query = query.order_by(ActivityLog.created_at.desc())
+        return query
+    
+    @staticmethod
+    def get_filtered_logs(user_id=None, action=None, status=None, resource_type=None, 
+                         start_date=None, end_date=None, page=1, per_page=50, count=True,
+                         rows=False):
+        """Get filtered activity logs with offset pagination.
+        
+        With ``count=False`` the ``COUNT(*)`` is skipped; ``total`` and
+        ``pages`` are then None and ``has_next`` comes from a one-row lookahead.
+        With ``rows=True`` the items are projected rows (see ``project``).
+        """
+        query = ActivityLog.filtered_query(
+            user_id, action, status, resource_type, start_date, end_date
+        ).order_by(ActivityLog.created_at.desc(), ActivityLog.id.desc())
+        if rows:
+            query = ActivityLog.project(query)
+        
+        if count:
+            return query.paginate(
+                page=page, 
+                per_page=per_page, 
+                error_out=False
+            )
         
-        # Paginate
-        return query.paginate(
-            page=page, 
-            per_page=per_page, 
-            error_out=False
+        page = max(page, 1)
+        rows = query.offset((page - 1) * per_page).limit(per_page + 1).all()
+        return LogPage(
+            items=rows[:per_page],
+            total=None,
+            pages=None,
+            has_prev=page > 1,
+            has_next=len(rows) > per_page
         )
     
+    @staticmethod
+    def get_logs_after_cursor(cursor=None, per_page=50, rows=False, **filters):
+        """Get filtered logs using keyset pagination on ``(created_at, id)``.
+        
+        Returns ``(logs, next_cursor)``; ``next_cursor`` is None on the last page.
+        With ``rows=True`` the logs are projected rows (see ``project``).
+        """
+        per_page = max(per_page, 1)
+        query = ActivityLog.filtered_query(**filters)
+        if rows:
+            query = ActivityLog.project(query)
+        
+        if cursor:
+            created_at, log_id = decode_log_cursor(cursor)
+            query = query.filter(or_(
+                ActivityLog.created_at < created_at,
+                and_(ActivityLog.created_at == created_at, ActivityLog.id < log_id)
+            ))
+        
+        results = query.order_by(
+            ActivityLog.created_at.desc(), ActivityLog.id.desc()
+        ).limit(per_page + 1).all()
+        
+        logs = results[:per_page]
+        next_cursor = None
+        if len(results) > per_page:
+            last = logs[-1]
+            next_cursor = encode_log_cursor(last.created_at, last.id)
+        return logs, next_cursor
+    
+    @staticmethod
+    def estimate_total():
+        """Cheap upper bound on the table size from the primary key range."""
+        low, high = db.session.query(func.min(ActivityLog.id), func.max(ActivityLog.id)).one()
+        return (high - low + 1) if high is not None else 0
+    
     def __repr__(self) -> str:
         return f"<ActivityLog {self.action} by {self.user_id}>"
 
 
+class ActivityRollup(db.Model):
+    """Activity log counts per day, user, action and status."""
+    
+    __tablename__ = "activity_rollups"
+    
+    day = db.Column(db.Date, primary_key=True)
+    user_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    action = db.Column(db.String(100), primary_key=True)
+    status = db.Column(db.String(20), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    duration_sum_ms = db.Column(db.BigInteger, nullable=False, default=0)
+    duration_count = db.Column(db.Integer, nullable=False, default=0)  # Rows that had a duration
+    
+    def __repr__(self) -> str:
+        return f"<ActivityRollup {self.day} {self.user_id} {self.action} {self.status}: {self.count}>"
+
+
+class EndpointLatency(db.Model):
+    """One worker's latency sketch for one endpoint over one minute."""
+    
+    __tablename__ = "endpoint_latency"
+    __table_args__ = (
+        db.Index("ix_endpoint_latency_minute_endpoint", "minute", "endpoint"),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    minute = db.Column(db.DateTime, nullable=False)
+    endpoint = db.Column(db.String(150), nullable=False)  # "GET logs.list_logs"
+    count = db.Column(db.Integer, nullable=False, default=0)
+    error_count = db.Column(db.Integer, nullable=False, default=0)
+    sketch = db.Column(db.Text, nullable=False)  # Serialized LatencySketch
+    
+    def __repr__(self) -> str:
+        return f"<EndpointLatency {self.minute} {self.endpoint}: {self.count}>"
+
+
 class JWTBlacklist(db.Model):
     """List of revoked JWT tokens."""
     
@@ -86,7 +266,8 @@ class JWTBlacklist(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     jti = db.Column(db.String(36), unique=True, nullable=False)
-    revoked_at = db.Column(db.DateTime, default=datetime.utcnow)
+    revoked_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    expires_at = db.Column(db.DateTime, index=True)  # When the revoked token would have expired
     
     def __repr__(self) -> str:
         return f"<JWTBlacklist {self.jti}>"
\ No newline at end of file
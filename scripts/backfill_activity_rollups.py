@@ -0,0 +1,45 @@
+# scripts/backfill_activity_rollups.py - Rebuild activity_rollups from activity_logs
+import os
+import sys
+from datetime import date
+
+# Add parent directory to Python path to find modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import create_app
+from database.db_setup import create_tables
+from services import log_rollups, log_writer
+
+
+def backfill_activity_rollups(start_day=None, end_day=None):
+    """Recompute the daily rollups for a range of days (all days by default)."""
+    app = create_app()
+    create_tables(app)  # Adds activity_rollups to databases created before it existed
+
+    with app.app_context():
+        span = f"{start_day or 'the first log'} to {end_day or 'today'}"
+        print(f"📊 Rebuilding activity rollups from {span}...")
+
+        try:
+            # Write anything still queued so it is counted exactly once
+            log_writer.flush()
+            written = log_rollups.backfill(start_day, end_day)
+            print(f"✅ Wrote {written} rollup rows.")
+        except Exception as e:
+            print(f"❌ Failed to backfill activity rollups: {e}")
+
+
+def main():
+    """Run the rollup backfill."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Rebuild activity_rollups from activity_logs')
+    parser.add_argument('--start', type=date.fromisoformat, help='first day to rebuild (YYYY-MM-DD)')
+    parser.add_argument('--end', type=date.fromisoformat, help='last day to rebuild (YYYY-MM-DD)')
+
+    args = parser.parse_args()
+    backfill_activity_rollups(args.start, args.end)
+
+
+if __name__ == "__main__":
+    main()
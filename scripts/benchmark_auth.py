@@ -0,0 +1,92 @@
+# scripts/benchmark_auth.py - Micro-benchmark for the JWT auth path
+import os
+import sys
+import tempfile
+import time
+
+# Add parent directory to Python path to find modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import create_app
+from auth import jwt_handler
+from auth.jwt_handler import create_token, decode_token
+from auth.principal import principal_cache
+from config import Config
+from models import db, User
+
+
+class BenchmarkConfig(Config):
+    """Throwaway SQLite database with request logging switched off."""
+    SQLALCHEMY_DATABASE_URI = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+    ACTIVITY_LOGGING_ENABLED = False
+    LOG_WRITER_ASYNC = False
+
+
+def _throughput(func, iterations):
+    """Run ``func`` repeatedly and return calls per second."""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    elapsed = time.perf_counter() - start
+    return iterations / elapsed if elapsed else float("inf")
+
+
+def _report(label, uncached, cached):
+    speedup = cached / uncached if uncached else 0
+    print(f"{label:<28} uncached {uncached:>10,.0f}/s   cached {cached:>10,.0f}/s   x{speedup:.1f}")
+
+
+def run_benchmark(iterations=20000, requests=2000):
+    """Compare cached and uncached token decoding and protected requests."""
+    app = create_app(BenchmarkConfig)
+
+    with app.app_context():
+        db.create_all()
+        user = User(email="bench@example.com", is_admin=True, password_hash="")
+        db.session.add(user)
+        db.session.commit()
+        token = create_token(user.id)
+
+        def uncached_decode():
+            jwt_handler._verified_tokens.clear()
+            decode_token(token)
+
+        print(f"🔐 JWT auth benchmark ({iterations} decodes, {requests} requests)")
+        print("=" * 80)
+        _report(
+            "decode_token",
+            _throughput(uncached_decode, iterations),
+            _throughput(lambda: decode_token(token), iterations),
+        )
+
+    client = app.test_client()
+    headers = {"Authorization": f"Bearer {token}"}
+
+    def uncached_request():
+        jwt_handler._verified_tokens.clear()
+        principal_cache.clear()
+        client.get("/api/auth/me", headers=headers)
+
+    _report(
+        "GET /api/auth/me",
+        _throughput(uncached_request, requests),
+        _throughput(lambda: client.get("/api/auth/me", headers=headers), requests),
+    )
+    print("=" * 80)
+    print(f"📊 Token cache: {jwt_handler.token_cache_stats()}")
+
+
+def main():
+    """Run the auth benchmark."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark cached vs uncached JWT auth')
+    parser.add_argument('--iterations', type=int, default=20000, help='decode_token calls per mode')
+    parser.add_argument('--requests', type=int, default=2000, help='HTTP requests per mode')
+
+    args = parser.parse_args()
+    run_benchmark(args.iterations, args.requests)
+
+
+if __name__ == "__main__":
+    main()
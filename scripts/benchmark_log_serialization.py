@@ -0,0 +1,150 @@
+# scripts/benchmark_log_serialization.py - Query counts and timings for log serialization
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Add parent directory to Python path to find modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import event, insert
+
+from app import create_app
+from config import Config
+from models import db, ActivityLog, User
+
+
+class BenchmarkConfig(Config):
+    """Throwaway SQLite database with request logging switched off."""
+    SQLALCHEMY_DATABASE_URI = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+    ACTIVITY_LOGGING_ENABLED = False
+    LOG_WRITER_ASYNC = False
+
+
+ACTIONS = ["login_success", "view_logs", "create_campaign", "update_campaign", "upload_images"]
+
+
+class QueryCounter:
+    """Count statements executed on an engine while active."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        self.count = 0
+        event.listen(self.engine, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._on_execute)
+
+
+def _seed(total_rows, users):
+    """Grow the activity log to ``total_rows`` spread across ``users`` users."""
+    if User.query.count() == 0:
+        db.session.execute(insert(User.__table__), [
+            {"email": f"user{i}@example.com", "password_hash": "", "is_admin": False}
+            for i in range(users)
+        ])
+        db.session.commit()
+
+    user_ids = [user_id for (user_id,) in db.session.query(User.id).all()]
+    existing = ActivityLog.query.count()
+    start = datetime.utcnow() - timedelta(days=365)
+
+    for offset in range(existing, total_rows, 10000):
+        batch = min(10000, total_rows - offset)
+        db.session.execute(insert(ActivityLog.__table__), [
+            {
+                "user_id": random.choice(user_ids),
+                "action": random.choice(ACTIONS),
+                "status": "success",
+                "ip_address": "127.0.0.1",
+                "details": "benchmark",
+                "duration_ms": random.randint(1, 500),
+                "created_at": start + timedelta(seconds=offset + i),
+            }
+            for i in range(batch)
+        ])
+        db.session.commit()
+
+
+def _lazy_orm():
+    """Original path: ORM rows with ``user`` loaded lazily by ``to_dict``."""
+    query = ActivityLog.query.order_by(ActivityLog.created_at.desc(), ActivityLog.id.desc())
+    return sum(1 for log in query.yield_per(1000) if log.to_dict())
+
+
+def _eager_orm():
+    """ORM rows with ``user`` filled in from the join."""
+    query = ActivityLog.filtered_query().order_by(ActivityLog.created_at.desc(), ActivityLog.id.desc())
+    return sum(1 for log in query.yield_per(1000) if log.to_dict())
+
+
+def _projected():
+    """Plain tuples serialized by ``row_to_dict``."""
+    query = ActivityLog.project(ActivityLog.filtered_query().order_by(
+        ActivityLog.created_at.desc(), ActivityLog.id.desc()
+    ))
+    return sum(1 for row in query.yield_per(1000) if ActivityLog.row_to_dict(row))
+
+
+MODES = [("lazy ORM", _lazy_orm), ("eager ORM", _eager_orm), ("projected rows", _projected)]
+
+
+def run_benchmark(sizes, users, skip_lazy_above):
+    """Serialize the whole log table in each mode at every size."""
+    app = create_app(BenchmarkConfig)
+
+    with app.app_context():
+        db.create_all()
+        counter = QueryCounter(db.engine)
+
+        print(f"📜 Activity log serialization benchmark ({users} users)")
+        print("=" * 72)
+        print(f"{'rows':>10}  {'mode':<16}{'queries':>10}{'seconds':>12}{'rows/s':>14}")
+        print("-" * 72)
+
+        for size in sorted(sizes):
+            print(f"🌱 Seeding {size:,} rows...")
+            _seed(size, users)
+
+            for label, func in MODES:
+                if func is _lazy_orm and skip_lazy_above and size > skip_lazy_above:
+                    print(f"{size:>10,}  {label:<16}{'skipped':>10}")
+                    continue
+
+                db.session.expunge_all()
+                with counter:
+                    start = time.perf_counter()
+                    rows = func()
+                    elapsed = time.perf_counter() - start
+                rate = rows / elapsed if elapsed else float("inf")
+                print(f"{size:>10,}  {label:<16}{counter.count:>10,}{elapsed:>12.2f}{rate:>14,.0f}")
+
+        print("=" * 72)
+
+
+def main():
+    """Run the serialization benchmark."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark activity log serialization paths')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000],
+                        help='table sizes to measure')
+    parser.add_argument('--users', type=int, default=500, help='distinct users owning the logs')
+    parser.add_argument('--skip-lazy-above', type=int, default=0,
+                        help='skip the lazy ORM mode above this many rows (0 = never)')
+
+    args = parser.parse_args()
+    run_benchmark(args.sizes, args.users, args.skip_lazy_above)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,7 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 from app import create_app
 from models import db, ActivityLog
 from config import Config
+from services import latency_recorder
 
 
 def cleanup_old_logs(days_to_keep=None):
@@ -24,6 +25,14 @@ def cleanup_old_logs(days_to_keep=None):
         print(f"🧹 Cleaning up activity logs older than {days_to_keep} days...")
         print(f"📅 Cutoff date: {cutoff_date}")
         
+        # Endpoint latency sketches follow the same retention
+        try:
+            pruned = latency_recorder.prune(cutoff_date)
+            print(f"✅ Deleted {pruned} old endpoint latency sketches.")
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Failed to delete old latency sketches: {e}")
+        
         # Count logs to be deleted
         old_logs_count = ActivityLog.query.filter(
             ActivityLog.created_at < cutoff_date
@@ -0,0 +1,44 @@
+# scripts/gc_asset_blobs.py - Delete blobs and image variants no campaign image refers to
+import os
+import sys
+
+# Add parent directory to Python path to find modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import create_app
+from models import CampaignImage, db
+from services import asset_store, image_derivatives, image_etags
+
+
+def gc_asset_blobs(min_age_seconds: int, dry_run: bool):
+    """Remove unreferenced blobs from ASSET_BLOB_FOLDER and their variants from IMAGE_CACHE_FOLDER."""
+    app = create_app()
+    
+    with app.app_context():
+        print("🧹 Collecting unreferenced asset blobs...")
+        
+        referenced = {
+            content_hash for (content_hash,) in
+            db.session.query(CampaignImage.content_hash).filter(CampaignImage.content_hash.isnot(None)).distinct()
+        }
+        removed, freed = asset_store.collect_garbage(referenced, min_age_seconds, dry_run=dry_run)
+        verb = "Would remove" if dry_run else "Removed"
+        print(f"✅ {verb} {removed} blobs ({freed / 1024 / 1024:.1f} MB); {len(referenced)} still referenced.")
+        
+        # Images stored before the blob store have no content hash; their variants are named by file hash
+        for (file_path,) in db.session.query(CampaignImage.file_path).filter(CampaignImage.content_hash.is_(None)):
+            if os.path.isfile(file_path):
+                referenced.add(image_etags.etag_for(file_path))
+        removed, freed = image_derivatives.prune(referenced, min_age_seconds, dry_run=dry_run)
+        print(f"✅ {verb} {removed} image variants ({freed / 1024 / 1024:.1f} MB).")
+
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Delete asset blobs and image variants no campaign image refers to')
+    parser.add_argument('--min-age', type=int, default=3600,
+                        help='Keep blobs and variants written in the last N seconds (default: 3600)')
+    parser.add_argument('--dry-run', action='store_true', help='Only report what would be removed')
+    args = parser.parse_args()
+    gc_asset_blobs(args.min_age, args.dry_run)
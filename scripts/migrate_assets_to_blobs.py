@@ -0,0 +1,41 @@
+# scripts/migrate_assets_to_blobs.py - Move existing campaign images into the blob store
+import os
+import sys
+
+# Add parent directory to Python path to find modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import create_app
+from database.db_setup import create_tables
+from models import CampaignImage, db
+from services import asset_store
+
+
+def migrate_assets_to_blobs():
+    """Hash every image without a content_hash, store it as a blob and link it back."""
+    app = create_app()
+    create_tables(app)  # Adds the campaign_images.content_hash column
+    
+    with app.app_context():
+        print("📦 Moving campaign images into the content-addressed store...")
+        
+        images = CampaignImage.query.filter(CampaignImage.content_hash.is_(None)).all()
+        migrated = missing = 0
+        for image in images:
+            if not os.path.isfile(image.file_path):
+                print(f"⚠️ Missing file for image {image.id}: {image.file_path}")
+                missing += 1
+                continue
+            try:
+                image.content_hash = asset_store.adopt(image.file_path)
+                db.session.commit()
+                migrated += 1
+            except Exception as e:
+                db.session.rollback()
+                print(f"❌ Failed to migrate {image.file_path}: {e}")
+        
+        print(f"✅ Migrated {migrated} images ({missing} missing files).")
+
+
+if __name__ == "__main__":
+    migrate_assets_to_blobs()
@@ -0,0 +1,33 @@
+# scripts/prune_campaign_versions.py - Remove campaign folder versions left by interrupted publishes
+import os
+import sys
+
+# Add parent directory to Python path to find modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import create_app
+from services import folder_publisher
+
+
+def prune_campaign_versions(min_age_seconds=3600):
+    """Delete staged folder versions that no published date folder points at."""
+    app = create_app()
+    
+    with app.app_context():
+        print("🧹 Pruning orphaned campaign folder versions...")
+        
+        try:
+            removed = folder_publisher.prune_versions(min_age_seconds)
+            print(f"✅ Removed {removed} orphaned folder versions.")
+        except Exception as e:
+            print(f"❌ Failed to prune campaign folder versions: {e}")
+
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Remove campaign folder versions left by interrupted publishes')
+    parser.add_argument('--min-age', type=int, default=3600,
+                        help='Keep versions written in the last N seconds (default: 3600)')
+    args = parser.parse_args()
+    prune_campaign_versions(args.min_age)
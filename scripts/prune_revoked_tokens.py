@@ -0,0 +1,27 @@
+# scripts/prune_revoked_tokens.py - Remove revocations for expired tokens
+import os
+import sys
+
+# Add parent directory to Python path to find modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import create_app
+from auth.revocation import revocation_list
+
+
+def prune_revoked_tokens():
+    """Delete jwt_blacklist rows whose tokens have already expired."""
+    app = create_app()
+    
+    with app.app_context():
+        print("🧹 Pruning revoked tokens that have expired...")
+        
+        try:
+            deleted_count = revocation_list.prune_expired()
+            print(f"✅ Removed {deleted_count} expired revocations.")
+        except Exception as e:
+            print(f"❌ Failed to prune revoked tokens: {e}")
+
+
+if __name__ == "__main__":
+    prune_revoked_tokens()
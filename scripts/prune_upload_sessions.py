@@ -0,0 +1,27 @@
+# scripts/prune_upload_sessions.py - Remove abandoned resumable uploads
+import os
+import sys
+
+# Add parent directory to Python path to find modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import create_app
+from services import upload_sessions
+
+
+def prune_upload_sessions():
+    """Abort expired upload sessions and delete their partial files."""
+    app = create_app()
+    
+    with app.app_context():
+        print("🧹 Pruning expired upload sessions...")
+        
+        try:
+            pruned = upload_sessions.prune_expired()
+            print(f"✅ Removed {pruned} expired upload sessions.")
+        except Exception as e:
+            print(f"❌ Failed to prune upload sessions: {e}")
+
+
+if __name__ == "__main__":
+    prune_upload_sessions()
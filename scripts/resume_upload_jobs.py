@@ -0,0 +1,28 @@
+# scripts/resume_upload_jobs.py - Run upload jobs left unfinished by a restart
+import os
+import sys
+
+# Add parent directory to Python path to find modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import create_app
+from services import upload_jobs
+
+
+def resume_upload_jobs():
+    """Run queued upload jobs and jobs whose worker died mid-run."""
+    app = create_app()
+    
+    with app.app_context():
+        print("🔁 Resuming unfinished upload jobs...")
+        
+        try:
+            resumed = upload_jobs.resume_unfinished(wait=True)
+            stats = upload_jobs.stats()
+            print(f"✅ Resumed {resumed} jobs ({stats['succeeded']} succeeded, {stats['failed']} failed).")
+        except Exception as e:
+            print(f"❌ Failed to resume upload jobs: {e}")
+
+
+if __name__ == "__main__":
+    resume_upload_jobs()
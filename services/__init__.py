@@ -0,0 +1,83 @@
+"""Shared backend services used by the API blueprints."""
+
+from flask import Flask
+
+from .asset_store import BlobTooLarge, ContentAddressedStore, asset_store
+from .cache import TTLCache
+from .campaign_index import ActiveCampaignIndex, IntervalTree, campaign_index
+from .campaign_manifest import CampaignManifest, campaign_manifest
+from .campaign_status import CampaignStatusEngine, status_engine
+from .folder_publisher import CampaignFolderPublisher, folder_publisher
+from .image_derivatives import ImageDerivatives, image_derivatives
+from .image_etags import ImageETags, image_etags
+from .latency import LatencyRecorder, LatencySketch, latency_recorder
+from .log_facets import LogFacetCache, log_facets
+from .log_rollups import ActivityRollups, log_rollups
+from .log_writer import ActivityLogWriter, log_writer, record_activity
+from .metrics import MetricsRegistry, metrics
+from .sql_profiler import SQLProfiler, sql_profiler
+from .system_stats import SystemStatsSnapshot, system_stats
+from .upload_jobs import UploadJobRunner, upload_jobs
+from .upload_sessions import UploadSessionStore, upload_sessions
+
+
+def init_app(app: Flask) -> None:
+    """Initialize the service singletons with the application's settings."""
+    status_engine.init_app(app)
+    campaign_index.init_app(app)
+    log_writer.init_app(app)
+    log_facets.init_app(app, log_writer)
+    log_rollups.init_app(app, log_writer)
+    latency_recorder.init_app(app)
+    metrics.init_app(app)
+    image_etags.init_app(app)
+    asset_store.init_app(app)
+    folder_publisher.init_app(app)
+    campaign_manifest.init_app(app)
+    image_derivatives.init_app(app)
+    upload_jobs.init_app(app)
+    upload_sessions.init_app(app)
+    sql_profiler.init_app(app)
+    system_stats.init_app(app)
+
+
+__all__ = [
+    "ActiveCampaignIndex",
+    "ActivityLogWriter",
+    "ActivityRollups",
+    "BlobTooLarge",
+    "CampaignFolderPublisher",
+    "CampaignManifest",
+    "CampaignStatusEngine",
+    "ContentAddressedStore",
+    "ImageDerivatives",
+    "ImageETags",
+    "IntervalTree",
+    "LatencyRecorder",
+    "LatencySketch",
+    "LogFacetCache",
+    "MetricsRegistry",
+    "SQLProfiler",
+    "SystemStatsSnapshot",
+    "TTLCache",
+    "UploadJobRunner",
+    "UploadSessionStore",
+    "asset_store",
+    "campaign_index",
+    "campaign_manifest",
+    "folder_publisher",
+    "image_derivatives",
+    "image_etags",
+    "init_app",
+    "latency_recorder",
+    "log_facets",
+    "log_rollups",
+    "log_writer",
+    "metrics",
+    "record_activity",
+    "sql_profiler",
+    "status_engine",
+    "system_stats",
+    "upload_jobs",
+    "upload_sessions",
+]
@@ -0,0 +1,224 @@
+# services/asset_store.py - Content-addressed storage for campaign images
+"""Deduplicating blob store behind the campaign date folders.
+
+Every uploaded image is written once to ``ASSET_BLOB_FOLDER/<ab>/<sha256>``.
+The ``UPLOAD_FOLDER/<start_date>/<date><suffix>.png`` layout the kiosk app
+reads is made of hard links to those blobs (symlinks when
+``ASSET_LINK_MODE=symlink`` or when the blob folder is on another
+filesystem). A logo reused by several campaigns is stored once, moving a
+campaign's start date swaps links instead of rewriting files, and the hash
+computed while storing doubles as the image's ETag.
+
+Links are always replaced with ``os.replace`` and blobs are read-only, so a
+new upload never writes through a link into a blob other campaigns share.
+Blobs no campaign image refers to any more are removed by
+``collect_garbage()`` (see ``scripts/gc_asset_blobs.py``).
+"""
+
+import hashlib
+import os
+import tempfile
+from time import time
+from typing import BinaryIO, Callable, Iterable, Optional, Tuple
+
+from flask import Flask
+
+from .image_etags import HASH_CHUNK_BYTES, file_digest, image_etags
+
+
+LINK_MODES = ("hardlink", "symlink")
+INCOMING_DIR = "incoming"  # Partial uploads; inside the blob folder so they can be renamed in
+
+
+class BlobTooLarge(ValueError):
+    """Raised by ``put`` as soon as a stream passes its size limit."""
+
+    def __init__(self, limit: int) -> None:
+        super().__init__(f"File exceeds the {limit} byte limit")
+        self.limit = limit
+
+
+def fsync_dir(path: str) -> None:
+    """Persist a directory entry change (best effort; not supported everywhere)."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class ContentAddressedStore:
+    """SHA-256 addressed blobs exposed through links in the date folders."""
+
+    def __init__(self) -> None:
+        self.blob_folder = os.path.abspath("asset_blobs")
+        self.link_mode = "hardlink"
+
+    def init_app(self, app: Flask) -> None:
+        """Read the store settings and create the blob folder."""
+        self.blob_folder = os.path.abspath(app.config.get("ASSET_BLOB_FOLDER", "asset_blobs"))
+        self.link_mode = app.config.get("ASSET_LINK_MODE", "hardlink").lower()
+        if self.link_mode not in LINK_MODES:
+            raise ValueError(f"ASSET_LINK_MODE must be one of {', '.join(LINK_MODES)}")
+        os.makedirs(self.blob_folder, exist_ok=True)
+
+    def blob_path(self, digest: str) -> str:
+        return os.path.join(self.blob_folder, digest[:2], digest)
+
+    def incoming_path(self, name: str) -> str:
+        """Scratch file for an upload assembled in place (same filesystem as the blobs)."""
+        directory = os.path.join(self.blob_folder, INCOMING_DIR)
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, name)
+
+    def put(self, stream: BinaryIO, max_bytes: Optional[int] = None,
+            inspect: Optional[Callable[[bytes], None]] = None) -> str:
+        """Store the stream's bytes, returning their SHA-256; existing blobs are reused.
+
+        The stream is copied in fixed-size chunks to a temp file that is
+        hashed, size-checked and fsynced on the way, then renamed into place.
+        ``inspect(first_chunk)`` may raise to reject the content by its
+        header; exceeding ``max_bytes`` raises ``BlobTooLarge`` without
+        reading the rest of the stream.
+        """
+        writer = self.writer()
+        try:
+            for chunk in iter(lambda: stream.read(HASH_CHUNK_BYTES), b""):
+                if writer.size == 0 and inspect is not None:
+                    inspect(chunk)
+                if max_bytes is not None and writer.size + len(chunk) > max_bytes:
+                    raise BlobTooLarge(max_bytes)
+                writer.write(chunk)
+            if writer.size == 0 and inspect is not None:
+                inspect(b"")  # Empty upload
+            return writer.commit()
+        finally:
+            writer.discard()
+
+    def writer(self) -> "BlobWriter":
+        """Blob written piece by piece, for bytes that arrive as they are parsed."""
+        return BlobWriter(self)
+
+    def commit_file(self, path: str, digest: Optional[str] = None) -> str:
+        """Move a finished file from ``incoming_path`` into the store without copying it."""
+        digest = digest or file_digest(path)
+        try:
+            self._commit_blob(path, digest)
+        finally:
+            if os.path.exists(path):
+                os.unlink(path)  # Already stored under this digest
+        return digest
+
+    def adopt(self, path: str) -> str:
+        """Move an existing plain file into the store and link it back in place."""
+        digest = file_digest(path)
+        blob = self.blob_path(digest)
+        if not os.path.exists(blob):
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            try:
+                os.link(path, blob)
+                os.chmod(blob, 0o444)
+            except OSError:
+                # Different filesystem (or no hard links): keep a copy
+                with open(path, "rb") as handle:
+                    self.put(handle)
+        self.link(digest, path)
+        return digest
+
+    def link(self, digest: str, target: str) -> str:
+        """Atomically point ``target`` at the blob ``digest`` and prime its ETag."""
+        blob = self.blob_path(digest)
+        if not os.path.exists(blob):
+            raise FileNotFoundError(f"No blob stored for {digest}")
+
+        directory = os.path.dirname(os.path.abspath(target))
+        os.makedirs(directory, exist_ok=True)
+        tmp_link = os.path.join(directory, f".{os.path.basename(target)}.{os.getpid()}.link")
+        if os.path.lexists(tmp_link):
+            os.unlink(tmp_link)
+
+        if self.link_mode == "hardlink":
+            try:
+                os.link(blob, tmp_link)
+            except OSError:
+                os.symlink(blob, tmp_link)  # Blob folder on another filesystem
+        else:
+            os.symlink(blob, tmp_link)
+        os.replace(tmp_link, target)
+        fsync_dir(directory)
+
+        image_etags.prime(target, digest)
+        return target
+
+    def collect_garbage(self, referenced: Iterable[str], min_age_seconds: int = 3600,
+                        dry_run: bool = False) -> Tuple[int, int]:
+        """Delete blobs not in ``referenced``; returns ``(blobs, bytes)`` removed.
+
+        Blobs that still have hard links, or are younger than
+        ``min_age_seconds`` (an upload whose row isn't committed yet), are kept.
+        """
+        referenced = set(referenced)
+        cutoff = time() - min_age_seconds
+        removed = freed = 0
+        for directory, subdirectories, names in os.walk(self.blob_folder):
+            if directory == self.blob_folder and INCOMING_DIR in subdirectories:
+                subdirectories.remove(INCOMING_DIR)  # Upload sessions clean up after themselves
+            for name in names:
+                path = os.path.join(directory, name)
+                stat = os.stat(path)
+                if name in referenced or stat.st_mtime > cutoff or stat.st_nlink > 1:
+                    # Still hard-linked from a date folder, or possibly in flight
+                    continue
+                if not dry_run:
+                    os.unlink(path)
+                removed += 1
+                freed += stat.st_size
+        return removed, freed
+
+    def _commit_blob(self, tmp_path: str, digest: str) -> str:
+        blob = self.blob_path(digest)
+        if os.path.exists(blob):
+            return digest  # Same bytes already stored
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        os.chmod(tmp_path, 0o444)
+        os.replace(tmp_path, blob)
+        fsync_dir(os.path.dirname(blob))
+        return digest
+
+
+class BlobWriter:
+    """Temp file in the blob folder that is hashed as it is written, then committed."""
+
+    def __init__(self, store: ContentAddressedStore) -> None:
+        self._store = store
+        self._digest = hashlib.sha256()
+        self.size = 0
+        fd, self._tmp_path = tempfile.mkstemp(dir=store.blob_folder, suffix=".tmp")
+        self._handle = os.fdopen(fd, "wb")
+
+    def write(self, chunk: bytes) -> None:
+        self._digest.update(chunk)
+        self._handle.write(chunk)
+        self.size += len(chunk)
+
+    def commit(self) -> str:
+        """Fsync and move the bytes into the store; returns their SHA-256."""
+        self._handle.flush()
+        os.fsync(self._handle.fileno())
+        self._handle.close()
+        return self._store._commit_blob(self._tmp_path, self._digest.hexdigest())
+
+    def discard(self) -> None:
+        """Drop whatever wasn't committed (safe to call after ``commit``)."""
+        self._handle.close()
+        if os.path.exists(self._tmp_path):
+            os.unlink(self._tmp_path)
+
+
+# Singleton blob store used by the upload endpoints
+asset_store = ContentAddressedStore()
@@ -0,0 +1,95 @@
+# services/cache.py - Small in-process caches
+"""Thread-safe TTL + LRU cache used by the hot request paths."""
+
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+from typing import Any, Dict, Hashable, List, Optional
+from weakref import WeakSet
+
+
+_MISSING = object()
+
+# Named caches, reported by the metrics endpoint
+_named_caches: "WeakSet[TTLCache]" = WeakSet()
+
+
+def named_caches() -> List["TTLCache"]:
+    """Every live cache that was given a name, sorted by name."""
+    return sorted(_named_caches, key=lambda cache: cache.name)
+
+
+class TTLCache:
+    """Bounded LRU mapping whose entries expire ``ttl`` seconds after insertion."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0, name: str = "") -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        if name:
+            _named_caches.add(self)
+
+    def configure(self, maxsize: Optional[int] = None, ttl: Optional[float] = None) -> None:
+        """Change the size or TTL and drop existing entries."""
+        with self._lock:
+            if maxsize is not None:
+                self.maxsize = maxsize
+            if ttl is not None:
+                self.ttl = ttl
+            self._data.clear()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value, or ``default`` if missing or expired."""
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at <= monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Store ``value``, evicting the least recently used entry when full."""
+        if self.maxsize <= 0:
+            return
+        expires_at = monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Remove ``key`` and return its value if it was cached."""
+        with self._lock:
+            entry = self._data.pop(key, _MISSING)
+        return default if entry is _MISSING else entry[0]
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        """Size and hit/miss counters."""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+        }
@@ -0,0 +1,142 @@
+# services/campaign_index.py - In-process interval index for date conflicts
+"""Interval index answering "which active campaigns overlap [start, end]".
+
+The index is a static augmented interval tree: intervals are sorted by start
+date and laid out as an implicit balanced tree where every node also records
+the latest end date in its subtree. An overlap query prunes any subtree whose
+latest end is before the requested start, giving O(log N + K) lookups.
+Each process keeps its own tree, so a lookup that finds nothing is checked
+against the database, where campaigns written by other workers are visible.
+"""
+
+from datetime import date
+from threading import Lock
+from time import monotonic
+from typing import Any, List, NamedTuple, Optional, Sequence
+
+from flask import Flask
+
+from models import Campaign, CampaignStatus, db
+
+
+class Interval(NamedTuple):
+    """Closed date interval with the campaign it belongs to."""
+
+    start: date
+    end: date
+    campaign_id: int
+    name: str
+
+
+class IntervalTree:
+    """Immutable augmented interval tree over closed intervals."""
+
+    def __init__(self, intervals: Sequence[Interval]) -> None:
+        self._items: List[Interval] = sorted(intervals, key=lambda i: (i.start, i.end))
+        self._max_end: List[Optional[date]] = [None] * len(self._items)
+        self._build(0, len(self._items))
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def _build(self, lo: int, hi: int) -> Optional[date]:
+        if lo >= hi:
+            return None
+        mid = (lo + hi) // 2
+        max_end = self._items[mid].end
+        for child in (self._build(lo, mid), self._build(mid + 1, hi)):
+            if child is not None and child > max_end:
+                max_end = child
+        self._max_end[mid] = max_end
+        return max_end
+
+    def overlapping(self, start: date, end: date) -> List[Interval]:
+        """Return every interval that shares at least one day with [start, end]."""
+        found: List[Interval] = []
+        self._query(0, len(self._items), start, end, found)
+        return found
+
+    def _query(self, lo: int, hi: int, start: date, end: date, found: List[Interval]) -> None:
+        if lo >= hi:
+            return
+        mid = (lo + hi) // 2
+        if self._max_end[mid] < start:
+            return
+        self._query(lo, mid, start, end, found)
+        item = self._items[mid]
+        if item.start > end:
+            # Everything to the right starts even later
+            return
+        if item.end >= start:
+            found.append(item)
+        self._query(mid + 1, hi, start, end, found)
+
+
+class ActiveCampaignIndex:
+    """Lazily rebuilt interval tree of the currently active campaigns."""
+
+    def __init__(self, ttl_seconds: int = 30) -> None:
+        self.ttl_seconds = ttl_seconds
+        self._lock = Lock()
+        self._tree: Optional[IntervalTree] = None
+        self._built_at = 0.0
+
+    def init_app(self, app: Flask) -> None:
+        """Read index settings from the application config."""
+        self.ttl_seconds = app.config.get("CAMPAIGN_INDEX_TTL_SECONDS", self.ttl_seconds)
+        self.invalidate()
+        app.extensions["campaign_index"] = self
+
+    def invalidate(self) -> None:
+        """Drop the tree so the next lookup reloads it from the database."""
+        with self._lock:
+            self._tree = None
+
+    def _current_tree(self) -> IntervalTree:
+        with self._lock:
+            if self._tree is None or monotonic() - self._built_at > self.ttl_seconds:
+                # Served by the (status, start_date, end_date) index
+                rows = db.session.query(
+                    Campaign.start_date, Campaign.end_date, Campaign.id, Campaign.name
+                ).filter(
+                    Campaign.status == CampaignStatus.ACTIVE.value
+                ).all()
+                self._tree = IntervalTree([Interval(*row) for row in rows])
+                self._built_at = monotonic()
+            return self._tree
+
+    def conflicts(self, start: date, end: date, exclude_campaign_id: Any = None) -> List[Interval]:
+        """Return the active campaigns overlapping [start, end], ordered by start.
+
+        The tree only knows about changes made by this process, so an empty
+        answer is confirmed against the database before the caller writes.
+        """
+        found = [
+            interval
+            for interval in self._current_tree().overlapping(start, end)
+            if interval.campaign_id != exclude_campaign_id
+        ]
+        if found:
+            return found
+
+        found = self._query_overlapping(start, end, exclude_campaign_id)
+        if found:
+            self.invalidate()  # Another worker added or activated a campaign
+        return found
+
+    @staticmethod
+    def _query_overlapping(start: date, end: date, exclude_campaign_id: Any = None) -> List[Interval]:
+        query = db.session.query(
+            Campaign.start_date, Campaign.end_date, Campaign.id, Campaign.name
+        ).filter(
+            Campaign.status == CampaignStatus.ACTIVE.value,
+            Campaign.start_date <= end,
+            Campaign.end_date >= start,
+        )
+        if exclude_campaign_id is not None:
+            query = query.filter(Campaign.id != exclude_campaign_id)
+        return [Interval(*row) for row in query.order_by(Campaign.start_date, Campaign.end_date)]
+
+
+# Singleton index shared by the campaign endpoints
+campaign_index = ActiveCampaignIndex()
@@ -0,0 +1,175 @@
+# services/campaign_manifest.py - Precomputed active/next campaign manifest
+"""Manifest of the active and next scheduled campaign for kiosks.
+
+Kiosks poll for the campaign to show far more often than campaigns change,
+so the answer is computed ahead of time: a small JSON document with both
+campaigns, their image URLs and content hashes, and ``valid_until`` (the
+next date on which any campaign changes status). The document is rebuilt
+when campaigns or images change and when ``valid_until`` is reached, and is
+kept in memory and in ``CAMPAIGN_MANIFEST_PATH``. The file is how the app
+processes share it: each one stats the file per request and reloads it when
+another process has rewritten it. Serving the manifest is a dictionary
+lookup; the ETag is a hash of its bytes, so an unchanged manifest answers
+with a 304.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from datetime import date
+from threading import Lock
+from typing import Dict, Optional, Tuple
+
+from flask import Flask
+
+from models import Campaign, CampaignStatus
+
+from .campaign_index import campaign_index
+from .campaign_status import status_engine
+from .image_etags import image_etags
+from .image_urls import image_url
+
+
+class CampaignManifest:
+    """Builds, stores and serves the campaign manifest."""
+
+    def __init__(self) -> None:
+        self.path = os.path.abspath("campaign_manifest.json")
+        self.upload_folder = os.path.abspath("assets")
+        self.max_age = 30
+        self._lock = Lock()
+        self._body: Optional[bytes] = None
+        self._etag: Optional[str] = None
+        self._valid_until: Optional[date] = None
+        self._built_on: Optional[date] = None
+        self._mtime_ns: Optional[int] = None
+
+    def init_app(self, app: Flask) -> None:
+        """Read the manifest settings; the manifest is rebuilt on first use."""
+        self.path = os.path.abspath(app.config.get("CAMPAIGN_MANIFEST_PATH", "campaign_manifest.json"))
+        self.upload_folder = os.path.abspath(app.config.get("UPLOAD_FOLDER", "assets"))
+        self.max_age = app.config.get("CAMPAIGN_MANIFEST_MAX_AGE_SECONDS", self.max_age)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self._lock:
+            self._body = None
+
+    def current(self, today: Optional[date] = None) -> Tuple[bytes, str]:
+        """Return the manifest body and its ETag, rebuilding only when it is out of date."""
+        today = today or date.today()
+        with self._lock:
+            if self._body is not None:
+                self._reload_if_rewritten()
+            if self._is_stale(today):
+                self._rebuild(today)
+            return self._body, self._etag
+
+    def rebuild(self, today: Optional[date] = None) -> None:
+        """Recompute the manifest now; called after campaigns or images change.
+
+        A failure here leaves the manifest to be rebuilt on the next read
+        instead of failing the change that triggered it.
+        """
+        with self._lock:
+            try:
+                if self._body is not None:
+                    self._reload_if_rewritten()
+                self._rebuild(today or date.today())
+            except Exception as e:
+                print(f"Failed to rebuild campaign manifest: {e}")
+                self._body = None
+
+    def _is_stale(self, today: date) -> bool:
+        if self._body is None or self._built_on is None or today < self._built_on:
+            return True
+        return self._valid_until is not None and today >= self._valid_until
+
+    def _reload_if_rewritten(self) -> None:
+        """Pick up a manifest another process wrote since this one last looked."""
+        try:
+            mtime_ns = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return
+        if mtime_ns == self._mtime_ns:
+            return
+        with open(self.path, "rb") as handle:
+            body = handle.read()
+        try:
+            self._remember(body, json.loads(body))
+        except (KeyError, ValueError):
+            return  # Not a manifest this version wrote; the next rebuild replaces it
+        self._mtime_ns = mtime_ns
+
+    def _rebuild(self, today: date) -> None:
+        if status_engine.refresh(today):
+            campaign_index.invalidate()
+        document = self._build(today)
+        body = json.dumps(document, sort_keys=True, separators=(",", ":")).encode("utf-8")
+        if body != self._body:
+            self._write(body)
+        self._remember(body, document)
+
+    def _remember(self, body: bytes, document: Dict) -> None:
+        self._body = body
+        self._etag = hashlib.sha256(body).hexdigest()[:32]
+        self._valid_until = date.fromisoformat(document["valid_until"]) if document.get("valid_until") else None
+        self._built_on = date.fromisoformat(document["generated_on"])
+
+    def _build(self, today: date) -> Dict:
+        active = Campaign.query.filter_by(
+            status=CampaignStatus.ACTIVE.value
+        ).order_by(Campaign.start_date.desc()).first()
+        upcoming = Campaign.query.filter(
+            Campaign.status == CampaignStatus.SCHEDULED.value,
+            Campaign.start_date > today,
+        ).order_by(Campaign.start_date).first()
+        next_transition = status_engine.next_transition
+        return {
+            "generated_on": today.isoformat(),
+            "valid_until": next_transition.isoformat() if next_transition else None,
+            "active": self._describe(active),
+            "next": self._describe(upcoming),
+        }
+
+    def _describe(self, campaign: Optional[Campaign]) -> Optional[Dict]:
+        if campaign is None:
+            return None
+
+        images = {}
+        for image in campaign.images:
+            relative_path = os.path.relpath(image.file_path, self.upload_folder).replace(os.sep, "/")
+            if image.content_hash:
+                etag = image.content_hash[:32]
+            elif os.path.isfile(image.file_path):
+                etag = image_etags.etag_for(image.file_path)
+            else:
+                continue  # Listed but missing on disk; kiosks can't use it
+            images[image.image_type] = {
+                "url": image_url(relative_path, etag),
+                "content_hash": image.content_hash,
+                "etag": etag,
+            }
+        return {
+            "id": campaign.id,
+            "name": campaign.name,
+            "start_date": campaign.start_date.isoformat(),
+            "end_date": campaign.end_date.isoformat(),
+            "folder": os.path.basename(campaign.folder_path),
+            "images": images,
+        }
+
+    def _write(self, body: bytes) -> None:
+        """Replace the manifest file atomically so other processes never read half of it."""
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as handle:
+                handle.write(body)
+            os.replace(tmp_path, self.path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+        self._mtime_ns = os.stat(self.path).st_mtime_ns
+
+
+# Singleton manifest served to kiosks by the campaign endpoints
+campaign_manifest = CampaignManifest()
@@ -0,0 +1,188 @@
+# services/campaign_status.py - Date-driven campaign status transitions
+"""Incremental campaign status engine.
+
+A campaign's status only changes when a date boundary is crossed: it becomes
+active on ``start_date`` and expired the day after ``end_date``. The engine
+remembers the day it last ran and the next boundary date, so most requests
+need no queries at all and a refresh only touches campaigns whose boundary
+fell inside the window since the previous run.
+"""
+
+from datetime import date, timedelta
+from threading import Lock
+from time import monotonic
+from typing import Dict, List, Optional
+
+from flask import Flask
+from sqlalchemy import case, func, or_
+
+from models import Campaign, CampaignStatus, db
+
+
+class CampaignStatusEngine:
+    """Apply campaign status transitions as their date boundaries pass."""
+
+    def __init__(self, recheck_seconds: int = 300) -> None:
+        self.recheck_seconds = recheck_seconds
+        self._lock = Lock()
+        self._last_run: Optional[date] = None
+        self._next_transition: Optional[date] = None
+        self._checked_at = 0.0
+        self._dirty = True
+
+    def init_app(self, app: Flask) -> None:
+        """Read engine settings from the application config."""
+        self.recheck_seconds = app.config.get(
+            "CAMPAIGN_STATUS_RECHECK_SECONDS", self.recheck_seconds
+        )
+        self.reset()
+        app.extensions["campaign_status_engine"] = self
+
+    def reset(self) -> None:
+        """Forget all cached state so the next refresh reconciles every row."""
+        with self._lock:
+            self._last_run = None
+            self._next_transition = None
+            self._checked_at = 0.0
+            self._dirty = True
+
+    def invalidate(self) -> None:
+        """Force the next refresh to recompute the next transition date."""
+        self._dirty = True
+
+    def observe(self, start_date: date, end_date: date, today: Optional[date] = None) -> None:
+        """Account for a created or re-dated campaign without querying."""
+        today = today or date.today()
+        with self._lock:
+            for boundary in (start_date, end_date + timedelta(days=1)):
+                if boundary > today and (
+                    self._next_transition is None or boundary < self._next_transition
+                ):
+                    self._next_transition = boundary
+
+    @property
+    def next_transition(self) -> Optional[date]:
+        """Date on which the next status change is due, if any."""
+        return self._next_transition
+
+    def is_current(self, today: Optional[date] = None) -> bool:
+        """Return True when no campaign can have changed status since the last run."""
+        today = today or date.today()
+        if self._dirty or self._last_run is None or today < self._last_run:
+            return False
+        if monotonic() - self._checked_at > self.recheck_seconds:
+            return False
+        return self._next_transition is None or today < self._next_transition
+
+    def refresh(self, today: Optional[date] = None, force: bool = False) -> List[Dict]:
+        """Apply due transitions and return the campaigns whose status changed."""
+        today = today or date.today()
+        if not force and self.is_current(today):
+            return []
+
+        with self._lock:
+            if not force and self.is_current(today):
+                return []
+
+            if force or self._last_run is None or today < self._last_run:
+                changes = self._reconcile_all(today)
+            else:
+                changes = self._apply_window(self._last_run, today)
+
+            if changes:
+                try:
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
+                    raise
+
+            self._next_transition = self._compute_next_transition(today)
+            self._last_run = today
+            self._checked_at = monotonic()
+            self._dirty = False
+
+        return changes
+
+    def _reconcile_all(self, today: date) -> List[Dict]:
+        """Bring every campaign in line with ``today``; used on the first run."""
+        expected = case(
+            (Campaign.start_date > today, CampaignStatus.SCHEDULED.value),
+            (Campaign.end_date < today, CampaignStatus.EXPIRED.value),
+            else_=CampaignStatus.ACTIVE.value,
+        )
+        rows = db.session.query(
+            Campaign.id, Campaign.name, Campaign.status, expected.label("expected")
+        ).filter(
+            or_(Campaign.status.is_(None), Campaign.status != expected)
+        ).all()
+
+        return self._apply(
+            [(row.id, row.name, row.status, row.expected) for row in rows]
+        )
+
+    def _apply_window(self, last_run: date, today: date) -> List[Dict]:
+        """Transition campaigns whose boundary fell in ``(last_run, today]``."""
+        if today == last_run:
+            return []
+
+        started = db.session.query(
+            Campaign.id, Campaign.name, Campaign.status
+        ).filter(
+            Campaign.start_date > last_run,
+            Campaign.start_date <= today,
+            Campaign.end_date >= today,
+            Campaign.status != CampaignStatus.ACTIVE.value,
+        ).all()
+
+        ended = db.session.query(
+            Campaign.id, Campaign.name, Campaign.status
+        ).filter(
+            Campaign.end_date >= last_run,
+            Campaign.end_date < today,
+            Campaign.status != CampaignStatus.EXPIRED.value,
+        ).all()
+
+        transitions = [
+            (row.id, row.name, row.status, CampaignStatus.ACTIVE.value) for row in started
+        ] + [
+            (row.id, row.name, row.status, CampaignStatus.EXPIRED.value) for row in ended
+        ]
+        return self._apply(transitions)
+
+    def _apply(self, transitions) -> List[Dict]:
+        """Issue one UPDATE per target status and describe the changes."""
+        changes = []
+        by_status: Dict[str, List[int]] = {}
+
+        for campaign_id, name, old_status, new_status in transitions:
+            by_status.setdefault(new_status, []).append(campaign_id)
+            changes.append({
+                "id": campaign_id,
+                "name": name,
+                "old_status": old_status,
+                "new_status": new_status
+            })
+
+        for new_status, ids in by_status.items():
+            Campaign.query.filter(Campaign.id.in_(ids)).update(
+                {Campaign.status: new_status}, synchronize_session="fetch"
+            )
+
+        return changes
+
+    @staticmethod
+    def _compute_next_transition(today: date) -> Optional[date]:
+        """Return the earliest future date on which any campaign changes status."""
+        next_start = db.session.query(func.min(Campaign.start_date)).filter(
+            Campaign.start_date > today
+        ).scalar()
+        next_end = db.session.query(func.min(Campaign.end_date)).filter(
+            Campaign.end_date >= today
+        ).scalar()
+
+        candidates = [d for d in (next_start, next_end + timedelta(days=1) if next_end else None) if d]
+        return min(candidates) if candidates else None
+
+
+# Singleton engine shared by the campaign endpoints
+status_engine = CampaignStatusEngine()
@@ -0,0 +1,310 @@
+# services/folder_publisher.py - Atomic publishing of campaign date folders
+"""Staged, atomic publishing of the ``YYYY-MM-DD`` folders the kiosk reads.
+
+The kiosk's ``get_newest_folder()`` picks the newest date folder in
+``UPLOAD_FOLDER`` and may look at any moment, so a folder must never appear
+with only some of its images. Each version of a folder is built under
+``UPLOAD_FOLDER/.versions/<date>.<token>`` from the files of the current
+version (several campaigns may share a start date) plus blob store links for
+the new files, fsynced, and then published by pointing a relative
+``UPLOAD_FOLDER/<date>`` symlink at it with ``os.replace``: readers see
+either the old folder or the complete new one.
+
+Symlinks need a POSIX filesystem, or on Windows administrator rights or
+developer mode. ``CAMPAIGN_PUBLISH_MODE=rename`` renames the staged
+directory into place instead, which is atomic for a new folder but briefly
+leaves no folder while one is replaced; symlink mode falls back to it when
+the platform refuses to create a symlink. A plain folder created before
+versioning is moved into ``.versions`` the first time it is republished.
+
+Changes are grouped in a ``FolderPublication``: if the database commit made
+inside it fails, every swap is undone and the staged versions are removed;
+on success the superseded versions are deleted. A publication holds a lock
+file per date folder (``.versions/.<date>.lock``) from staging until that
+commit or rollback, so publishes of one date in any worker process run one
+after another and each stages from the version the previous one committed.
+Publishing lists only the one folder it replaces.
+"""
+
+import os
+import shutil
+import uuid
+from contextlib import ExitStack
+from threading import RLock
+from time import time
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from flask import Flask
+
+from .asset_store import asset_store, fsync_dir
+from .file_lock import file_lock
+from .image_etags import image_etags
+
+
+PUBLISH_MODES = ("symlink", "rename")
+
+
+class FolderPublication:
+    """Folder swaps that are kept or undone together with a database commit."""
+
+    def __init__(self, publisher: "CampaignFolderPublisher") -> None:
+        self._publisher = publisher
+        self._undo: List[Callable[[], None]] = []
+        self._superseded: List[str] = []
+        self._locks = ExitStack()
+        self._locked: Set[str] = set()
+
+    def lock(self, *names: str) -> None:
+        """Take the locks of folders ``names`` now, in a fixed order.
+
+        Call first when a publication changes several folders, so two of
+        them can't each wait for a folder the other holds.
+        """
+        for name in sorted(set(names) - self._locked):
+            self._locks.enter_context(file_lock(self._publisher._lock_path(name)))
+            self._locked.add(name)
+
+    def publish(self, name: str, files: Dict[str, str], remove: Iterable[str] = ()) -> str:
+        """Publish a new version of folder ``name``.
+
+        The version keeps the current folder's files except those named in
+        ``remove``, and adds or replaces ``files`` (filename -> blob digest).
+        """
+        self.lock(name)
+        staged, previous = self._publisher._replace(name, files, set(remove))
+        self._undo.append(lambda: self._publisher._restore(name, previous, staged))
+        if previous:
+            self._superseded.append(previous)
+
+        published = self._publisher.published_path(name)
+        for filename, digest in files.items():
+            image_etags.prime(os.path.join(published, filename), digest)
+        return published
+
+    def unpublish(self, name: str) -> bool:
+        """Remove folder ``name``; returns False if it wasn't published."""
+        self.lock(name)
+        previous = self._publisher._retire(name)
+        if previous is None:
+            return False
+        self._undo.append(lambda: self._publisher._restore(name, previous, None))
+        self._superseded.append(previous)
+        return True
+
+    def commit(self) -> None:
+        """Keep the new folders and delete the versions they replaced."""
+        for path in self._superseded:
+            shutil.rmtree(path, ignore_errors=True)
+        self._undo.clear()
+        self._superseded.clear()
+        self._release()
+
+    def rollback(self) -> None:
+        """Put every folder back the way it was, newest change first."""
+        for undo in reversed(self._undo):
+            try:
+                undo()
+            except OSError as e:
+                print(f"Failed to roll back campaign folder publish: {e}")
+        self._undo.clear()
+        self._superseded.clear()
+        self._release()
+
+    def _release(self) -> None:
+        self._locks.close()
+        self._locked.clear()
+
+    def __enter__(self) -> "FolderPublication":
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> bool:
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+        return False
+
+
+class CampaignFolderPublisher:
+    """Builds folder versions and swaps them into ``UPLOAD_FOLDER``."""
+
+    def __init__(self) -> None:
+        self.upload_folder = os.path.abspath("assets")
+        self.versions_dir = ".versions"
+        self.mode = "symlink"
+        self._lock = RLock()
+
+    def init_app(self, app: Flask) -> None:
+        """Read the publish settings and create the versions folder."""
+        self.upload_folder = os.path.abspath(app.config.get("UPLOAD_FOLDER", "assets"))
+        self.versions_dir = app.config.get("CAMPAIGN_VERSIONS_DIR", self.versions_dir)
+        self.mode = app.config.get("CAMPAIGN_PUBLISH_MODE", "symlink").lower()
+        if self.mode not in PUBLISH_MODES:
+            raise ValueError(f"CAMPAIGN_PUBLISH_MODE must be one of {', '.join(PUBLISH_MODES)}")
+        os.makedirs(self.versions_folder, exist_ok=True)
+        if self.mode == "symlink" and not self._symlinks_supported():
+            print("⚠️ Cannot create symlinks in UPLOAD_FOLDER (on Windows this needs admin rights "
+                  "or developer mode); publishing campaign folders with CAMPAIGN_PUBLISH_MODE=rename")
+            self.mode = "rename"
+
+    @property
+    def versions_folder(self) -> str:
+        return os.path.join(self.upload_folder, self.versions_dir)
+
+    def published_path(self, name: str) -> str:
+        """Path the kiosk sees for folder ``name`` (stable across versions)."""
+        return os.path.join(self.upload_folder, name)
+
+    def transaction(self) -> FolderPublication:
+        return FolderPublication(self)
+
+    def prune_versions(self, min_age_seconds: int = 3600) -> int:
+        """Delete versions no published folder points at (left by a crash); maintenance only.
+
+        Versions younger than ``min_age_seconds`` may belong to a publish in
+        progress in another process and are kept.
+        """
+        cutoff = time() - min_age_seconds
+        with self._lock:
+            live = {
+                os.path.realpath(entry.path)
+                for entry in os.scandir(self.upload_folder) if entry.is_symlink()
+            }
+            removed = 0
+            for entry in os.scandir(self.versions_folder):
+                if (not entry.is_dir(follow_symlinks=False)
+                        or os.path.realpath(entry.path) in live
+                        or entry.stat(follow_symlinks=False).st_mtime > cutoff):
+                    continue
+                shutil.rmtree(entry.path, ignore_errors=True)
+                removed += 1
+        return removed
+
+    def _symlinks_supported(self) -> bool:
+        probe = os.path.join(self.versions_folder, f".symlink-probe.{os.getpid()}")
+        try:
+            if os.path.lexists(probe):
+                os.unlink(probe)
+            os.symlink(".", probe)
+        except (OSError, NotImplementedError, AttributeError):
+            return False
+        os.unlink(probe)
+        return True
+
+    def _replace(self, name: str, files: Dict[str, str], remove: Set[str]) -> Tuple[str, Optional[str]]:
+        """Stage and publish a version of ``name``; returns ``(staged, previous)``."""
+        with self._lock:  # The caller holds the folder's file lock; this guards prune_versions
+            staged = self._stage(name, files, remove)
+            return staged, self._swap(name, staged)
+
+    def _stage(self, name: str, files: Dict[str, str], remove: Set[str] = frozenset()) -> str:
+        staged = os.path.join(self.versions_folder, f"{name}.{uuid.uuid4().hex[:12]}")
+        os.makedirs(staged)
+        try:
+            current = self.published_path(name)
+            if os.path.isdir(current):
+                # Files other campaigns starting on this date put there
+                for entry in os.scandir(current):
+                    if entry.name in files or entry.name in remove or entry.name.startswith("."):
+                        continue
+                    if entry.is_file():
+                        _carry(entry.path, os.path.join(staged, entry.name))
+            for filename, digest in files.items():
+                asset_store.link(digest, os.path.join(staged, filename))
+        except Exception:
+            shutil.rmtree(staged, ignore_errors=True)
+            raise
+        fsync_dir(staged)
+        fsync_dir(self.versions_folder)
+        return staged
+
+    def _swap(self, name: str, staged: str) -> Optional[str]:
+        """Publish ``staged`` as ``name``; returns the version it replaced, if any."""
+        target = self.published_path(name)
+        with self._lock:
+            previous = self._set_aside(name)
+            if self.mode == "symlink":
+                self._point(target, staged)
+            else:
+                os.rename(staged, target)
+            fsync_dir(self.upload_folder)
+        return previous
+
+    def _retire(self, name: str) -> Optional[str]:
+        """Take folder ``name`` out of ``UPLOAD_FOLDER``; returns where its content went."""
+        with self._lock:
+            previous = self._set_aside(name)
+            if previous and os.path.islink(self.published_path(name)):
+                os.unlink(self.published_path(name))
+            fsync_dir(self.upload_folder)
+        return previous
+
+    def _restore(self, name: str, previous: Optional[str], staged: Optional[str]) -> None:
+        target = self.published_path(name)
+        with self._lock:
+            if self.mode == "symlink" and not self._shows(target, staged):
+                # Published again since; putting ours back would hide that version
+                print(f"Not rolling back campaign folder {name}: it was republished meanwhile")
+                if staged:
+                    shutil.rmtree(staged, ignore_errors=True)
+                return
+            if self.mode == "rename" and staged and os.path.isdir(target) and not os.path.islink(target):
+                os.rename(target, staged)  # Move our version back out so it can be discarded
+            if previous and self.mode == "symlink":
+                self._point(target, previous)
+            elif previous:
+                os.rename(previous, target)
+            elif os.path.islink(target):
+                os.unlink(target)
+            fsync_dir(self.upload_folder)
+        if staged:
+            shutil.rmtree(staged, ignore_errors=True)
+
+    def _lock_path(self, name: str) -> str:
+        return os.path.join(self.versions_folder, f".{name}.lock")
+
+    @staticmethod
+    def _shows(target: str, staged: Optional[str]) -> bool:
+        """True if ``target`` still shows what this publication left there."""
+        if staged is None:
+            return not os.path.lexists(target)  # Unpublished, and nobody published it since
+        return os.path.islink(target) and os.path.realpath(target) == os.path.realpath(staged)
+
+    def _set_aside(self, name: str) -> Optional[str]:
+        """Where the current content of ``name`` lives once it is replaced."""
+        target = self.published_path(name)
+        if os.path.islink(target):
+            return os.path.realpath(target)
+        if not os.path.isdir(target):
+            return None
+        # A plain directory (published before versioning, or in rename mode): move it aside
+        aside = os.path.join(self.versions_folder, f"{name}.{uuid.uuid4().hex[:12]}")
+        os.rename(target, aside)
+        if self.mode == "symlink":
+            self._point(target, aside)  # Keep the folder visible until the swap
+        return aside
+
+    def _point(self, target: str, version: str) -> None:
+        """Atomically (re)point the ``target`` symlink at ``version``."""
+        relative = os.path.relpath(version, os.path.dirname(target))
+        # Built inside .versions so the kiosk never lists the temporary name
+        tmp_link = os.path.join(self.versions_folder, f".{os.path.basename(target)}.{os.getpid()}.link")
+        if os.path.lexists(tmp_link):
+            os.unlink(tmp_link)
+        os.symlink(relative, tmp_link)
+        os.replace(tmp_link, target)
+
+
+def _carry(source: str, target: str) -> None:
+    """Put an existing file into a new version without copying it where possible."""
+    if os.path.islink(source):
+        os.symlink(os.path.realpath(source), target)
+        return
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+# Singleton publisher used by the campaign and upload endpoints
+folder_publisher = CampaignFolderPublisher()
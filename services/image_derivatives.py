@@ -0,0 +1,194 @@
+# services/image_derivatives.py - Resized and re-encoded image variants
+"""Derivative images generated with Pillow.
+
+Uploads are stored as-is, which sends multi-megabyte PNG backgrounds to every
+screen and to the admin list views. Variants are produced at the widths in
+``IMAGE_DERIVATIVE_WIDTHS`` and in WebP (and AVIF when a Pillow AVIF plugin
+is installed), either ahead of time when an image is uploaded or on the
+first request for them. Variants live under ``IMAGE_CACHE_FOLDER``, outside
+the assets tree, named by the source's content hash and the parameters
+(width, quality, format), so neither a replaced upload nor a changed
+``IMAGE_DERIVATIVE_QUALITY`` serves a stale variant. ``prune`` deletes the
+variants of images no campaign uses any more and those made at another
+quality (see ``scripts/gc_asset_blobs.py``).
+"""
+
+import os
+import tempfile
+from time import time
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+from flask import Flask
+from PIL import Image, ImageOps
+from werkzeug.datastructures import MIMEAccept
+
+from .image_etags import image_etags
+
+try:  # Optional AVIF support via the pillow-avif-plugin package
+    import pillow_avif  # noqa: F401
+except ImportError:
+    pass
+
+
+FORMATS = {
+    "webp": ("WEBP", "image/webp"),
+    "avif": ("AVIF", "image/avif"),
+    "jpeg": ("JPEG", "image/jpeg"),
+    "png": ("PNG", "image/png"),
+}
+FORMAT_ALIASES = {"jpg": "jpeg"}
+
+
+class ImageDerivatives:
+    """Creates and locates cached image variants."""
+
+    def __init__(self) -> None:
+        self.cache_folder = "image_cache"
+        self.widths: List[int] = [320, 1280, 1920]
+        self.formats: List[str] = ["webp"]
+        self.quality = 82
+        self.pregenerate_on_upload = True
+
+    def init_app(self, app: Flask) -> None:
+        """Read the pipeline settings and create the cache folder."""
+        self.cache_folder = os.path.abspath(app.config.get("IMAGE_CACHE_FOLDER", self.cache_folder))
+        self.widths = sorted(
+            int(width) for width in str(app.config.get("IMAGE_DERIVATIVE_WIDTHS", "320,1280,1920")).split(",")
+            if width.strip()
+        )
+        self.formats = [
+            fmt for fmt in (
+                self.normalize_format(name)
+                for name in str(app.config.get("IMAGE_DERIVATIVE_FORMATS", "webp,avif")).split(",")
+            ) if fmt and self.supports(fmt)
+        ]
+        self.quality = app.config.get("IMAGE_DERIVATIVE_QUALITY", 82)
+        self.pregenerate_on_upload = app.config.get("IMAGE_PREGENERATE_ON_UPLOAD", True)
+        os.makedirs(self.cache_folder, exist_ok=True)
+
+    @staticmethod
+    def normalize_format(name: Optional[str]) -> Optional[str]:
+        name = (name or "").strip().lower()
+        name = FORMAT_ALIASES.get(name, name)
+        return name if name in FORMATS else None
+
+    @staticmethod
+    def supports(fmt: str) -> bool:
+        """True if this Pillow build can encode ``fmt``."""
+        Image.init()  # Registers the encoders of every installed plugin
+        return fmt in FORMATS and FORMATS[fmt][0] in Image.SAVE
+
+    @staticmethod
+    def mimetype(fmt: str) -> str:
+        return FORMATS[fmt][1]
+
+    def choose_width(self, requested: Optional[int]) -> Optional[int]:
+        """Snap a requested width to the smallest configured width that covers it."""
+        if not requested or requested <= 0 or not self.widths:
+            return None
+        for width in self.widths:
+            if width >= requested:
+                return width
+        return self.widths[-1]
+
+    def negotiate_format(self, accept: MIMEAccept, source_format: str) -> str:
+        """Pick the best encoded format the client accepts (``fmt=auto``).
+
+        Only formats the client names itself count, not ``*/*`` or
+        ``image/*``, and ``q=0`` refuses one.
+        """
+        named = {value.lower(): quality for value, quality in accept}
+        for fmt in ("avif", "webp"):
+            if fmt in self.formats and named.get(f"image/{fmt}", 0) > 0:
+                return fmt
+        return source_format
+
+    def variant_tag(self, width: Optional[int]) -> str:
+        """The parameters part of a variant's name and ETag."""
+        return f"{width or 'full'}_q{self.quality}"
+
+    def variant_path(self, digest: str, width: Optional[int], fmt: str) -> str:
+        """Cache location of a variant of the image whose content hash is ``digest``."""
+        name = f"{digest}_{self.variant_tag(width)}.{fmt}"
+        return os.path.join(self.cache_folder, digest[:2], name)
+
+    def get(self, source_path: str, width: Optional[int], fmt: str) -> str:
+        """Return the variant's path, generating it on first use."""
+        digest = image_etags.etag_for(source_path)
+        path = self.variant_path(digest, width, fmt)
+        if not os.path.exists(path):
+            self._render(source_path, path, width, fmt)
+        return path
+
+    def pregenerate(self, source_path: str, widths: Optional[Sequence[int]] = None,
+                    formats: Optional[Sequence[str]] = None) -> List[str]:
+        """Generate every configured width in the source format and each encoded format."""
+        if formats is None:
+            source_format = self.normalize_format(os.path.splitext(source_path)[1].lstrip("."))
+            formats = ([source_format] if source_format else []) + self.formats
+        created = []
+        for fmt in formats:
+            for width in widths or self.widths:
+                try:
+                    created.append(self.get(source_path, width, fmt))
+                except Exception as e:
+                    print(f"Failed to create {fmt} variant ({width}px) of {source_path}: {e}")
+        return created
+
+    def prune(self, referenced: Iterable[str], min_age_seconds: int = 3600,
+              dry_run: bool = False) -> Tuple[int, int]:
+        """Delete variants not worth keeping; returns ``(files, bytes)`` removed.
+
+        A variant is kept if its source's content hash (full or ETag length)
+        is in ``referenced`` and it was made at the current quality, or if it
+        is younger than ``min_age_seconds``.
+        """
+        keys = {digest[:32] for digest in referenced}
+        current = f"_q{self.quality}"
+        cutoff = time() - min_age_seconds
+        removed = freed = 0
+        for directory, _, names in os.walk(self.cache_folder):
+            for name in names:
+                path = os.path.join(directory, name)
+                stat = os.stat(path)
+                stem = os.path.splitext(name)[0]
+                if stat.st_mtime > cutoff or (stem.split("_", 1)[0] in keys and stem.endswith(current)):
+                    continue
+                if not dry_run:
+                    os.unlink(path)
+                removed += 1
+                freed += stat.st_size
+        return removed, freed
+
+    def _render(self, source_path: str, path: str, width: Optional[int], fmt: str) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with Image.open(source_path) as source:
+            image = ImageOps.exif_transpose(source)
+            if width and image.width > width:
+                height = max(1, round(image.height * width / image.width))
+                image = image.resize((width, height), Image.LANCZOS)
+
+            pillow_format = FORMATS[fmt][0]
+            if pillow_format == "JPEG" and image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            elif image.mode == "P":
+                image = image.convert("RGBA")
+
+            options = {"optimize": True} if pillow_format in ("PNG", "JPEG") else {"quality": self.quality}
+            if pillow_format == "JPEG":
+                options["quality"] = self.quality
+
+            # Write beside the target and rename so readers never see a partial file
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as handle:
+                    image.save(handle, pillow_format, **options)
+                os.replace(tmp_path, path)
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+                raise
+
+
+# Singleton derivative pipeline used by uploads and the image endpoint
+image_derivatives = ImageDerivatives()
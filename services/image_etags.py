@@ -0,0 +1,63 @@
+# services/image_etags.py - Cached content hashes for served images
+"""Strong ETags for campaign images.
+
+An image's ETag is the SHA-256 of its bytes. Hashing a multi-megabyte PNG on
+every request would cost more than sending it, so digests are cached by
+``(path, size, mtime)``: an upload that replaces the file changes the key and
+the next request hashes the new bytes once.
+"""
+
+import hashlib
+import os
+from typing import Optional
+
+from flask import Flask
+
+from .cache import TTLCache
+
+
+HASH_CHUNK_BYTES = 1024 * 1024
+
+
+def file_digest(path: str) -> str:
+    """SHA-256 hex digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for chunk in iter(lambda: handle.read(HASH_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ImageETags:
+    """Content-hash ETags keyed by file identity."""
+
+    def __init__(self) -> None:
+        self._digests = TTLCache(maxsize=4096, ttl=3600, name="image_etags")
+
+    def init_app(self, app: Flask) -> None:
+        """Size the digest cache from the application config."""
+        self._digests.configure(
+            maxsize=app.config.get("IMAGE_ETAG_CACHE_SIZE", 4096),
+            ttl=app.config.get("IMAGE_ETAG_CACHE_TTL_SECONDS", 3600),
+        )
+
+    def etag_for(self, path: str, stat: Optional[os.stat_result] = None) -> str:
+        """Return the ETag for ``path``, hashing the file only on a cache miss."""
+        path = os.path.abspath(path)
+        stat = stat or os.stat(path)
+        key = (path, stat.st_size, stat.st_mtime_ns)
+        digest = self._digests.get(key)
+        if digest is None:
+            digest = file_digest(path)
+            self._digests.set(key, digest)
+        return digest[:32]
+
+    def prime(self, path: str, digest: str) -> None:
+        """Record a digest computed elsewhere (e.g. while saving an upload)."""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        self._digests.set((path, stat.st_size, stat.st_mtime_ns), digest)
+
+
+# Singleton ETag cache used by the image endpoints
+image_etags = ImageETags()
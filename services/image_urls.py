@@ -0,0 +1,18 @@
+# services/image_urls.py - Public URLs of campaign images
+"""URL builder for images served by the ``/api/images`` endpoint.
+
+Lives in the service layer so services (the campaign manifest) and the API
+build the same URLs without importing from the blueprints.
+"""
+
+
+def image_url(relative_path: str, etag: str = None, **params) -> str:
+    """Public URL of an image under UPLOAD_FOLDER, versioned when ``etag`` is given.
+
+    Extra ``params`` (``w``, ``fmt``) select a derivative.
+    """
+    url = f"/api/images/{relative_path}".replace("\\", "/")
+    if etag:
+        params["v"] = etag
+    query = "&".join(f"{key}={value}" for key, value in params.items() if value)
+    return f"{url}?{query}" if query else url
@@ -0,0 +1,326 @@
+# services/latency.py - Per-endpoint latency sketches
+"""Endpoint latency percentiles without scanning activity logs.
+
+Every response's duration is added to a ``LatencySketch`` for its endpoint
+and the current minute. The sketch is a log-bucketed histogram in the style
+of DDSketch: any quantile it reports is within ``relative_accuracy`` (1%) of
+the true value, and two sketches merge by adding bucket counts. Each worker
+keeps the minutes still in progress in memory and a flusher thread writes
+completed minutes to ``endpoint_latency`` every
+``LATENCY_FLUSH_INTERVAL_SECONDS``. Rows are insert-only, one per worker,
+endpoint and minute, so workers never contend on the same row. Reads merge
+the stored rows with this worker's in-memory minutes.
+"""
+
+import atexit
+import json
+import math
+import os
+from datetime import datetime, timedelta
+from threading import Event, Lock, Thread
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from flask import Flask, has_app_context
+from sqlalchemy.orm import Session
+
+from models import EndpointLatency, db
+
+
+class LatencySketch:
+    """Mergeable histogram of millisecond durations with bounded relative error."""
+
+    MIN_VALUE = 0.001  # Durations below this land in the zero bucket
+
+    def __init__(self, relative_accuracy: float = 0.01) -> None:
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def add(self, value: float) -> None:
+        """Record one duration in milliseconds."""
+        value = max(value, 0.0)
+        if value < self.MIN_VALUE:
+            self.zero_count += 1
+        else:
+            key = math.ceil(math.log(value) / self._log_gamma)
+            self.bins[key] = self.bins.get(key, 0) + 1
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other: "LatencySketch") -> None:
+        """Add another sketch's samples to this one."""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different accuracy")
+        for key, count in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate the ``q`` quantile (0..1); None when the sketch is empty."""
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return self.min
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if seen > rank:
+                estimate = 2 * self.gamma ** key / (self.gamma + 1)
+                return min(max(estimate, self.min), self.max)
+        return self.max
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "a": self.relative_accuracy,
+            "z": self.zero_count,
+            "n": self.count,
+            "s": round(self.sum, 3),
+            "lo": None if self.count == 0 else round(self.min, 3),
+            "hi": round(self.max, 3),
+            "b": {str(key): count for key, count in self.bins.items()},
+        }, separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, raw: str) -> "LatencySketch":
+        data = json.loads(raw)
+        sketch = cls(data["a"])
+        sketch.zero_count = data["z"]
+        sketch.count = data["n"]
+        sketch.sum = data["s"]
+        sketch.min = math.inf if data["lo"] is None else data["lo"]
+        sketch.max = data["hi"]
+        sketch.bins = {int(key): count for key, count in data["b"].items()}
+        return sketch
+
+
+def _minute(moment: datetime) -> datetime:
+    return moment.replace(second=0, microsecond=0)
+
+
+class LatencyRecorder:
+    """Collects per-minute endpoint sketches and persists completed minutes."""
+
+    def __init__(self) -> None:
+        self.enabled = True
+        self.flush_interval = 15.0
+
+        self._app: Optional[Flask] = None
+        self._lock = Lock()
+        self._pending: Dict[Tuple[datetime, str], List] = {}  # (minute, endpoint) -> [errors, sketch]
+        self._thread: Optional[Thread] = None
+        self._stop = Event()
+        self._pid: Optional[int] = None
+        self._atexit_registered = False
+
+    def init_app(self, app: Flask) -> None:
+        """Read settings and arrange for a final flush at exit."""
+        self.shutdown()
+        self._app = app
+        self.enabled = app.config.get("LATENCY_TRACKING_ENABLED", True)
+        self.flush_interval = app.config.get("LATENCY_FLUSH_INTERVAL_SECONDS", 15)
+        with self._lock:
+            self._pending.clear()
+
+        if not self._atexit_registered:
+            atexit.register(self.shutdown)
+            self._atexit_registered = True
+
+    def record(self, endpoint: str, duration_ms: float, status_code: int,
+               at: Optional[datetime] = None) -> None:
+        """Add one response to its endpoint's sketch for the current minute."""
+        if not self.enabled:
+            return
+        self._ensure_started()
+        key = (_minute(at or datetime.utcnow()), endpoint)
+        with self._lock:
+            entry = self._pending.get(key)
+            if entry is None:
+                entry = self._pending[key] = [0, LatencySketch()]
+            if status_code >= 400:
+                entry[0] += 1
+            entry[1].add(duration_ms)
+
+    def flush(self, include_current: bool = False) -> int:
+        """Write completed minutes (or everything) to the database; return the row count."""
+        current = _minute(datetime.utcnow())
+        with self._lock:
+            ready = {
+                key: entry for key, entry in self._pending.items()
+                if include_current or key[0] < current
+            }
+            for key in ready:
+                del self._pending[key]
+        if not ready:
+            return 0
+
+        try:
+            if has_app_context():
+                self._insert(ready)
+            elif self._app is not None:
+                with self._app.app_context():
+                    self._insert(ready)
+        except Exception as e:
+            print(f"Latency flush failed, keeping {len(ready)} sketches for retry: {e}")
+            with self._lock:
+                for key, (errors, sketch) in ready.items():
+                    entry = self._pending.setdefault(key, [0, LatencySketch()])
+                    entry[0] += errors
+                    entry[1].merge(sketch)
+            return 0
+        return len(ready)
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        """Stop the flusher thread and persist every pending minute."""
+        thread = self._thread
+        if thread is not None and self._pid == os.getpid():
+            self._stop.set()
+            thread.join(timeout)
+        self._thread = None
+        if self._app is not None:
+            self.flush(include_current=True)
+
+    def prune(self, before: datetime) -> int:
+        """Delete stored sketches for minutes before ``before``."""
+        deleted = EndpointLatency.query.filter(
+            EndpointLatency.minute < before
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        return deleted
+
+    def sketches(self, start: datetime, end: datetime,
+                 endpoint: Optional[str] = None) -> Iterator[Tuple[datetime, str, int, LatencySketch]]:
+        """Yield ``(minute, endpoint, errors, sketch)`` for minutes in ``[start, end)``."""
+        query = db.session.query(
+            EndpointLatency.minute, EndpointLatency.endpoint,
+            EndpointLatency.error_count, EndpointLatency.sketch
+        ).filter(EndpointLatency.minute >= start, EndpointLatency.minute < end)
+        if endpoint:
+            query = query.filter(EndpointLatency.endpoint == endpoint)
+
+        for minute, name, errors, raw in query.yield_per(1000):
+            yield minute, name, errors, LatencySketch.from_json(raw)
+
+        with self._lock:
+            pending = []
+            for (minute, name), (errors, sketch) in self._pending.items():
+                if start <= minute < end and (not endpoint or name == endpoint):
+                    copy = LatencySketch(sketch.relative_accuracy)
+                    copy.merge(sketch)
+                    pending.append((minute, name, errors, copy))
+        yield from pending
+
+    def summary(self, minutes: int = 60, bucket_minutes: int = 1,
+                endpoint: Optional[str] = None, top: int = 20) -> Dict:
+        """Percentiles, throughput and error rates for the last ``minutes`` minutes."""
+        end = _minute(datetime.utcnow()) + timedelta(minutes=1)
+        start = end - timedelta(minutes=minutes)
+
+        overall = [0, LatencySketch()]
+        per_endpoint: Dict[str, List] = {}
+        timeline: Dict[datetime, List] = {}
+
+        for minute, name, errors, sketch in self.sketches(start, end, endpoint):
+            bucket = start + timedelta(
+                minutes=(minute - start) // timedelta(minutes=1) // bucket_minutes * bucket_minutes
+            )
+            for target in (
+                overall,
+                per_endpoint.setdefault(name, [0, LatencySketch()]),
+                timeline.setdefault(bucket, [0, LatencySketch()]),
+            ):
+                target[0] += errors
+                target[1].merge(sketch)
+
+        endpoints = sorted(per_endpoint.items(), key=lambda item: item[1][1].count, reverse=True)
+        return {
+            "window": {
+                "start": start.isoformat(),
+                "end": end.isoformat(),
+                "minutes": minutes,
+                "bucket_minutes": bucket_minutes,
+            },
+            "overall": _describe(overall, minutes),
+            "endpoints": [
+                {"endpoint": name, **_describe(entry, minutes)}
+                for name, entry in endpoints[:top]
+            ],
+            "timeline": [
+                {"start": bucket.isoformat(), **_describe(timeline[bucket], bucket_minutes)}
+                for bucket in sorted(timeline)
+            ],
+        }
+
+    def _insert(self, ready: Dict[Tuple[datetime, str], List]) -> None:
+        # A session of its own: flush() may run inside a request or another
+        # caller's app context, whose pending changes must stay theirs
+        with Session(db.engine) as session:
+            try:
+                session.add_all([
+                    EndpointLatency(
+                        minute=minute,
+                        endpoint=endpoint,
+                        count=sketch.count,
+                        error_count=errors,
+                        sketch=sketch.to_json(),
+                    )
+                    for (minute, endpoint), (errors, sketch) in ready.items()
+                ])
+                session.commit()
+            except Exception:
+                session.rollback()
+                raise
+
+    def _ensure_started(self) -> None:
+        pid = os.getpid()
+        if self._thread is not None and self._pid == pid:
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == pid:
+                return
+            if self._pid is not None and self._pid != pid:
+                # Forked worker: the parent's minutes are the parent's to flush
+                self._pending.clear()
+            self._pid = pid
+            self._stop = Event()
+            self._thread = Thread(target=self._run, name="latency-flusher", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+
+def _describe(entry: List, minutes: int) -> Dict:
+    errors, sketch = entry
+
+    def ms(value):
+        return None if value is None else round(value, 2)
+
+    return {
+        "requests": sketch.count,
+        "errors": errors,
+        "error_rate": round(errors / sketch.count * 100, 2) if sketch.count else 0,
+        "throughput_per_minute": round(sketch.count / minutes, 2) if minutes else None,
+        "avg_ms": ms(sketch.sum / sketch.count) if sketch.count else None,
+        "p50_ms": ms(sketch.quantile(0.50)),
+        "p95_ms": ms(sketch.quantile(0.95)),
+        "p99_ms": ms(sketch.quantile(0.99)),
+        "max_ms": ms(sketch.max) if sketch.count else None,
+    }
+
+
+# Singleton recorder fed by the request hooks in app.py
+latency_recorder = LatencyRecorder()
@@ -0,0 +1,94 @@
+# services/log_facets.py - Cached filter values for the logs UI
+"""Facet cache for the activity log filters.
+
+The distinct actions, statuses and resource types used to be recomputed with
+``DISTINCT`` scans of ``activity_logs`` on every page of logs. They are now
+loaded once per ``LOG_FACETS_TTL_SECONDS`` and kept current in between by the
+log writer, which feeds every committed batch to ``observe``. The user list
+is cached separately and dropped whenever a user is created or deleted.
+"""
+
+from threading import Lock
+from time import monotonic
+from typing import Dict, List, Optional, Set
+
+from flask import Flask
+
+from models import ActivityLog, User, db
+
+
+FACET_COLUMNS = ("action", "status", "resource_type")
+
+
+class LogFacetCache:
+    """Distinct log filter values, refreshed lazily and updated incrementally."""
+
+    def __init__(self, ttl_seconds: int = 600) -> None:
+        self.ttl_seconds = ttl_seconds
+        self._lock = Lock()
+        self._values: Optional[Dict[str, Set[str]]] = None
+        self._values_loaded_at = 0.0
+        self._users: Optional[List[Dict]] = None
+        self._users_loaded_at = 0.0
+
+    def init_app(self, app: Flask, log_writer=None) -> None:
+        """Read settings and subscribe to the log writer's committed batches."""
+        self.ttl_seconds = app.config.get("LOG_FACETS_TTL_SECONDS", self.ttl_seconds)
+        self.invalidate()
+        if log_writer is not None:
+            log_writer.add_flush_hook(self.observe)
+
+    def invalidate(self) -> None:
+        """Drop everything so the next read reloads from the database."""
+        with self._lock:
+            self._values = None
+            self._users = None
+
+    def invalidate_users(self) -> None:
+        """Drop the cached user list after users change."""
+        with self._lock:
+            self._users = None
+
+    def observe(self, rows: List[Dict]) -> None:
+        """Fold newly written log rows into the cached facet values."""
+        with self._lock:
+            if self._values is None:
+                return
+            for row in rows:
+                for column in FACET_COLUMNS:
+                    value = row.get(column)
+                    if value:
+                        self._values[column].add(value)
+
+    def get(self) -> Dict[str, List]:
+        """Return the filter values in the shape the logs UI expects."""
+        now = monotonic()
+        with self._lock:
+            if self._values is None or now - self._values_loaded_at > self.ttl_seconds:
+                self._values = {
+                    column: {
+                        value for (value,) in db.session.query(
+                            getattr(ActivityLog, column)
+                        ).distinct().all() if value
+                    }
+                    for column in FACET_COLUMNS
+                }
+                self._values_loaded_at = now
+
+            if self._users is None or now - self._users_loaded_at > self.ttl_seconds:
+                self._users = [
+                    {"id": user_id, "email": email}
+                    for user_id, email in db.session.query(User.id, User.email).order_by(User.email).all()
+                ]
+                self._users_loaded_at = now
+
+            return {
+                "users": list(self._users),
+                "actions": sorted(self._values["action"]),
+                "statuses": sorted(self._values["status"]),
+                "resource_types": sorted(self._values["resource_type"]),
+            }
+
+
+# Singleton facet cache shared by the logs endpoints
+log_facets = LogFacetCache()
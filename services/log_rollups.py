@@ -0,0 +1,240 @@
+# services/log_rollups.py - Pre-aggregated activity statistics
+"""Daily activity rollups behind ``/api/logs/stats``.
+
+The stats endpoint used to make five passes over ``activity_logs`` on every
+call. ``activity_rollups`` now holds one row per day, user, action and status
+with a count and duration sums. The log writer feeds every committed batch to
+``observe``, which upserts the batch's aggregates, so stats for any date range
+are a handful of small ``GROUP BY`` queries over the rollup. ``backfill``
+rebuilds a range of days from the raw logs; run it after deploying and after
+anything writes to ``activity_logs`` without going through the writer.
+
+Until then, and whenever ``LOG_ROLLUPS_ENABLED`` is off, ``summary`` answers
+from ``activity_logs`` directly for ranges the rollup doesn't cover: it
+covers every day from the first log once backfilled, and otherwise only the
+days after the one it started being maintained on.
+"""
+
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional
+
+from flask import Flask
+from sqlalchemy import case, func, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from models import ActivityLog, ActivityRollup, User, db
+
+
+ROLLUP_KEY = ("day", "user_id", "action", "status")
+ROLLUP_SUMS = ("count", "duration_sum_ms", "duration_count")
+
+
+class ActivityRollups:
+    """Maintains ``activity_rollups`` and answers stats queries from it."""
+
+    def __init__(self) -> None:
+        self.enabled = True
+        self._warned = False
+
+    def init_app(self, app: Flask, log_writer=None) -> None:
+        """Subscribe to the log writer's committed batches."""
+        self.enabled = app.config.get("LOG_ROLLUPS_ENABLED", True)
+        if log_writer is not None and self.enabled:
+            log_writer.add_flush_hook(self.observe)
+
+    def observe(self, rows: List[Dict]) -> None:
+        """Fold newly written log rows into the rollup table."""
+        if not self.enabled or not rows:
+            return
+
+        totals = defaultdict(lambda: [0, 0, 0])
+        for row in rows:
+            created_at = row.get("created_at") or datetime.utcnow()
+            key = (created_at.date(), row["user_id"], row["action"], row.get("status") or "success")
+            entry = totals[key]
+            entry[0] += 1
+            if row.get("duration_ms") is not None:
+                entry[1] += row["duration_ms"]
+                entry[2] += 1
+
+        self._upsert([
+            dict(zip(ROLLUP_KEY + ROLLUP_SUMS, key + tuple(sums)))
+            for key, sums in totals.items()
+        ])
+
+    def backfill(self, start_day: Optional[date] = None, end_day: Optional[date] = None) -> int:
+        """Rebuild the rollups for ``start_day``..``end_day`` (inclusive) from raw logs.
+
+        Either bound may be omitted to cover all logs on that side. Returns the
+        number of rollup rows written.
+        """
+        rollup = ActivityRollup.__table__
+        day = func.date(ActivityLog.created_at)
+
+        source = select(
+            day,
+            ActivityLog.user_id,
+            ActivityLog.action,
+            func.coalesce(ActivityLog.status, "success"),
+            func.count(ActivityLog.id),
+            func.coalesce(func.sum(ActivityLog.duration_ms), 0),
+            func.count(ActivityLog.duration_ms),
+        ).where(ActivityLog.created_at.isnot(None))
+        stale = db.session.query(ActivityRollup)
+
+        if start_day is not None:
+            source = source.where(ActivityLog.created_at >= datetime.combine(start_day, time.min))
+            stale = stale.filter(ActivityRollup.day >= start_day)
+        if end_day is not None:
+            source = source.where(
+                ActivityLog.created_at < datetime.combine(end_day + timedelta(days=1), time.min)
+            )
+            stale = stale.filter(ActivityRollup.day <= end_day)
+
+        source = source.group_by(
+            day, ActivityLog.user_id, ActivityLog.action, func.coalesce(ActivityLog.status, "success")
+        )
+
+        try:
+            stale.delete(synchronize_session=False)
+            result = db.session.execute(insert(rollup).from_select(ROLLUP_KEY + ROLLUP_SUMS, source))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return result.rowcount
+
+    def covers(self, start_day: date) -> bool:
+        """True if the rollup holds every log from ``start_day`` on."""
+        if not self.enabled:
+            return False  # Not maintained; whatever is there is out of date
+        first_log = db.session.query(func.min(ActivityLog.created_at)).scalar()
+        if first_log is None:
+            return True
+        first_rollup = db.session.query(func.min(ActivityRollup.day)).scalar()
+        if first_rollup is None:
+            return False
+        if first_rollup <= first_log.date():
+            return True  # Backfilled from the first log
+        # Maintained live since some time on first_rollup; earlier logs are missing
+        return start_day > first_rollup
+
+    def summary(self, start_day: date, end_day: date, limit: int = 10) -> Dict:
+        """Totals, daily counts and top users/actions for an inclusive day range."""
+        if self.covers(start_day):
+            return self._rollup_summary(start_day, end_day, limit)
+        if self.enabled and not self._warned:
+            print("⚠️ activity_rollups doesn't cover the requested stats range; answering from "
+                  "activity_logs until scripts/backfill_activity_rollups.py is run")
+            self._warned = True
+        return self._log_summary(start_day, end_day, limit)
+
+    def _rollup_summary(self, start_day: date, end_day: date, limit: int) -> Dict:
+        in_range = (ActivityRollup.day >= start_day, ActivityRollup.day <= end_day)
+        total = func.sum(ActivityRollup.count)
+
+        total_actions, error_actions, duration_sum, duration_count = db.session.query(
+            func.coalesce(total, 0),
+            func.coalesce(func.sum(case(
+                (ActivityRollup.status == "error", ActivityRollup.count), else_=0
+            )), 0),
+            func.coalesce(func.sum(ActivityRollup.duration_sum_ms), 0),
+            func.coalesce(func.sum(ActivityRollup.duration_count), 0),
+        ).filter(*in_range).one()
+
+        daily = db.session.query(ActivityRollup.day, total.label("count")).filter(
+            *in_range
+        ).group_by(ActivityRollup.day).order_by(ActivityRollup.day).all()
+
+        top_users = db.session.query(User.email, total.label("count")).join(
+            User, User.id == ActivityRollup.user_id
+        ).filter(*in_range).group_by(User.email).order_by(total.desc()).limit(limit).all()
+
+        top_actions = db.session.query(ActivityRollup.action, total.label("count")).filter(
+            *in_range
+        ).group_by(ActivityRollup.action).order_by(total.desc()).limit(limit).all()
+
+        return _summary_document(total_actions, error_actions, duration_sum, duration_count,
+                                 daily, top_users, top_actions)
+
+    def _log_summary(self, start_day: date, end_day: date, limit: int) -> Dict:
+        """The same summary computed from ``activity_logs``."""
+        in_range = (
+            ActivityLog.created_at >= datetime.combine(start_day, time.min),
+            ActivityLog.created_at < datetime.combine(end_day + timedelta(days=1), time.min),
+        )
+        total = func.count(ActivityLog.id)
+        day = func.date(ActivityLog.created_at)
+
+        total_actions, error_actions, duration_sum, duration_count = db.session.query(
+            total,
+            func.coalesce(func.sum(case((ActivityLog.status == "error", 1), else_=0)), 0),
+            func.coalesce(func.sum(ActivityLog.duration_ms), 0),
+            func.count(ActivityLog.duration_ms),
+        ).filter(*in_range).one()
+
+        daily = db.session.query(day, total.label("count")).filter(
+            *in_range
+        ).group_by(day).order_by(day).all()
+
+        top_users = db.session.query(User.email, total.label("count")).join(
+            User, User.id == ActivityLog.user_id
+        ).filter(*in_range).group_by(User.email).order_by(total.desc()).limit(limit).all()
+
+        top_actions = db.session.query(ActivityLog.action, total.label("count")).filter(
+            *in_range
+        ).group_by(ActivityLog.action).order_by(total.desc()).limit(limit).all()
+
+        return _summary_document(total_actions, error_actions, duration_sum, duration_count,
+                                 daily, top_users, top_actions)
+
+    def _upsert(self, values: List[Dict]) -> None:
+        table = ActivityRollup.__table__
+
+        # Runs from the log writer, possibly inside a request: keep off the request's session
+        with Session(db.engine) as session:
+            dialect = session.get_bind().dialect.name
+            try:
+                if dialect in ("sqlite", "postgresql"):
+                    dialect_insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+                    statement = dialect_insert(table)
+                    statement = statement.on_conflict_do_update(
+                        index_elements=list(ROLLUP_KEY),
+                        set_={column: table.c[column] + statement.excluded[column] for column in ROLLUP_SUMS},
+                    )
+                    session.execute(statement, values)
+                else:
+                    for value in values:
+                        updated = session.execute(
+                            table.update().where(
+                                *(table.c[column] == value[column] for column in ROLLUP_KEY)
+                            ).values({column: table.c[column] + value[column] for column in ROLLUP_SUMS})
+                        )
+                        if updated.rowcount == 0:
+                            session.execute(insert(table), [value])
+                session.commit()
+            except Exception:
+                session.rollback()
+                raise
+
+
+def _summary_document(total_actions, error_actions, duration_sum, duration_count,
+                      daily, top_users, top_actions) -> Dict:
+    error_rate = (error_actions / total_actions * 100) if total_actions > 0 else 0
+    return {
+        "summary": {
+            "total_actions": total_actions,
+            "error_actions": error_actions,
+            "error_rate": round(error_rate, 2),
+            "avg_duration_ms": round(duration_sum / duration_count, 2) if duration_count else None,
+        },
+        "daily_activity": [{"date": str(day), "count": count} for day, count in daily],
+        "top_users": [{"email": email, "count": count} for email, count in top_users],
+        "top_actions": [{"action": action, "count": count} for action, count in top_actions],
+    }
+
+
+# Singleton rollup maintainer fed by the log writer
+log_rollups = ActivityRollups()
@@ -0,0 +1,250 @@
+# services/log_writer.py - Background, batched ActivityLog writer
+"""Asynchronous activity log sink.
+
+Request threads hand log rows to a bounded queue and return immediately. A
+single flusher thread drains the queue and bulk-inserts ``ActivityLog`` rows
+every ``LOG_WRITER_FLUSH_INTERVAL_MS`` or as soon as ``LOG_WRITER_BATCH_SIZE``
+rows are waiting, so concurrent requests no longer queue up behind SQLite's
+writer lock. When the queue is full, callers wait up to
+``LOG_WRITER_ENQUEUE_TIMEOUT_MS`` before the row is dropped and counted.
+"""
+
+import atexit
+import os
+import queue
+from datetime import datetime
+from threading import Event, Lock, Thread
+from time import monotonic
+from typing import Callable, Dict, List, Optional
+
+from flask import Flask, has_app_context
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from models import ActivityLog, db
+
+
+LOG_COLUMNS = (
+    "user_id",
+    "action",
+    "ip_address",
+    "created_at",
+    "status",
+    "details",
+    "resource_type",
+    "resource_id",
+    "duration_ms",
+)
+
+FlushHook = Callable[[List[Dict]], None]
+
+
+class ActivityLogWriter:
+    """Bounded queue plus flusher thread that bulk-inserts activity logs."""
+
+    def __init__(self) -> None:
+        self.async_enabled = True
+        self.batch_size = 200
+        self.flush_interval = 0.5
+        self.enqueue_timeout = 0.05
+        self.queue_size = 10000
+
+        self._app: Optional[Flask] = None
+        self._queue: queue.Queue = queue.Queue(self.queue_size)
+        self._thread: Optional[Thread] = None
+        self._stop = Event()
+        self._start_lock = Lock()
+        self._write_lock = Lock()
+        self._pid: Optional[int] = None
+        self._hooks: List[FlushHook] = []
+        self._atexit_registered = False
+
+        self.enqueued = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+
+    def init_app(self, app: Flask) -> None:
+        """Configure the writer and arrange for a final flush at exit."""
+        self.shutdown()
+        self._app = app
+        self.async_enabled = app.config.get("LOG_WRITER_ASYNC", True)
+        self.batch_size = max(1, app.config.get("LOG_WRITER_BATCH_SIZE", 200))
+        self.flush_interval = app.config.get("LOG_WRITER_FLUSH_INTERVAL_MS", 500) / 1000
+        self.enqueue_timeout = app.config.get("LOG_WRITER_ENQUEUE_TIMEOUT_MS", 50) / 1000
+        self.queue_size = app.config.get("LOG_WRITER_QUEUE_SIZE", 10000)
+        self._queue = queue.Queue(self.queue_size)
+        app.extensions["activity_log_writer"] = self
+
+        if not self._atexit_registered:
+            atexit.register(self.shutdown)
+            self._atexit_registered = True
+
+    def add_flush_hook(self, hook: FlushHook) -> None:
+        """Call ``hook(rows)`` inside an app context after each committed batch."""
+        if hook not in self._hooks:
+            self._hooks.append(hook)
+
+    def submit(self, **fields) -> bool:
+        """Queue one activity log row; return False if it was dropped."""
+        row = {column: fields.get(column) for column in LOG_COLUMNS}
+        row["created_at"] = row["created_at"] or datetime.utcnow()
+        row["status"] = row["status"] or "success"
+
+        if row["user_id"] is None and not ActivityLog.__table__.c.user_id.nullable:
+            # The schema cannot store anonymous rows; don't let one poison a batch
+            self.rejected += 1
+            return False
+
+        if not self.async_enabled:
+            self._write([row])
+            return True
+
+        self._ensure_started()
+        try:
+            self._queue.put(row, timeout=self.enqueue_timeout)
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+        self.enqueued += 1
+        return True
+
+    def flush(self) -> int:
+        """Synchronously write everything queued, including an in-flight batch."""
+        flushed = 0
+        while True:
+            batch = self._drain(self.batch_size)
+            if not batch:
+                break
+            self._write(batch)
+            flushed += len(batch)
+
+        thread = self._thread
+        if thread is not None and thread.is_alive() and self._pid == os.getpid():
+            # Wait for the batch the flusher thread may be holding
+            self._queue.join()
+        return flushed
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        """Stop the flusher thread and write any rows still queued."""
+        thread = self._thread
+        if thread is not None and self._pid == os.getpid():
+            self._stop.set()
+            thread.join(timeout)
+        self._thread = None
+        if self._app is not None:
+            self.flush()
+
+    def stats(self) -> Dict[str, int]:
+        """Counters describing the writer's health."""
+        return {
+            "queue_depth": self._queue.qsize(),
+            "queue_capacity": self.queue_size,
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "rejected": self.rejected,
+            "written": self.written,
+            "failed": self.failed,
+            "batches": self.batches,
+        }
+
+    def _ensure_started(self) -> None:
+        pid = os.getpid()
+        if self._thread is not None and self._pid == pid:
+            return
+        with self._start_lock:
+            if self._thread is not None and self._pid == pid:
+                return
+            if self._pid is not None and self._pid != pid:
+                # Forked worker: the parent's queue and thread are not ours
+                self._queue = queue.Queue(self.queue_size)
+            self._pid = pid
+            self._stop = Event()
+            self._thread = Thread(target=self._run, name="activity-log-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+
+            batch = [first]
+            deadline = monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self._write(batch)
+
+    def _drain(self, limit: int) -> List[Dict]:
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, rows: List[Dict]) -> None:
+        try:
+            with self._write_lock:
+                if has_app_context():
+                    self._insert(rows)
+                elif self._app is not None:
+                    with self._app.app_context():
+                        self._insert(rows)
+        finally:
+            if self.async_enabled:
+                for _ in rows:
+                    self._queue.task_done()
+
+    def _insert(self, rows: List[Dict]) -> None:
+        table = ActivityLog.__table__
+        # A session of its own: inline writes run inside a request, whose
+        # pending changes must not be committed or rolled back with the logs
+        with Session(db.engine) as session:
+            try:
+                session.execute(insert(table), rows)
+                session.commit()
+                written = rows
+            except Exception as e:
+                print(f"Activity log batch insert failed, retrying row by row: {e}")
+                session.rollback()
+                written = []
+                for row in rows:
+                    try:
+                        session.execute(insert(table), [row])
+                        session.commit()
+                        written.append(row)
+                    except Exception as row_error:
+                        session.rollback()
+                        self.failed += 1
+                        print(f"Failed to write activity log '{row.get('action')}': {row_error}")
+
+        self.written += len(written)
+        self.batches += 1
+
+        for hook in self._hooks:
+            try:
+                hook(written)
+            except Exception as e:
+                print(f"Activity log flush hook {getattr(hook, '__name__', hook)} failed: {e}")
+
+
+# Singleton writer shared by the logging decorator and request hooks
+log_writer = ActivityLogWriter()
+
+
+def record_activity(**fields) -> bool:
+    """Queue an ActivityLog row for the background writer."""
+    return log_writer.submit(**fields)
@@ -0,0 +1,505 @@
+# services/metrics.py - In-process metrics with Prometheus text exposition
+"""Counters, gauges and histograms served by ``/metrics``.
+
+Request hooks in ``app.py`` record latency per blueprint/endpoint and the
+number of SQL statements and DB time each request used; the statement counts
+come from SQLAlchemy ``before/after_cursor_execute`` events. Queue depth,
+writer counters and cache hit ratios are read from the services at scrape
+time.
+
+With several gunicorn workers each process only sees its own requests. Set
+``METRICS_MULTIPROC_DIR`` to a directory shared by the workers: every worker
+then writes a JSON snapshot of its metrics there at most every
+``METRICS_SNAPSHOT_INTERVAL_SECONDS``, and a scrape merges the snapshots of
+the workers that are still running. Counters and histograms are summed
+across them and gauges get a ``pid`` label. When a worker exits it folds its
+final counters and histograms into ``metrics_archive.json``, and a scrape
+does the same for a snapshot left by a worker that died; the archive is
+added into every scrape, so totals never go down when workers are recycled.
+Only the gauges of gone workers are dropped.
+"""
+
+import atexit
+import glob
+import json
+import os
+import tempfile
+from threading import Lock
+from time import monotonic, perf_counter
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from flask import Flask, g, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .file_lock import file_lock
+
+
+ARCHIVE_FILE = "metrics_archive.json"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+
+Labels = Tuple[str, ...]
+Sample = Tuple[Dict[str, str], float]
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Labels, object] = {}
+        self._lock = Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Labels:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            samples = [[list(key), value] for key, value in self._values.items()]
+        return {"type": self.type, "help": self.help, "labelnames": list(self.labelnames), "samples": samples}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    """Monotonically increasing value per label set."""
+
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, help, labelnames)
+        self.reset()
+
+    def reset(self) -> None:
+        super().reset()
+        if not self.labelnames:
+            self._values[()] = 0.0  # Expose unlabelled counters before the first increment
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    """Value that can go up and down."""
+
+    type = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    """Bucketed observations with a running sum and count."""
+
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # Per-bucket counts (not cumulative), then the +Inf count, sum, count
+                entry = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    break
+            else:
+                index = len(self.buckets)
+            entry[index] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def snapshot(self) -> Dict:
+        data = super().snapshot()
+        data["buckets"] = list(self.buckets)
+        return data
+
+
+class _CallbackMetric:
+    """Metric whose samples are read from ``collect()`` at scrape time."""
+
+    def __init__(self, name: str, help: str, type: str, collect: Callable[[], Iterable[Sample]]) -> None:
+        self.name = name
+        self.help = help
+        self.type = type
+        self.collect = collect
+
+    def snapshot(self) -> Dict:
+        try:
+            samples = list(self.collect())
+        except Exception as e:
+            print(f"Metrics callback {self.name} failed: {e}")
+            samples = []
+        labelnames = sorted({name for labels, _ in samples for name in labels})
+        return {
+            "type": self.type,
+            "help": self.help,
+            "labelnames": labelnames,
+            "samples": [[[str(labels.get(name, "")) for name in labelnames], value] for labels, value in samples],
+        }
+
+
+class MetricsRegistry:
+    """Holds every metric and renders them in the Prometheus text format."""
+
+    def __init__(self) -> None:
+        self.enabled = True
+        self.multiproc_dir: Optional[str] = None
+        self.snapshot_interval = 5.0
+        self._metrics: Dict[str, object] = {}
+        self._snapshot_at = 0.0
+        self._atexit_registered = False
+
+    def init_app(self, app: Flask) -> None:
+        """Read settings and prepare the multiprocess snapshot directory."""
+        self.enabled = app.config.get("METRICS_ENABLED", True)
+        self.multiproc_dir = app.config.get("METRICS_MULTIPROC_DIR") or None
+        self.snapshot_interval = app.config.get("METRICS_SNAPSHOT_INTERVAL_SECONDS", 5)
+        if self.multiproc_dir:
+            os.makedirs(self.multiproc_dir, exist_ok=True)
+            if not self._atexit_registered:
+                atexit.register(self.retire)
+                self._atexit_registered = True
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def callback(self, name: str, help: str, type: str,
+                 collect: Callable[[], Iterable[Sample]]) -> None:
+        """Register a counter or gauge whose samples come from ``collect()``."""
+        self._register(_CallbackMetric(name, help, type, collect))
+
+    def reset(self) -> None:
+        """Zero every stored value (callbacks are unaffected)."""
+        for metric in self._metrics.values():
+            if isinstance(metric, _Metric):
+                metric.reset()
+
+    def snapshot(self) -> Dict:
+        """This process's metrics as plain data."""
+        return {name: metric.snapshot() for name, metric in self._metrics.items()}
+
+    def maybe_write_snapshot(self) -> None:
+        """Write this worker's snapshot if the last one is older than the interval."""
+        if self.multiproc_dir and monotonic() - self._snapshot_at >= self.snapshot_interval:
+            self.write_snapshot()
+
+    def write_snapshot(self) -> None:
+        """Atomically replace this worker's snapshot file."""
+        if not self.multiproc_dir:
+            return
+        self._snapshot_at = monotonic()
+        path = self._snapshot_path(os.getpid())
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.multiproc_dir, prefix=".metrics_", suffix=".tmp")
+            with os.fdopen(fd, "w") as handle:
+                json.dump({"pid": os.getpid(), "metrics": self.snapshot()}, handle)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Failed to write metrics snapshot {path}: {e}")
+
+    def retire(self) -> None:
+        """Fold this worker's counters into the archive and drop its snapshot (at exit)."""
+        if not self.multiproc_dir:
+            return
+        try:
+            with file_lock(self._archive_lock_path()):
+                self._archive({"pid": os.getpid(), "metrics": self.snapshot()})
+                _unlink(self._snapshot_path(os.getpid()))
+        except OSError as e:
+            print(f"Failed to archive metrics of worker {os.getpid()}: {e}")
+
+    def render(self) -> str:
+        """Prometheus text exposition of this worker or of all workers."""
+        if not self.multiproc_dir:
+            return _render(self.snapshot())
+
+        self.write_snapshot()
+        snapshots = []
+        dead = []
+        for path in sorted(glob.glob(os.path.join(self.multiproc_dir, "metrics_*.json"))):
+            if os.path.basename(path) == ARCHIVE_FILE:
+                continue
+            snapshot = _load(path)
+            if snapshot is None:
+                continue  # Being replaced or truncated; the next scrape will see it
+            if snapshot["pid"] != os.getpid() and not _pid_alive(snapshot["pid"]):
+                dead.append(path)  # Left by a worker that died without retiring
+                continue
+            snapshots.append(snapshot)
+
+        with file_lock(self._archive_lock_path()):
+            for path in dead:
+                snapshot = _load(path)  # Another scrape may have archived it meanwhile
+                if snapshot is not None:
+                    self._archive(snapshot)
+                    _unlink(path)
+            archive = _load(self._archive_path())
+        if archive is not None:
+            snapshots.append(archive)
+        return _render(_merge(snapshots))
+
+    def _archive(self, snapshot: Dict) -> None:
+        """Add a gone worker's counters and histograms to the archive; call with the lock held."""
+        kept = {name: data for name, data in snapshot["metrics"].items() if data["type"] != "gauge"}
+        archive = _load(self._archive_path()) or {"pid": 0, "metrics": {}}
+        merged = _merge([archive, {"pid": snapshot["pid"], "metrics": kept}])
+        fd, tmp_path = tempfile.mkstemp(dir=self.multiproc_dir, prefix=".metrics_", suffix=".tmp")
+        with os.fdopen(fd, "w") as handle:
+            json.dump({"pid": 0, "metrics": merged}, handle)
+        os.replace(tmp_path, self._archive_path())
+
+    def _snapshot_path(self, pid: int) -> str:
+        return os.path.join(self.multiproc_dir, f"metrics_{pid}.json")
+
+    def _archive_path(self) -> str:
+        return os.path.join(self.multiproc_dir, ARCHIVE_FILE)
+
+    def _archive_lock_path(self) -> str:
+        return os.path.join(self.multiproc_dir, ".metrics_archive.lock")
+
+    def _register(self, metric):
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+
+def _load(path: str) -> Optional[Dict]:
+    try:
+        with open(path) as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return None
+
+
+def _unlink(path: str) -> None:
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _merge(snapshots: List[Dict]) -> Dict:
+    merged: Dict[str, Dict] = {}
+    for snapshot in snapshots:
+        pid = snapshot["pid"]
+        for name, data in snapshot["metrics"].items():
+            is_gauge = data["type"] == "gauge"
+            labelnames = data["labelnames"] + (["pid"] if is_gauge else [])
+            target = merged.setdefault(name, {**data, "labelnames": labelnames, "values": {}})
+            values = target["values"]
+
+            for labelvalues, value in data["samples"]:
+                key = tuple(labelvalues) + ((str(pid),) if is_gauge else ())
+                if data["type"] == "histogram":
+                    current = values.get(key)
+                    values[key] = value if current is None else [a + b for a, b in zip(current, value)]
+                elif is_gauge:
+                    values[key] = value
+                else:
+                    values[key] = values.get(key, 0.0) + value
+
+    for data in merged.values():
+        data["samples"] = [[list(key), value] for key, value in data.pop("values").items()]
+    return merged
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [(name, value) for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in pairs) + "}"
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _render(metrics: Dict[str, Dict]) -> str:
+    lines = []
+    for name in sorted(metrics):
+        data = metrics[name]
+        lines.append(f"# HELP {name} {data['help']}")
+        lines.append(f"# TYPE {name} {data['type']}")
+        names = data["labelnames"]
+
+        for labelvalues, value in sorted(data["samples"], key=lambda sample: sample[0]):
+            if data["type"] != "histogram":
+                lines.append(f"{name}{_labels(names, labelvalues)} {_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(list(data["buckets"]) + [float("inf")], value[:-2]):
+                cumulative += count
+                le = ("le", _number(bound))
+                lines.append(f"{name}_bucket{_labels(names, labelvalues, le)} {cumulative}")
+            lines.append(f"{name}_sum{_labels(names, labelvalues)} {_number(value[-2])}")
+            lines.append(f"{name}_count{_labels(names, labelvalues)} {value[-1]}")
+    return "\n".join(lines) + "\n"
+
+
+# Singleton registry and the metrics recorded by the request hooks
+metrics = MetricsRegistry()
+
+request_duration = metrics.histogram(
+    "http_request_duration_seconds", "Request latency by blueprint and endpoint.",
+    ("method", "blueprint", "endpoint", "status"),
+)
+db_queries = metrics.counter(
+    "db_queries_total", "SQL statements executed, by endpoint (background for non-request work).",
+    ("endpoint",),
+)
+db_query_seconds = metrics.counter(
+    "db_query_seconds_total", "Time spent executing SQL statements, by endpoint.", ("endpoint",),
+)
+db_queries_per_request = metrics.histogram(
+    "db_queries_per_request", "SQL statements executed per request.", ("endpoint",),
+    buckets=QUERY_COUNT_BUCKETS,
+)
+db_seconds_per_request = metrics.histogram(
+    "db_seconds_per_request", "Time spent in SQL per request.", ("endpoint",),
+)
+image_bytes_served = metrics.counter(
+    "image_bytes_served_total", "Bytes of campaign images sent to clients.",
+)
+
+
+def observe_request(method: str, blueprint: Optional[str], endpoint: Optional[str],
+                    status_code: int, duration_seconds: float) -> None:
+    """Record a finished request; called from the after_request hook."""
+    if not metrics.enabled:
+        return
+    endpoint = endpoint or "unmatched"
+    request_duration.observe(
+        duration_seconds,
+        method=method,
+        blueprint=blueprint or "app",
+        endpoint=endpoint,
+        status=f"{status_code // 100}xx",
+    )
+    queries, seconds = getattr(g, "db_stats", (0, 0.0))
+    db_queries_per_request.observe(queries, endpoint=endpoint)
+    db_seconds_per_request.observe(seconds, endpoint=endpoint)
+    metrics.maybe_write_snapshot()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        # Kept on the execution context so a failed statement leaves nothing behind
+        context._metrics_query_start = perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_metrics_query_start", None)
+    if start is None or not metrics.enabled:
+        return
+    elapsed = perf_counter() - start
+
+    endpoint = "background"
+    if has_request_context():
+        from flask import request
+        endpoint = request.endpoint or "unmatched"
+        queries, seconds = getattr(g, "db_stats", (0, 0.0))
+        g.db_stats = (queries + 1, seconds + elapsed)
+    db_queries.inc(endpoint=endpoint)
+    db_query_seconds.inc(elapsed, endpoint=endpoint)
+
+
+def _log_writer_samples():
+    from .log_writer import log_writer
+
+    stats = log_writer.stats()
+    yield {}, stats["queue_depth"]
+
+
+def _log_writer_rows():
+    from .log_writer import log_writer
+
+    stats = log_writer.stats()
+    for outcome in ("enqueued", "dropped", "rejected", "written", "failed"):
+        yield {"outcome": outcome}, stats[outcome]
+
+
+def _upload_job_samples():
+    from .upload_jobs import upload_jobs
+
+    stats = upload_jobs.stats()
+    for outcome in ("submitted", "succeeded", "failed"):
+        yield {"outcome": outcome}, stats[outcome]
+
+
+def _cache_lookups():
+    from .cache import named_caches
+
+    for cache in named_caches():
+        yield {"cache": cache.name, "result": "hit"}, cache.hits
+        yield {"cache": cache.name, "result": "miss"}, cache.misses
+
+
+def _cache_hit_ratio():
+    from .cache import named_caches
+
+    for cache in named_caches():
+        ratio = cache.stats()["hit_ratio"]
+        if ratio is not None:
+            yield {"cache": cache.name}, ratio
+
+
+def _cache_size():
+    from .cache import named_caches
+
+    for cache in named_caches():
+        yield {"cache": cache.name}, len(cache)
+
+
+metrics.callback("activity_log_queue_depth", "Activity log rows waiting for the writer.", "gauge",
+                 _log_writer_samples)
+metrics.callback("activity_log_rows_total", "Activity log rows by writer outcome.", "counter",
+                 _log_writer_rows)
+metrics.callback("upload_jobs_total", "Upload post-processing jobs by outcome.", "counter",
+                 _upload_job_samples)
+metrics.callback("cache_lookups_total", "Cache lookups by cache and result.", "counter", _cache_lookups)
+metrics.callback("cache_hit_ratio", "Cache hit ratio since start.", "gauge", _cache_hit_ratio)
+metrics.callback("cache_entries", "Entries currently held by each cache.", "gauge", _cache_size)
@@ -0,0 +1,150 @@
+# services/sql_profiler.py - Opt-in per-request SQL profiling
+"""Per-request SQL statement profiling and N+1 detection.
+
+Profiling is off by default. It is switched on for every request with
+``SQL_PROFILING_ENABLED`` or for a single request by sending the
+``SQL_PROFILING_HEADER`` header (``X-Profile-SQL: 1``) when
+``SQL_PROFILING_ALLOW_HEADER`` is set. The header is only honoured in debug
+mode or for an authenticated admin; for admins profiling starts once
+``jwt_required`` has loaded the user. A profiled request records every
+statement it executes through SQLAlchemy cursor events; the summary is sent
+back in ``X-SQL-*`` and ``Server-Timing`` response headers and added to the
+request's activity log details. Any statement executed at least
+``SQL_PROFILING_REPEAT_THRESHOLD`` times is reported as a likely N+1.
+"""
+
+from collections import Counter
+from time import perf_counter
+from typing import Dict, List, Optional
+
+from flask import Flask, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class SQLProfile:
+    """Statements executed while handling one request."""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total_ms = 0.0
+        self.statements: Counter = Counter()
+        self.statement_ms: Dict[str, float] = {}
+        self.slowest: List[tuple] = []  # (ms, statement), longest first
+
+    def record(self, statement: str, elapsed_ms: float, keep_slowest: int = 5) -> None:
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.statements[statement] += 1
+        self.statement_ms[statement] = self.statement_ms.get(statement, 0.0) + elapsed_ms
+        if len(self.slowest) < keep_slowest or elapsed_ms > self.slowest[-1][0]:
+            self.slowest.append((elapsed_ms, statement))
+            self.slowest.sort(key=lambda item: item[0], reverse=True)
+            del self.slowest[keep_slowest:]
+
+    def repeated(self, threshold: int) -> List[Dict]:
+        """Statements executed at least ``threshold`` times, most frequent first."""
+        return [
+            {
+                "count": count,
+                "total_ms": round(self.statement_ms[statement], 2),
+                "statement": _shorten(statement),
+            }
+            for statement, count in self.statements.most_common()
+            if count >= threshold
+        ]
+
+    def summary(self, threshold: int) -> Dict:
+        return {
+            "queries": self.count,
+            "db_ms": round(self.total_ms, 2),
+            "distinct": len(self.statements),
+            "repeated": self.repeated(threshold),
+            "slowest": [{"ms": round(ms, 2), "statement": _shorten(statement)} for ms, statement in self.slowest],
+        }
+
+
+def _shorten(statement: str, limit: int = 200) -> str:
+    statement = " ".join(statement.split())
+    return statement if len(statement) <= limit else statement[:limit - 3] + "..."
+
+
+class SQLProfiler:
+    """Starts, collects and reports ``SQLProfile`` objects for requests."""
+
+    def __init__(self) -> None:
+        self.always = False
+        self.allow_header = False
+        self.debug = False
+        self.header = "X-Profile-SQL"
+        self.repeat_threshold = 3
+
+    def init_app(self, app: Flask) -> None:
+        """Read the profiling settings."""
+        self.always = app.config.get("SQL_PROFILING_ENABLED", False)
+        self.allow_header = app.config.get("SQL_PROFILING_ALLOW_HEADER", False)
+        self.debug = app.debug
+        self.header = app.config.get("SQL_PROFILING_HEADER", "X-Profile-SQL")
+        self.repeat_threshold = max(2, app.config.get("SQL_PROFILING_REPEAT_THRESHOLD", 3))
+
+    def start(self) -> None:
+        """Begin profiling the current request if it is opted in."""
+        if self.always or (self.debug and self._requested()):
+            g.sql_profile = SQLProfile()
+
+    def start_for(self, user) -> None:
+        """Honour the profiling header once the request's user is known to be an admin."""
+        if self.current() is None and getattr(user, "is_admin", False) and self._requested():
+            g.sql_profile = SQLProfile()
+
+    def _requested(self) -> bool:
+        return self.allow_header and request.headers.get(self.header, "").lower() in ("1", "true", "yes")
+
+    def current(self) -> Optional[SQLProfile]:
+        return g.get("sql_profile") if has_request_context() else None
+
+    def summary(self) -> Optional[Dict]:
+        """The current request's profile, or None when it isn't profiled."""
+        profile = self.current()
+        return profile.summary(self.repeat_threshold) if profile else None
+
+    def finish(self, response):
+        """Attach the profile to the response headers and report likely N+1s."""
+        profile = self.current()
+        if profile is None:
+            return response
+
+        repeated = profile.repeated(self.repeat_threshold)
+        response.headers["X-SQL-Query-Count"] = str(profile.count)
+        response.headers["X-SQL-Time-Ms"] = f"{profile.total_ms:.2f}"
+        response.headers["X-SQL-Repeated-Statements"] = str(len(repeated))
+        response.headers.add(
+            "Server-Timing", f'db;dur={profile.total_ms:.2f};desc="{profile.count} queries"'
+        )
+
+        for entry in repeated:
+            print(
+                f"⚠️ Possible N+1 in {request.method} {request.endpoint}: "
+                f"{entry['count']}x ({entry['total_ms']} ms) {entry['statement']}"
+            )
+        return response
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and has_request_context() and g.get("sql_profile") is not None:
+        context._sql_profile_start = perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_sql_profile_start", None)
+    if start is None or not has_request_context():
+        return
+    profile = g.get("sql_profile")
+    if profile is not None:
+        profile.record(statement, (perf_counter() - start) * 1000)
+
+
+# Singleton profiler driven by the request hooks in app.py
+sql_profiler = SQLProfiler()
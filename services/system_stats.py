@@ -0,0 +1,63 @@
+# services/system_stats.py - Cached system counts for /api/health
+"""Periodically refreshed row counts reported by ``/api/health``.
+
+The health check used to run ``COUNT(*)`` over users, campaigns and the
+ever-growing activity log on every probe. The counts are now taken at most
+every ``HEALTH_STATS_TTL_SECONDS``; the activity log size comes from the
+primary key range rather than a scan. While one request refreshes the
+snapshot, concurrent requests keep getting the previous one.
+"""
+
+from datetime import datetime
+from threading import Lock
+from time import monotonic
+from typing import Dict, Optional
+
+from flask import Flask
+
+from models import ActivityLog, Campaign, User
+
+
+class SystemStatsSnapshot:
+    """Row counts cached for a fixed interval."""
+
+    def __init__(self, ttl_seconds: int = 60) -> None:
+        self.ttl_seconds = ttl_seconds
+        self._lock = Lock()
+        self._snapshot: Optional[Dict] = None
+        self._taken_at = 0.0
+
+    def init_app(self, app: Flask) -> None:
+        """Read settings and drop any previous snapshot."""
+        self.ttl_seconds = app.config.get("HEALTH_STATS_TTL_SECONDS", self.ttl_seconds)
+        self.invalidate()
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._snapshot = None
+
+    def get(self) -> Dict:
+        """Return the current snapshot, refreshing it when it is stale."""
+        snapshot = self._snapshot
+        if snapshot is not None and monotonic() - self._taken_at < self.ttl_seconds:
+            return snapshot
+
+        if not self._lock.acquire(blocking=snapshot is None):
+            return snapshot  # Another request is refreshing; serve the previous counts
+        try:
+            if self._snapshot is None or monotonic() - self._taken_at >= self.ttl_seconds:
+                self._snapshot = {
+                    "users": User.query.count(),
+                    "campaigns": Campaign.query.count(),
+                    "activity_logs": ActivityLog.estimate_total(),
+                    "activity_logs_is_estimate": True,
+                    "as_of": datetime.utcnow().isoformat(),
+                }
+                self._taken_at = monotonic()
+            return self._snapshot
+        finally:
+            self._lock.release()
+
+
+# Singleton snapshot served by the health check
+system_stats = SystemStatsSnapshot()
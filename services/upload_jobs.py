@@ -0,0 +1,249 @@
+# services/upload_jobs.py - Background post-processing of uploaded images
+"""Worker pool for upload post-processing.
+
+Upload requests store the raw bytes, commit the image rows and queue one
+``UploadJob`` per file; the request returns as soon as that is done. Jobs
+hash the file (priming the ETag cache) and pregenerate its derivatives on a
+pool of ``UPLOAD_JOB_WORKERS`` threads. Pillow releases the GIL while it
+decodes, resizes and encodes, so threads already use several cores; with
+``UPLOAD_JOB_EXECUTOR=process`` the image work itself runs in a process
+pool instead. Clients poll ``/api/uploads/jobs/<id>`` for the outcome.
+
+Jobs are claimed with a conditional ``UPDATE``, so a job is only run once
+even when several app processes resume the same backlog. Jobs still queued
+when a process exits (a restart, a ``--reload``) are picked up again by
+``resume_unfinished()``, which each process runs on its first request
+through ``resume_once()``; ``scripts/resume_upload_jobs.py`` does the same
+without serving.
+"""
+
+import atexit
+import json
+import os
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from threading import Lock
+from typing import Callable, Dict, List, Optional
+
+from flask import Flask
+from PIL import Image
+from sqlalchemy import or_, update
+
+from models import JobStatus, UploadJob, db
+
+from .image_derivatives import ImageDerivatives, image_derivatives
+from .image_etags import file_digest, image_etags
+
+
+def process_image(pipeline: ImageDerivatives, path: str) -> Dict:
+    """Validate and hash an uploaded image, then create its derivatives.
+
+    Module level and free of app state so it can run in a worker process.
+    """
+    with Image.open(path) as image:
+        width, height = image.size
+        image.verify()  # Raises for truncated or corrupt files
+    digest = file_digest(path)
+    image_etags.prime(path, digest)
+    variants = pipeline.pregenerate(path) if pipeline.pregenerate_on_upload else []
+    return {"digest": digest, "width": width, "height": height, "variants": variants}
+
+
+# Job kind -> function(pipeline, file_path) returning a JSON-serializable result
+JOB_HANDLERS: Dict[str, Callable[[ImageDerivatives, str], Dict]] = {
+    "process_image": process_image,
+}
+
+
+class UploadJobRunner:
+    """Persists upload jobs and runs them on a worker pool."""
+
+    def __init__(self) -> None:
+        self.async_enabled = True
+        self.executor = "thread"
+        self.workers = os.cpu_count() or 2
+        self.stale_seconds = 600
+
+        self._app: Optional[Flask] = None
+        self._threads: Optional[ThreadPoolExecutor] = None
+        self._processes: Optional[ProcessPoolExecutor] = None
+        self._pid: Optional[int] = None
+        self._start_lock = Lock()
+        self._stats_lock = Lock()
+        self._resumed_pid: Optional[int] = None
+        self._atexit_registered = False
+
+        self.submitted = 0
+        self.succeeded = 0
+        self.failed = 0
+
+    def init_app(self, app: Flask) -> None:
+        """Read the pool settings and arrange for a clean shutdown at exit."""
+        self.shutdown()
+        self._app = app
+        self.async_enabled = app.config.get("UPLOAD_JOBS_ASYNC", True)
+        self.executor = app.config.get("UPLOAD_JOB_EXECUTOR", "thread").lower()
+        self.workers = max(1, app.config.get("UPLOAD_JOB_WORKERS") or os.cpu_count() or 2)
+        self.stale_seconds = app.config.get("UPLOAD_JOB_STALE_SECONDS", 600)
+        self._resumed_pid = None  # This app's backlog hasn't been looked at yet
+
+        if not self._atexit_registered:
+            atexit.register(self.shutdown)
+            self._atexit_registered = True
+
+    def submit(self, paths: List[str], campaign_id: Optional[int] = None,
+               user_id: Optional[int] = None, kind: str = "process_image") -> List[UploadJob]:
+        """Persist one job per file and start them; returns the committed jobs."""
+        if kind not in JOB_HANDLERS:
+            raise ValueError(f"Unknown upload job kind: {kind}")
+
+        jobs = [
+            UploadJob(kind=kind, file_path=str(path), campaign_id=campaign_id, user_id=user_id)
+            for path in paths
+        ]
+        if not jobs:
+            return jobs
+        db.session.add_all(jobs)
+        db.session.commit()
+
+        for job in jobs:
+            self.dispatch(job.id)
+        return jobs
+
+    def dispatch(self, job_id: int) -> Optional[Future]:
+        """Run a persisted job on the pool (or inline when async is disabled)."""
+        self._count("submitted")
+        if not self.async_enabled:
+            self._execute(job_id)
+            return None
+        return self._ensure_started().submit(self._run, job_id)
+
+    def resume_unfinished(self, wait: bool = False) -> int:
+        """Re-dispatch queued jobs and jobs whose worker died mid-run."""
+        stale_before = datetime.utcnow() - timedelta(seconds=self.stale_seconds)
+        job_ids = [
+            job_id for (job_id,) in db.session.query(UploadJob.id).filter(or_(
+                UploadJob.status == JobStatus.QUEUED.value,
+                (UploadJob.status == JobStatus.RUNNING.value) & (UploadJob.started_at < stale_before),
+            )).order_by(UploadJob.id)
+        ]
+        if job_ids:
+            # Return stale running jobs to the queue so they can be claimed again
+            db.session.execute(
+                update(UploadJob)
+                .where(UploadJob.id.in_(job_ids), UploadJob.status == JobStatus.RUNNING.value)
+                .values(status=JobStatus.QUEUED.value)
+            )
+            db.session.commit()
+
+        futures = [self.dispatch(job_id) for job_id in job_ids]
+        if wait:
+            for future in futures:
+                if future is not None:
+                    future.result()
+        return len(job_ids)
+
+    def resume_once(self) -> None:
+        """Resume unfinished jobs the first time this process serves a request.
+
+        Only with the pool: inline mode would run the backlog inside that
+        request. Safe in every worker, since jobs are claimed atomically.
+        """
+        pid = os.getpid()
+        if self._resumed_pid == pid or not self.async_enabled:
+            return
+        with self._start_lock:
+            if self._resumed_pid == pid:
+                return
+            self._resumed_pid = pid
+        try:
+            resumed = self.resume_unfinished()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Failed to resume unfinished upload jobs: {e}")
+            return
+        if resumed:
+            print(f"🔁 Resumed {resumed} unfinished upload jobs")
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop the pools; jobs not yet started stay queued in the database."""
+        if self._pid == os.getpid():
+            if self._threads is not None:
+                self._threads.shutdown(wait=wait, cancel_futures=True)
+            if self._processes is not None:
+                self._processes.shutdown(wait=wait, cancel_futures=True)
+        self._threads = None
+        self._processes = None
+        self._pid = None
+
+    def stats(self) -> Dict[str, int]:
+        """Counters describing this process's job throughput."""
+        with self._stats_lock:
+            return {
+                "workers": self.workers,
+                "submitted": self.submitted,
+                "succeeded": self.succeeded,
+                "failed": self.failed,
+            }
+
+    def _count(self, outcome: str) -> None:
+        # Incremented from pool threads and read by the metrics scrape
+        with self._stats_lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def _ensure_started(self) -> ThreadPoolExecutor:
+        pid = os.getpid()
+        if self._threads is not None and self._pid == pid:
+            return self._threads
+        with self._start_lock:
+            if self._threads is None or self._pid != pid:
+                # A forked worker can't use the parent's pools
+                self._threads = ThreadPoolExecutor(self.workers, thread_name_prefix="upload-job")
+                self._processes = ProcessPoolExecutor(self.workers) if self.executor == "process" else None
+                self._pid = pid
+            return self._threads
+
+    def _run(self, job_id: int) -> None:
+        with self._app.app_context():
+            try:
+                self._execute(job_id)
+            finally:
+                db.session.remove()
+
+    def _execute(self, job_id: int) -> None:
+        claimed = db.session.execute(
+            update(UploadJob)
+            .where(UploadJob.id == job_id, UploadJob.status == JobStatus.QUEUED.value)
+            .values(
+                status=JobStatus.RUNNING.value,
+                started_at=datetime.utcnow(),
+                attempts=UploadJob.attempts + 1,
+            )
+        ).rowcount
+        db.session.commit()
+        if not claimed:
+            return  # Already taken by another worker or process
+
+        job = db.session.get(UploadJob, job_id)
+        handler = JOB_HANDLERS[job.kind]
+        try:
+            if self._processes is not None and self._pid == os.getpid():
+                result = self._processes.submit(handler, image_derivatives, job.file_path).result()
+                image_etags.prime(job.file_path, result["digest"])
+            else:
+                result = handler(image_derivatives, job.file_path)
+            job.status = JobStatus.SUCCEEDED.value
+            job.result = json.dumps(result)
+            job.error = None
+            self._count("succeeded")
+        except Exception as e:
+            job.status = JobStatus.FAILED.value
+            job.error = str(e)
+            self._count("failed")
+            print(f"Upload job {job_id} ({job.kind}) failed for {job.file_path}: {e}")
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+
+
+# Singleton runner used by the upload endpoints
+upload_jobs = UploadJobRunner()
@@ -0,0 +1,192 @@
+# services/upload_sessions.py - Resumable chunked uploads
+"""Resumable upload sessions for large campaign images.
+
+A client opens a session with the file's size (and optionally its SHA-256),
+then PUTs chunks at byte offsets, each with an ``X-Chunk-SHA256`` header.
+Chunks are streamed straight into a part file at their offset under the blob
+store's ``incoming`` folder; a chunk whose checksum doesn't match doesn't
+advance the session, so the client simply sends it again. After a dropped
+connection the client asks for ``received_bytes`` and resumes from there.
+Completing the session hashes the part file once and renames it into the
+blob store, so the assembled file is never copied. The digest is committed
+on the session before the rename, so a completion whose publish fails can be
+retried from the stored blob; the session is marked completed in the same
+commit as its image row.
+
+Sessions untouched for ``UPLOAD_SESSION_TTL_HOURS`` are removed by
+``prune_expired()`` (see ``scripts/prune_upload_sessions.py``).
+"""
+
+import hashlib
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import BinaryIO, Optional
+
+from flask import Flask
+from sqlalchemy import update
+
+from models import UploadSession, UploadSessionStatus, db
+
+from .asset_store import asset_store
+from .image_etags import HASH_CHUNK_BYTES
+
+
+class UploadSessionError(ValueError):
+    """A request the session can't accept, with the HTTP status to answer."""
+
+    def __init__(self, message: str, status_code: int = 400, **details) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+        self.details = details
+
+
+class UploadSessionStore:
+    """Creates sessions, writes chunks and assembles the finished file."""
+
+    def __init__(self) -> None:
+        self.ttl = timedelta(hours=24)
+        self.max_chunk_bytes = 8 * 1024 * 1024
+
+    def init_app(self, app: Flask) -> None:
+        """Read the session settings."""
+        self.ttl = timedelta(hours=app.config.get("UPLOAD_SESSION_TTL_HOURS", 24))
+        self.max_chunk_bytes = app.config.get("UPLOAD_CHUNK_MAX_BYTES", self.max_chunk_bytes)
+
+    def part_path(self, session: UploadSession) -> str:
+        return asset_store.incoming_path(f"{session.id}.part")
+
+    def create(self, campaign_id: int, user_id: int, image_type: str, total_size: int,
+               filename: Optional[str] = None, sha256: Optional[str] = None) -> UploadSession:
+        """Open a session and its empty part file."""
+        session = UploadSession(
+            id=uuid.uuid4().hex,
+            campaign_id=campaign_id,
+            user_id=user_id,
+            image_type=image_type,
+            filename=filename,
+            total_size=total_size,
+            sha256=sha256.lower() if sha256 else None,
+            expires_at=datetime.utcnow() + self.ttl,
+        )
+        open(self.part_path(session), "wb").close()
+        db.session.add(session)
+        db.session.commit()
+        return session
+
+    def write_chunk(self, session: UploadSession, offset: int, stream: BinaryIO,
+                    length: Optional[int], checksum: str,
+                    inspect=None) -> UploadSession:
+        """Write one chunk at ``offset`` and advance ``received_bytes`` if it verifies.
+
+        Offsets past ``received_bytes`` would leave a hole and are refused;
+        earlier offsets overwrite data already received (a retried chunk).
+        """
+        if session.status != UploadSessionStatus.OPEN.value:
+            raise UploadSessionError(f"Upload session is {session.status}", 409)
+        if session.content_hash:
+            raise UploadSessionError("Upload is already assembled; complete it again", 409)
+        if offset < 0 or offset > session.received_bytes:
+            raise UploadSessionError(
+                "Chunk offset must not be past the bytes already received", 409,
+                received_bytes=session.received_bytes,
+            )
+        if length is None:
+            raise UploadSessionError("Content-Length is required", 411)
+        if length > self.max_chunk_bytes:
+            raise UploadSessionError(f"Chunks are limited to {self.max_chunk_bytes} bytes", 413)
+        if offset + length > session.total_size:
+            raise UploadSessionError("Chunk extends past the declared file size", 416)
+
+        digest = hashlib.sha256()
+        written = 0
+        with open(self.part_path(session), "r+b") as handle:
+            handle.seek(offset)
+            for chunk in iter(lambda: stream.read(min(HASH_CHUNK_BYTES, length - written)), b""):
+                if offset == 0 and written == 0 and inspect is not None:
+                    inspect(chunk)
+                digest.update(chunk)
+                handle.write(chunk)
+                written += len(chunk)
+            handle.flush()
+            os.fsync(handle.fileno())
+
+        if written != length:
+            raise UploadSessionError("Chunk body ended early", 400, received_bytes=session.received_bytes)
+        if digest.hexdigest() != checksum.lower():
+            # The bytes stay in the part file but are not counted; a retry overwrites them
+            raise UploadSessionError("Chunk checksum mismatch", 422, received_bytes=session.received_bytes)
+
+        end = offset + written
+        db.session.execute(
+            update(UploadSession)
+            .where(UploadSession.id == session.id, UploadSession.received_bytes < end)
+            .values(received_bytes=end, expires_at=datetime.utcnow() + self.ttl)
+        )
+        db.session.commit()
+        db.session.refresh(session)
+        return session
+
+    def complete(self, session: UploadSession) -> str:
+        """Verify the assembled file and move it into the blob store; returns its digest.
+
+        The session is marked completed but not committed: the caller commits
+        it with the image row that uses the blob.
+        """
+        if session.status != UploadSessionStatus.OPEN.value:
+            raise UploadSessionError(f"Upload session is {session.status}", 409)
+        if session.received_bytes != session.total_size:
+            raise UploadSessionError(
+                "Upload is incomplete", 409, received_bytes=session.received_bytes,
+            )
+
+        path = self.part_path(session)
+        if session.content_hash and not os.path.exists(path):
+            # An earlier completion stored the blob but failed to publish it
+            if not os.path.exists(asset_store.blob_path(session.content_hash)):
+                raise UploadSessionError("Assembled file is gone; start a new upload", 410)
+            content_hash = session.content_hash
+        else:
+            digest = hashlib.sha256()
+            with open(path, "rb") as handle:
+                for chunk in iter(lambda: handle.read(HASH_CHUNK_BYTES), b""):
+                    digest.update(chunk)
+            content_hash = digest.hexdigest()
+            if session.sha256 and session.sha256 != content_hash:
+                raise UploadSessionError("File checksum mismatch", 422, content_hash=content_hash)
+
+            session.content_hash = content_hash
+            db.session.commit()  # Lets a retry find the blob once the part file is gone
+            asset_store.commit_file(path, content_hash)
+
+        session.status = UploadSessionStatus.COMPLETED.value
+        return content_hash
+
+    def abort(self, session: UploadSession) -> None:
+        """Discard a session and its part file."""
+        self._remove_part(session)
+        if session.status == UploadSessionStatus.OPEN.value:
+            session.status = UploadSessionStatus.ABORTED.value
+        db.session.commit()
+
+    def prune_expired(self, now: Optional[datetime] = None) -> int:
+        """Abort open sessions past their expiry; returns how many were removed."""
+        now = now or datetime.utcnow()
+        expired = UploadSession.query.filter(
+            UploadSession.status == UploadSessionStatus.OPEN.value,
+            UploadSession.expires_at < now,
+        ).all()
+        for session in expired:
+            self._remove_part(session)
+            session.status = UploadSessionStatus.ABORTED.value
+        db.session.commit()
+        return len(expired)
+
+    def _remove_part(self, session: UploadSession) -> None:
+        path = self.part_path(session)
+        if os.path.exists(path):
+            os.unlink(path)
+
+
+# Singleton session store used by the chunked upload endpoints
+upload_sessions = UploadSessionStore()
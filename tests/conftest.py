@@ -0,0 +1,75 @@
+# tests/conftest.py - Shared fixtures: an app on a temporary database and folders
+import io
+import os
+import sys
+
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import create_app
+from config import Config
+from models import User, db
+
+
+@pytest.fixture
+def app(tmp_path):
+    class TestConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'test.db'}"
+        UPLOAD_FOLDER = str(tmp_path / "assets")
+        ASSET_BLOB_FOLDER = str(tmp_path / "asset_blobs")
+        IMAGE_CACHE_FOLDER = str(tmp_path / "image_cache")
+        CAMPAIGN_MANIFEST_PATH = str(tmp_path / "campaign_manifest.json")
+        LOG_WRITER_ASYNC = False
+        UPLOAD_JOBS_ASYNC = False
+        IMAGE_PREGENERATE_ON_UPLOAD = False
+        METRICS_MULTIPROC_DIR = None
+
+    os.makedirs(TestConfig.UPLOAD_FOLDER, exist_ok=True)
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+        admin = User(email="admin@example.com", is_admin=True)
+        admin.set_password("password")
+        user = User(email="user@example.com", is_admin=False)
+        user.set_password("password")
+        db.session.add_all([admin, user])
+        db.session.commit()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def _headers(app, email):
+    from auth.jwt_handler import create_token
+    with app.app_context():
+        user = User.query.filter_by(email=email).first()
+        return {"Authorization": f"Bearer {create_token(user.id)}"}
+
+
+@pytest.fixture
+def admin_headers(app):
+    return _headers(app, "admin@example.com")
+
+
+@pytest.fixture
+def user_headers(app):
+    return _headers(app, "user@example.com")
+
+
+@pytest.fixture
+def make_png():
+    """Factory for small valid PNG images."""
+    def make(color="red", size=(40, 30)) -> bytes:
+        buffer = io.BytesIO()
+        Image.new("RGB", size, color).save(buffer, "PNG")
+        return buffer.getvalue()
+    return make
@@ -1 +1,34 @@
- 
+# tests/test_auth.py - Token revocation behaviour
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from auth.revocation import RevocationList
+from models import JWTBlacklist, db
+
+
+def test_sync_picks_up_revocations_that_commit_late(app):
+    revocations = RevocationList(refresh_seconds=0)
+    with app.app_context():
+        db.session.add(JWTBlacklist(jti="first", revoked_at=datetime.utcnow()))
+        db.session.commit()
+        assert revocations.is_revoked("first")
+
+        # Another worker stamped its row earlier but committed after our sync
+        db.session.add(JWTBlacklist(jti="late", revoked_at=datetime.utcnow() - timedelta(minutes=5)))
+        db.session.commit()
+        assert revocations.is_revoked("late")
+
+
+def test_revocation_works_before_expires_at_column_is_added(app):
+    with app.app_context():
+        db.session.execute(text("DROP INDEX ix_jwt_blacklist_expires_at"))
+        db.session.execute(text("ALTER TABLE jwt_blacklist DROP COLUMN expires_at"))
+        db.session.commit()
+
+    revocations = RevocationList(refresh_seconds=0)
+    with app.app_context():
+        assert not revocations.is_revoked("missing")
+        revocations.revoke("old-schema", datetime.utcnow() + timedelta(hours=1))
+        assert RevocationList(refresh_seconds=0).is_revoked("old-schema")
+        assert revocations.prune_expired() == 0
@@ -1 +1,33 @@
- 
+# tests/test_campaigns.py - Campaign endpoint behaviour
+from datetime import date, timedelta
+
+from models import Campaign, CampaignStatus, db
+from services import campaign_index
+
+
+def _dates(start_offset, end_offset):
+    today = date.today()
+    return (today + timedelta(days=start_offset)).isoformat(), (today + timedelta(days=end_offset)).isoformat()
+
+
+def test_conflict_check_sees_campaigns_written_by_other_workers(app, client, admin_headers):
+    start, end = _dates(-1, 5)
+    with app.app_context():
+        assert campaign_index.conflicts(date.fromisoformat(start), date.fromisoformat(end)) == []
+        # Another worker commits an active campaign; this process's index doesn't know
+        db.session.add(Campaign(
+            name="other worker",
+            start_date=date.fromisoformat(start),
+            end_date=date.fromisoformat(end),
+            status=CampaignStatus.ACTIVE.value,
+            folder_path="unused",
+            user_id=1,
+        ))
+        db.session.commit()
+
+    response = client.post(
+        "/api/campaigns/", json={"name": "overlap", "start_date": start, "end_date": end},
+        headers=admin_headers,
+    )
+    assert response.status_code == 409
+    assert response.get_json()["conflicts"][0]["name"] == "other worker"
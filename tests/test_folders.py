@@ -0,0 +1,171 @@
+# tests/test_folders.py - Date folder publishing, rollback and blob garbage collection
+import io
+import os
+import threading
+import time
+
+import pytest
+
+from models import db
+from services import asset_store, folder_publisher
+
+DATE = "2040-03-01"
+
+
+def _create(client, headers, name, start=DATE, end="2040-03-31", **images):
+    data = {"name": name, "start_date": start, "end_date": end}
+    for image_type, content in images.items():
+        data[image_type] = (io.BytesIO(content), f"{image_type}.png")
+    response = client.post("/api/campaigns/", data=data, headers=headers, content_type="multipart/form-data")
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()["id"]
+
+
+def _listing(name=DATE):
+    folder = folder_publisher.published_path(name)
+    return sorted(os.listdir(folder)) if os.path.isdir(folder) else None
+
+
+def _read(filename, name=DATE):
+    with open(os.path.join(folder_publisher.published_path(name), filename), "rb") as handle:
+        return handle.read()
+
+
+def test_campaigns_sharing_a_start_date_share_the_folder(client, admin_headers, make_png):
+    background, logo = make_png("red"), make_png("blue")
+    first = _create(client, admin_headers, "first", background=background)
+    second = _create(client, admin_headers, "second", end="2040-04-30", logo=logo)
+    assert _listing() == [f"{DATE}bkg.png", f"{DATE}logo.png"]
+
+    # An upload to one campaign keeps the other's images
+    screensaver = make_png("green")
+    response = client.post(
+        f"/api/uploads/{second}", data={"screensaver": (io.BytesIO(screensaver), "s.png")},
+        headers=admin_headers, content_type="multipart/form-data",
+    )
+    assert response.status_code == 200
+    assert _listing() == [f"{DATE}bkg.png", f"{DATE}logo.png", f"{DATE}screensaver_bkg.png"]
+    assert _read(f"{DATE}bkg.png") == background
+
+    # Deleting one campaign takes down only its own images
+    assert client.delete(f"/api/campaigns/{first}", headers=admin_headers).status_code == 200
+    assert _listing() == [f"{DATE}logo.png", f"{DATE}screensaver_bkg.png"]
+    assert _read(f"{DATE}logo.png") == logo
+
+    # The folder goes with the last campaign using it
+    assert client.delete(f"/api/campaigns/{second}", headers=admin_headers).status_code == 200
+    assert _listing() is None
+
+
+def test_moving_a_campaign_off_a_shared_date(client, admin_headers, make_png):
+    first = _create(client, admin_headers, "first", background=make_png("red"))
+    _create(client, admin_headers, "second", end="2040-04-30", logo=make_png("blue"))
+
+    response = client.put(
+        f"/api/campaigns/{first}", json={"start_date": "2040-03-05"}, headers=admin_headers
+    )
+    assert response.status_code == 200
+    assert _listing() == [f"{DATE}logo.png"]
+    assert _listing("2040-03-05") == ["2040-03-05bkg.png"]
+
+
+def test_failed_commit_restores_the_folder(app, client, admin_headers, make_png, monkeypatch):
+    background = make_png("red")
+    campaign_id = _create(client, admin_headers, "rollback", background=background)
+
+    def fail():
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(db.session, "commit", fail)
+    response = client.post(
+        f"/api/uploads/{campaign_id}", data={"background": (io.BytesIO(make_png("blue")), "b.png")},
+        headers=admin_headers, content_type="multipart/form-data",
+    )
+    assert response.status_code == 500
+    assert _read(f"{DATE}bkg.png") == background
+    assert [name for name in os.listdir(folder_publisher.versions_folder)
+            if name.startswith(DATE)] == [os.path.basename(os.path.realpath(folder_publisher.published_path(DATE)))]
+
+
+def test_publication_rollback_puts_back_the_previous_version(app, make_png):
+    with app.app_context():
+        old = asset_store.put(io.BytesIO(make_png("red")))
+        new = asset_store.put(io.BytesIO(make_png("blue")))
+        with folder_publisher.transaction() as publication:
+            publication.publish(DATE, {"a.png": old})
+
+        publication = folder_publisher.transaction()
+        publication.publish(DATE, {"a.png": new, "b.png": new})
+        publication.unpublish("2040-01-01")
+        publication.rollback()
+
+        assert _listing() == ["a.png"]
+        with open(asset_store.blob_path(old), "rb") as handle:
+            assert _read("a.png") == handle.read()
+
+
+def test_publishes_of_one_date_wait_for_each_other(app, make_png):
+    with app.app_context():
+        first = asset_store.put(io.BytesIO(make_png("red")))
+        second = asset_store.put(io.BytesIO(make_png("blue")))
+
+    holder = folder_publisher.transaction()
+    holder.publish(DATE, {"a.png": first})
+
+    def publish_second():
+        with folder_publisher.transaction() as publication:
+            publication.publish(DATE, {"b.png": second})
+
+    waiter = threading.Thread(target=publish_second)
+    waiter.start()
+    waiter.join(0.3)
+    assert waiter.is_alive()  # Blocked until the first publication commits
+
+    holder.commit()
+    waiter.join(5)
+    assert _listing() == ["a.png", "b.png"]
+
+
+def test_rollback_leaves_a_later_version_in_place(app, make_png):
+    with app.app_context():
+        first = asset_store.put(io.BytesIO(make_png("red")))
+        second = asset_store.put(io.BytesIO(make_png("blue")))
+
+    staged, previous = folder_publisher._replace(DATE, {"a.png": first}, set())
+    folder_publisher._replace(DATE, {"b.png": second}, set())
+    folder_publisher._restore(DATE, previous, staged)
+    assert _listing() == ["a.png", "b.png"]
+
+
+def test_symlink_mode_falls_back_to_rename_without_symlinks(app, monkeypatch):
+    def refuse(*args, **kwargs):
+        raise OSError("A required privilege is not held by the client")
+
+    monkeypatch.setattr(os, "symlink", refuse)
+    app.config["CAMPAIGN_PUBLISH_MODE"] = "symlink"
+    folder_publisher.init_app(app)
+    assert folder_publisher.mode == "rename"
+
+
+@pytest.fixture
+def blobs(app, make_png):
+    with app.app_context():
+        digests = {color: asset_store.put(io.BytesIO(make_png(color))) for color in ("red", "green", "blue", "gray")}
+    old = time.time() - 7200
+    for color in ("red", "green", "blue"):
+        os.utime(asset_store.blob_path(digests[color]), (old, old))
+    return digests
+
+
+def test_collect_garbage_removes_only_unreferenced_old_blobs(app, blobs, tmp_path):
+    # green is still linked from a folder, gray is too young, blue is referenced
+    os.link(asset_store.blob_path(blobs["green"]), tmp_path / "linked.png")
+    kept = [blobs["green"], blobs["blue"], blobs["gray"]]
+
+    assert asset_store.collect_garbage([blobs["blue"]], dry_run=True)[0] == 1
+    assert os.path.exists(asset_store.blob_path(blobs["red"]))
+
+    removed, freed = asset_store.collect_garbage([blobs["blue"]])
+    assert (removed, freed > 0) == (1, True)
+    assert not os.path.exists(asset_store.blob_path(blobs["red"]))
+    assert all(os.path.exists(asset_store.blob_path(digest)) for digest in kept)
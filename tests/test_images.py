@@ -0,0 +1,49 @@
+# tests/test_images.py - Image variants: format negotiation, cache keys and pruning
+import os
+import time
+
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header
+
+from services import image_derivatives
+
+
+def _accept(header):
+    return parse_accept_header(header, MIMEAccept)
+
+
+def test_negotiation_needs_an_explicit_nonzero_type(app, monkeypatch):
+    monkeypatch.setattr(image_derivatives, "formats", ["avif", "webp"])
+    assert image_derivatives.negotiate_format(_accept("image/avif,image/webp,*/*;q=0.8"), "png") == "avif"
+    assert image_derivatives.negotiate_format(_accept("image/avif;q=0,image/webp"), "png") == "webp"
+    assert image_derivatives.negotiate_format(_accept("image/webp;q=0, image/*"), "png") == "png"
+    assert image_derivatives.negotiate_format(_accept("*/*"), "png") == "png"
+
+
+def test_variant_name_changes_with_quality(app, monkeypatch):
+    digest = "ab" * 16
+    before = image_derivatives.variant_path(digest, 320, "webp")
+    monkeypatch.setattr(image_derivatives, "quality", image_derivatives.quality - 10)
+    assert image_derivatives.variant_path(digest, 320, "webp") != before
+
+
+def test_prune_keeps_current_variants_of_referenced_images(app, tmp_path, make_png):
+    source = tmp_path / "source.png"
+    source.write_bytes(make_png())
+    kept = image_derivatives.get(str(source), 320, "png")
+    folder = os.path.dirname(kept)
+    unused = os.path.join(folder, f"{'cd' * 16}_{image_derivatives.variant_tag(320)}.png")
+    old_quality = kept.replace(f"_q{image_derivatives.quality}.", "_q1.")
+    young = os.path.join(folder, f"{'ef' * 16}_full_q1.png")
+    for path in (unused, old_quality, young):
+        with open(path, "wb") as handle:
+            handle.write(b"x")
+    old = time.time() - 7200
+    for path in (kept, unused, old_quality):
+        os.utime(path, (old, old))
+
+    digest = os.path.basename(kept).split("_")[0]
+    assert image_derivatives.prune([digest + "0" * 32], dry_run=True) == (2, 2)
+    assert os.path.exists(unused)
+    image_derivatives.prune([digest + "0" * 32])
+    assert sorted(os.listdir(folder)) == sorted(os.path.basename(path) for path in (kept, young))
@@ -0,0 +1,125 @@
+# tests/test_logs.py - Activity log writer, listing, stats and export behaviour
+import gzip
+from datetime import date, datetime
+
+from models import ActivityLog, Campaign, EndpointLatency, db
+from services import latency_recorder, log_rollups, record_activity
+
+
+def test_inline_log_write_leaves_request_session_alone(app):
+    with app.app_context():
+        pending = Campaign(
+            name="pending", start_date=date(2030, 1, 1), end_date=date(2030, 1, 2),
+            folder_path="unused", user_id=1,
+        )
+        db.session.add(pending)
+
+        assert record_activity(user_id=1, action="test_action")
+
+        # The log row is committed on its own; the campaign is still only pending
+        assert pending in db.session.new
+        db.session.rollback()
+        assert Campaign.query.count() == 0
+        assert ActivityLog.query.filter_by(action="test_action").count() == 1
+
+
+def _add_logs(app, *created_at):
+    with app.app_context():
+        logs = [ActivityLog(user_id=1, action="paged", created_at=moment) for moment in created_at]
+        db.session.add_all(logs)
+        db.session.commit()
+        return [log.id for log in logs]
+
+
+def test_cursor_pages_walk_across_created_at_ties(app, client, admin_headers):
+    tie, earlier = datetime(2030, 1, 2), datetime(2030, 1, 1)
+    tied = _add_logs(app, *[tie] * 5)
+    older = _add_logs(app, earlier, earlier)
+    expected = sorted(tied, reverse=True) + sorted(older, reverse=True)
+
+    seen, cursor = [], ""
+    while cursor is not None:
+        response = client.get(
+            "/api/logs", query_string={"cursor": cursor, "per_page": 2, "action": "paged"}, headers=admin_headers
+        )
+        assert response.status_code == 200
+        body = response.get_json()
+        seen += [log["id"] for log in body["logs"]]
+        cursor = body["pagination"]["next_cursor"]
+    assert seen == expected
+
+
+def test_page_size_and_number_are_clamped(app, client, admin_headers):
+    _add_logs(app, datetime(2030, 1, 1), datetime(2030, 1, 2))
+    for per_page in (0, -1):
+        response = client.get(f"/api/logs?cursor=&per_page={per_page}&action=paged", headers=admin_headers)
+        assert response.status_code == 200
+        assert len(response.get_json()["logs"]) == 1
+        assert response.get_json()["pagination"]["has_next"]
+
+    response = client.get("/api/logs?page=0&include_total=false&action=paged", headers=admin_headers)
+    assert response.status_code == 200
+    assert response.get_json()["pagination"]["page"] == 1
+    assert len(response.get_json()["logs"]) == 2
+
+
+def _stats(client, headers):
+    response = client.get(
+        "/api/logs/stats?start_date=2025-01-01&end_date=2025-01-31", headers=headers
+    )
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_stats_come_from_the_logs_until_rollups_are_backfilled(app, client, admin_headers):
+    # History written before the rollup was maintained
+    _add_logs(app, datetime(2025, 1, 2), datetime(2025, 1, 2), datetime(2025, 1, 3))
+
+    stats = _stats(client, admin_headers)
+    assert stats["summary"]["total_actions"] == 3
+    assert stats["daily_activity"] == [{"date": "2025-01-02", "count": 2}, {"date": "2025-01-03", "count": 1}]
+
+    with app.app_context():
+        log_rollups.backfill()
+        assert log_rollups.covers(date(2025, 1, 1))
+    assert _stats(client, admin_headers)["summary"]["total_actions"] == 3
+
+
+def test_stats_ignore_rollups_that_are_not_maintained(app, client, admin_headers, monkeypatch):
+    _add_logs(app, datetime(2025, 1, 2))
+    with app.app_context():
+        log_rollups.backfill()
+    monkeypatch.setattr(log_rollups, "enabled", False)
+    _add_logs(app, datetime(2025, 1, 3))
+
+    assert _stats(client, admin_headers)["summary"]["total_actions"] == 2
+
+
+def test_export_is_gzipped_only_for_clients_that_accept_it(app, client, admin_headers):
+    _add_logs(app, datetime(2030, 1, 1))
+
+    response = client.get("/api/logs/export.csv?gzip=true", headers={**admin_headers, "Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(response.data).startswith(b"Date/Time")
+
+    response = client.get("/api/logs/export.csv?gzip=true", headers={**admin_headers, "Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in response.headers
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert response.data.startswith(b"Date/Time")
+
+
+def test_latency_flush_leaves_request_session_alone(app):
+    with app.app_context():
+        pending = Campaign(
+            name="pending", start_date=date(2030, 1, 1), end_date=date(2030, 1, 2),
+            folder_path="unused", user_id=1,
+        )
+        db.session.add(pending)
+
+        latency_recorder.record("GET test.endpoint", 12.5, 200)
+        assert latency_recorder.flush(include_current=True) == 1
+
+        assert pending in db.session.new
+        db.session.rollback()
+        assert Campaign.query.count() == 0
+        assert EndpointLatency.query.filter_by(endpoint="GET test.endpoint").count() == 1
@@ -0,0 +1,76 @@
+# tests/test_metrics.py - Metrics registry behaviour
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+from sqlalchemy import text
+
+from models import db
+from services import metrics
+from services.metrics import db_queries, image_bytes_served
+
+
+@pytest.fixture
+def multiproc_dir(app, tmp_path):
+    directory = tmp_path / "metrics"
+    directory.mkdir()
+    metrics.multiproc_dir = str(directory)
+    yield directory
+    metrics.multiproc_dir = None
+
+
+def _dead_pid():
+    exited = subprocess.Popen([sys.executable, "-c", "pass"])
+    exited.wait()
+    return exited.pid
+
+
+def _counter(value):
+    return {"type": "counter", "help": "", "labelnames": [], "samples": [[[], value]]}
+
+
+def test_scrape_archives_counters_of_dead_workers(multiproc_dir):
+    pid = _dead_pid()
+    stale = multiproc_dir / f"metrics_{pid}.json"
+    stale.write_text(json.dumps({"pid": pid, "metrics": {
+        "image_bytes_served_total": _counter(100),
+        "activity_log_queue_depth": {"type": "gauge", "help": "", "labelnames": [], "samples": [[[], 7]]},
+    }}))
+
+    image_bytes_served.reset()
+    image_bytes_served.inc(5)
+    body = metrics.render()
+    assert "image_bytes_served_total 105" in body
+    assert f'pid="{pid}"' not in body  # The dead worker's gauges are dropped
+    assert not stale.exists()
+
+    # Archived once: the total holds steady on the next scrape instead of resetting
+    assert "image_bytes_served_total 105" in metrics.render()
+
+
+def test_worker_archives_its_counters_at_exit(multiproc_dir):
+    image_bytes_served.reset()
+    image_bytes_served.inc(3)  # Not yet in a snapshot
+    metrics.write_snapshot()
+    image_bytes_served.inc(4)
+    metrics.retire()
+    assert not list(multiproc_dir.glob(f"metrics_{os.getpid()}.json"))
+
+    image_bytes_served.reset()
+    assert "image_bytes_served_total 7" in metrics.render()
+
+
+def test_failed_statement_does_not_skew_query_timing(app):
+    with app.app_context(), db.engine.connect() as connection:
+        db_queries.reset()
+        with pytest.raises(Exception):
+            connection.execute(text("SELECT * FROM no_such_table"))
+        connection.rollback()
+        connection.execute(text("SELECT 1"))
+
+        # Nothing from the failed statement is left on the connection to be paired later
+        assert not connection.info.get("metrics_query_start")
+        samples = dict((tuple(key), value) for key, value in db_queries.snapshot()["samples"])
+        assert samples[("background",)] == 1
@@ -0,0 +1,24 @@
+# tests/test_sql_profiler.py - Who may switch on per-request SQL profiling
+import pytest
+
+from services import sql_profiler
+
+PROFILE = {"X-Profile-SQL": "1"}
+
+
+def test_header_is_ignored_by_default(client, admin_headers):
+    response = client.get("/api/campaigns/", headers={**admin_headers, **PROFILE})
+    assert "X-SQL-Query-Count" not in response.headers
+
+
+@pytest.fixture
+def header_allowed(app):
+    sql_profiler.allow_header = True
+    yield
+    sql_profiler.allow_header = False
+
+
+def test_header_profiles_admin_requests_only(client, admin_headers, user_headers, header_allowed):
+    assert "X-SQL-Query-Count" in client.get("/api/campaigns/", headers={**admin_headers, **PROFILE}).headers
+    assert "X-SQL-Query-Count" not in client.get("/api/campaigns/", headers={**user_headers, **PROFILE}).headers
+    assert "X-SQL-Query-Count" not in client.get("/api/campaigns/manifest", headers=PROFILE).headers
@@ -0,0 +1,155 @@
+# tests/test_uploads.py - Resumable upload sessions and upload job access
+import hashlib
+import io
+import os
+
+import pytest
+from werkzeug.datastructures import FileStorage, MultiDict
+from werkzeug.test import encode_multipart
+from werkzeug.wrappers import request as werkzeug_request
+
+from models import UploadJob, db
+from services import asset_store, folder_publisher, upload_jobs
+
+
+def _sha(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+@pytest.fixture
+def campaign_id(client, admin_headers):
+    response = client.post(
+        "/api/campaigns/", json={"name": "uploads", "start_date": "2040-01-01", "end_date": "2040-01-31"},
+        headers=admin_headers,
+    )
+    assert response.status_code == 201
+    return response.get_json()["id"]
+
+
+def _open_session(client, headers, campaign_id, data):
+    response = client.post(
+        f"/api/uploads/{campaign_id}/sessions",
+        json={"image_type": "background", "size": len(data), "sha256": _sha(data)},
+        headers=headers,
+    )
+    assert response.status_code == 201
+    return response.get_json()["upload_url"]
+
+
+def _put(client, headers, url, offset, chunk, checksum=None):
+    return client.put(
+        f"{url}?offset={offset}", data=chunk,
+        headers={**headers, "X-Chunk-SHA256": checksum or _sha(chunk)},
+    )
+
+
+def test_chunk_offset_and_checksum_rules(client, user_headers, campaign_id, make_png):
+    data = make_png(size=(200, 200))
+    half = len(data) // 2
+    url = _open_session(client, user_headers, campaign_id, data)
+
+    # A gap past the received bytes is refused
+    assert _put(client, user_headers, url, half, data[half:]).status_code == 409
+    # A bad checksum doesn't advance the session
+    response = _put(client, user_headers, url, 0, data[:half], checksum="0" * 64)
+    assert response.status_code == 422
+    assert response.get_json()["received_bytes"] == 0
+    # Past the declared size
+    assert _put(client, user_headers, url, 0, data + b"x").status_code == 416
+
+    assert _put(client, user_headers, url, 0, data[:half]).get_json()["received_bytes"] == half
+    # Retried chunk overwrites and doesn't move the offset backwards
+    assert _put(client, user_headers, url, 0, data[:half]).get_json()["received_bytes"] == half
+    assert client.post(f"{url}/complete", headers=user_headers).status_code == 409  # Incomplete
+
+    assert _put(client, user_headers, url, half, data[half:]).get_json()["complete"]
+    response = client.post(f"{url}/complete", headers=user_headers)
+    assert response.status_code == 200
+    assert response.get_json()["uploaded_files"][0]["content_hash"] == _sha(data)
+    assert client.post(f"{url}/complete", headers=user_headers).status_code == 409  # Already completed
+
+
+def test_sessions_and_jobs_are_private_to_their_owner(client, admin_headers, user_headers, campaign_id, make_png):
+    data = make_png()
+    url = _open_session(client, user_headers, campaign_id, data)
+
+    assert client.get(url, headers=user_headers).status_code == 200
+    assert client.get(url, headers=admin_headers).status_code == 200
+
+    other = _open_session(client, admin_headers, campaign_id, data)
+    assert client.get(other, headers=user_headers).status_code == 404
+    assert _put(client, user_headers, other, 0, data).status_code == 404
+    assert client.post(f"{other}/complete", headers=user_headers).status_code == 404
+    assert client.delete(other, headers=user_headers).status_code == 404
+
+    _put(client, admin_headers, other, 0, data)
+    job = client.post(f"{other}/complete", headers=admin_headers).get_json()["jobs"][0]
+    assert client.get(job["status_url"], headers=user_headers).status_code == 404
+    assert client.get(job["status_url"], headers=admin_headers).status_code == 200
+
+
+def test_completion_can_be_retried_after_a_failed_publish(client, user_headers, campaign_id, make_png, monkeypatch):
+    data = make_png()
+    url = _open_session(client, user_headers, campaign_id, data)
+    _put(client, user_headers, url, 0, data)
+
+    def fail(*args, **kwargs):
+        raise OSError("disk full")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(folder_publisher, "_stage", fail)
+        assert client.post(f"{url}/complete", headers=user_headers).status_code == 500
+    assert client.get(url, headers=user_headers).get_json()["status"] == "open"
+
+    response = client.post(f"{url}/complete", headers=user_headers)
+    assert response.status_code == 200
+    assert response.get_json()["uploaded_files"][0]["content_hash"] == _sha(data)
+    assert client.get(url, headers=user_headers).get_json()["status"] == "completed"
+
+
+def test_oversized_image_is_refused_before_the_body_is_read(app, client, user_headers, campaign_id, make_png):
+    app.config["UPLOAD_MAX_BACKGROUND_BYTES"] = 1024
+    image = make_png() + os.urandom(2 * 1024 * 1024)  # Binary like real image data, with line breaks
+    boundary, body = encode_multipart(MultiDict({"background": FileStorage(io.BytesIO(image), "b.png")}))
+    stream = io.BytesIO(body)
+
+    response = client.post(
+        f"/api/uploads/{campaign_id}", input_stream=stream, headers=user_headers,
+        content_type=f"multipart/form-data; boundary={boundary}", content_length=len(body),
+    )
+    assert response.status_code == 413
+    assert stream.tell() < len(body) // 2  # Stopped reading once the cap was passed
+
+
+def test_images_are_stored_without_spooling(client, user_headers, campaign_id, make_png, monkeypatch):
+    def no_spool(*args, **kwargs):
+        raise AssertionError("image part spooled to a temp file")
+
+    monkeypatch.setattr(werkzeug_request, "default_stream_factory", no_spool)
+    image = make_png("blue")
+    response = client.post(
+        f"/api/uploads/{campaign_id}",
+        data={"logo": (io.BytesIO(image), "l.png"), "background": (io.BytesIO(b"not an image"), "b.png")},
+        headers=user_headers, content_type="multipart/form-data",
+    )
+    assert response.status_code == 200
+    body = response.get_json()
+    assert [(item["type"], item["content_hash"]) for item in body["uploaded_files"]] == [("logo", _sha(image))]
+    assert body["warnings"] == ["Rejected background image: File content is not a PNG or JPEG image"]
+    with open(asset_store.blob_path(_sha(image)), "rb") as handle:
+        assert handle.read() == image
+
+
+def test_first_request_resumes_jobs_left_queued(app, client, monkeypatch):
+    with app.app_context():
+        job = UploadJob(kind="process_image", file_path="left-over.png")
+        db.session.add(job)
+        db.session.commit()
+        job_id = job.id
+
+    dispatched = []
+    monkeypatch.setattr(upload_jobs, "async_enabled", True)
+    monkeypatch.setattr(upload_jobs, "dispatch", dispatched.append)
+    client.get("/api/health/live")
+    client.get("/api/health/live")
+    assert dispatched == [job_id]  # Once per process